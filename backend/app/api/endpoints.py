@@ -1,20 +1,39 @@
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from tabulate import tabulate
 import datetime
+import time
+import asyncio
 import pandas as pd
+import ijson
 
 from app.models.models import (
     Region, Goal, Project, ProjectDetails, BudgetItem, MetricData, IndicatorData, ProjectParameter,
-    ParseRequest, ParseResponse, IndicatorHistory, TimeSeriesDataPoint, ReferenceDataPoint, ProjectActivity,
-    BudgetSyncResponse, ProjectBudgetHistory, NewsSyncResponse
+    ParseRequest, ParseResponse, IndicatorHistory, IndicatorHistoryBatch, IndicatorRanking, ProjectActivity,
+    ActivitySummary, ActivityPage, ActivitySearchResponse,
+    BudgetSyncResponse, ProjectBudgetHistory, NewsSyncResponse,
+    BatchParseRequest, BatchParseResponse, BatchParseItemResult, JobSubmitResponse, JobStatus,
+    IndicatorStaleness, StalenessReport, RefreshDueResponse
 )
 from app.core.database import get_db_pool
+from app.core.cache import cached_json_response
 from app.services.parser import get_indicator_data_from_url
 from app.services.news_importer import import_news_from_upload
-from app.services.db_manager import save_parsed_data
 from app.services.budget_parser import fetch_budget_data
-from app.services.db_manager import save_parsed_data, save_budget_data
+from app.services.batch_ingest import get_indicator_source_urls, run_batch_ingest
+from app.services.job_queue import job_queue, JOB_PARSE_INDICATOR, JOB_CRAWL_NEWS
+from app.services.refresh_scheduler import load_staleness, enqueue_due_indicators
+from app.services.activities import (
+    fetch_activities_page, fetch_activity, ACTIVITIES_PAGE_SIZE, ACTIVITIES_MAX_PAGE_SIZE
+)
+from app.services.activity_search import (
+    search_activities, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, SEARCH_RANK_CANDIDATES
+)
+from app.services.exporter import validate_export, stream_export, export_filename, export_media_type
+from app.services.dictionary_cache import dictionary_cache, RF_REGION_NAME
+from app.services.dashboard_projection import projection_covers_year, fetch_indicator_rows
+from app.services.db_manager import save_parsed_data, save_budget_data, describe_save_summary
 
 router = APIRouter()
 
@@ -59,7 +78,7 @@ async def process_indicator_endpoint(request: ParseRequest):
 
     # --- Возвращаем сохранение в БД ---
     try:
-        await save_parsed_data(
+        save_summary = await save_parsed_data(
             metadata=metadata,
             monthly_df=monthly_df,
             yearly_df=yearly_df
@@ -69,14 +88,114 @@ async def process_indicator_endpoint(request: ParseRequest):
         print(f"Критическая ошибка: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка обработки или сохранения: {str(e)}")
 
+    rows_changed = save_summary['yearly_rows_changed'] + save_summary['monthly_rows_changed']
     return ParseResponse(
-        message="Данные успешно спарсены и сохранены",
+        message=describe_save_summary(save_summary),
         indicator_name=metadata['name'],
         monthly_rows_added=len(monthly_df) if monthly_df is not None else 0,
-        yearly_rows_added=len(yearly_df) if yearly_df is not None else 0
+        yearly_rows_added=len(yearly_df) if yearly_df is not None else 0,
+        unchanged=save_summary['unchanged'],
+        rows_changed=rows_changed
     )
 
 
+@router.post("/process-indicators/batch", response_model=BatchParseResponse, tags=["Parser"])
+async def process_indicators_batch(request: BatchParseRequest):
+    """
+    Пакетно скачивает, разбирает и сохраняет индикаторы: по списку ссылок
+    или по всем индикаторам справочника, у которых указан source_url.
+    """
+    if request.all_indicators:
+        try:
+            urls = await get_indicator_source_urls()
+        except ConnectionError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    elif request.urls:
+        urls = [str(url) for url in request.urls]
+    else:
+        raise HTTPException(status_code=400, detail="Укажите список urls или all_indicators=true.")
+
+    started = time.monotonic()
+    results = await run_batch_ingest(urls, request.concurrency, request.host_rate_limit)
+    succeeded = sum(1 for r in results if r['status'] == 'ok')
+
+    return BatchParseResponse(
+        message="Пакетная обработка завершена.",
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        duration_seconds=round(time.monotonic() - started, 3),
+        results=[BatchParseItemResult(**r) for r in results]
+    )
+
+
+@router.post("/jobs/process-indicator", response_model=JobSubmitResponse, status_code=202, tags=["Jobs"])
+async def submit_process_indicator_job(request: ParseRequest):
+    """
+    Ставит парсинг индикатора в фоновую очередь и сразу возвращает id задания.
+    Ход выполнения -- GET /api/jobs/{job_id}.
+    """
+    try:
+        job_id = await job_queue.submit(JOB_PARSE_INDICATOR, {'url': str(request.url)})
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JobSubmitResponse(job_id=job_id, status='queued')
+
+
+@router.post("/jobs/crawl-news", response_model=JobSubmitResponse, status_code=202, tags=["Jobs"])
+async def submit_crawl_news_job():
+    """
+    Ставит в очередь обход новостей club-rf.ru: скачиваются только статьи, появившиеся
+    после прошлого обхода, и записываются в мероприятия. Ход выполнения -- GET /api/jobs/{job_id}.
+    """
+    try:
+        job_id = await job_queue.submit(JOB_CRAWL_NEWS, {'source': 'club-rf'}, max_attempts=1)
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JobSubmitResponse(job_id=job_id, status='queued')
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus, tags=["Jobs"])
+async def get_job_status(job_id: int):
+    """Статус задания: этап, попытки, время по этапам, результат (число строк) или ошибка."""
+    try:
+        job = await job_queue.get(job_id)
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return JobStatus(**job)
+
+
+@router.get("/indicators/staleness", response_model=StalenessReport, tags=["Jobs"])
+async def get_indicators_staleness(only_due: bool = Query(False, description="Только индикаторы, которым пора обновиться")):
+    """
+    Отчет о свежести данных: интервал обновления по периодичности, последняя проверка,
+    срок следующего обновления и просрочка. Порядок совпадает с приоритетом планировщика.
+    """
+    try:
+        items = await load_staleness()
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    due = [item for item in items if item['is_due']]
+    return StalenessReport(
+        total=len(items),
+        due=len(due),
+        never_parsed=sum(1 for item in items if item['last_checked_at'] is None),
+        items=[IndicatorStaleness(**item) for item in (due if only_due else items)]
+    )
+
+
+@router.post("/indicators/refresh-due", response_model=RefreshDueResponse, status_code=202, tags=["Jobs"])
+async def refresh_due_indicators():
+    """Ставит просроченные индикаторы в очередь сейчас, не дожидаясь очередной проверки планировщика."""
+    if await get_db_pool() is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+    job_ids = await enqueue_due_indicators()
+    return RefreshDueResponse(message=f"Поставлено в очередь: {len(job_ids)}.", job_ids=job_ids)
+
+
 @router.post("/budgets/sync", response_model=BudgetSyncResponse, tags=["Parser"])
 async def sync_budgets():
     """
@@ -108,181 +227,321 @@ async def sync_budgets():
 
 #---------------------------------------------------------------------------------------
 
+# Читающие эндпоинты ниже отдают ответы через кэш (app/core/cache.py) с поддержкой ETag / 304.
+# Кэш сбрасывается загрузчиками данных, поэтому между загрузками БД не опрашивается.
+
 @router.get("/regions", response_model=List[Region], tags=["Data"])
-async def get_all_regions():
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        records = await conn.fetch("SELECT id, name FROM regions ORDER BY name")
-        return [dict(record) for record in records]
+async def get_all_regions(request: Request):
+    async def load():
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            records = await conn.fetch("SELECT id, name FROM regions ORDER BY name")
+            return [dict(record) for record in records]
+
+    return await cached_json_response(request, load)
 
 
 @router.get("/goals", response_model=List[Goal], tags=["Data"])
-async def get_all_goals():
-    pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        records = await conn.fetch("SELECT id, name FROM national_goals ORDER BY id")
-        return [dict(record) for record in records]
+async def get_all_goals(request: Request):
+    async def load():
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            records = await conn.fetch("SELECT id, name FROM national_goals ORDER BY id")
+            return [dict(record) for record in records]
+
+    return await cached_json_response(request, load)
 
 
 @router.get("/goals/{goal_id}/projects", response_model=List[Project], tags=["Data"])
-async def get_projects_for_goal(goal_id: int):
-    pool = await get_db_pool()
+async def get_projects_for_goal(goal_id: int, request: Request):
+    async def load():
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            query = """
+                SELECT p.id, p.name 
+                FROM national_projects p
+                JOIN project_to_goal_mapping pgm ON p.id = pgm.project_id
+                WHERE pgm.goal_id = $1
+                ORDER BY p.name;
+            """
+            records = await conn.fetch(query, goal_id)
+            return [dict(record) for record in records]
+
+    return await cached_json_response(request, load)
+
+
+async def _fetch_with_own_connection(pool, method: str, query: str, *args):
+    """Выполняет запрос на отдельном соединении из пула, чтобы независимые запросы шли параллельно."""
     async with pool.acquire() as conn:
-        query = """
-            SELECT p.id, p.name 
-            FROM national_projects p
-            JOIN project_to_goal_mapping pgm ON p.id = pgm.project_id
-            WHERE pgm.goal_id = $1
-            ORDER BY p.name;
-        """
-        records = await conn.fetch(query, goal_id)
-        return [dict(record) for record in records]
+        return await getattr(conn, method)(query, *args)
+
+
+# Живой запрос строк индикаторов: для лет вне окна проекции и ключей, по которым она неполна.
+# Среднее по РФ считается одним агрегатом по индикаторам проекта, а не подзапросом на каждую строку.
+LIVE_INDICATORS_QUERY = """
+    WITH project_indicators AS (
+        SELECT i.id, i.name, i.unit, i.desired_direction, gm.id AS metric_id, gm.name AS metric_name
+        FROM indicators i
+        JOIN goal_metrics gm ON i.metric_id = gm.id
+        JOIN indicator_to_project_mapping itpm ON i.id = itpm.indicator_id
+        WHERE gm.goal_id = $2 AND itpm.project_id = $4
+    ),
+    rf_values AS (
+        SELECT iv_rf.indicator_id, AVG(iv_rf.yearly_value) AS rf_value
+        FROM indicator_yearly_values iv_rf
+        WHERE iv_rf.year = $3 AND iv_rf.indicator_id IN (SELECT id FROM project_indicators)
+        GROUP BY iv_rf.indicator_id
+    )
+    SELECT
+        pi.metric_id,
+        pi.metric_name,
+        pi.id AS indicator_id,
+        pi.name AS indicator_name,
+        pi.unit,
+        pi.desired_direction,
+        iv.yearly_value AS region_value,
+        irv.reference_value AS target_value,
+        rf.rf_value
+    FROM project_indicators pi
+    LEFT JOIN indicator_yearly_values iv ON pi.id = iv.indicator_id AND iv.region_id = $1 AND iv.year = $3
+    LEFT JOIN indicator_reference_values irv ON pi.id = irv.indicator_id AND irv.year = $3
+    LEFT JOIN rf_values rf ON pi.id = rf.indicator_id
+    ORDER BY pi.metric_id, pi.id;
+"""
+
+
+async def _load_indicator_rows(pool, region_id: int, goal_id: int, project_id: int, year: int):
+    """Строки индикаторов из проекции (одна индексная выборка), если она пуста или неполна -- живым запросом."""
+    async with pool.acquire() as conn:
+        if projection_covers_year(year):
+            rows = await fetch_indicator_rows(conn, region_id, goal_id, project_id, year)
+            if rows is not None:
+                return rows
+        return await conn.fetch(LIVE_INDICATORS_QUERY, region_id, goal_id, year, project_id)
+
+
+async def _load_activities_page(pool, project_id: int, region_id: Optional[int], **kwargs):
+    async with pool.acquire() as conn:
+        return await fetch_activities_page(conn, project_id, region_id, **kwargs)
 
 
 @router.get("/data", response_model=ProjectDetails, tags=["Data"])
 async def get_final_data(
+        request: Request,
         region_id: int,
         goal_id: int,
         project_id: int,
         year: int = Query(default=2024, description="Год для выборки данных")
 ):
+    return await cached_json_response(
+        request, lambda: load_project_details(region_id, goal_id, project_id, year))
+
+
+async def load_project_details(region_id: int, goal_id: int, project_id: int, year: int) -> ProjectDetails:
+    """
+    Сводка по проекту для дашборда.
+    Независимые разделы (проект с параметрами, бюджеты, мероприятия, индикаторы) запрашиваются
+    одновременно на разных соединениях пула, поэтому задержка равна самому долгому запросу, а не сумме.
+    Дешевые разделы -- название проекта и его параметры -- берутся одним запросом, чтобы промах кэша
+    занимал меньше соединений.
+    """
     pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        project_record = await conn.fetchrow("SELECT name FROM national_projects WHERE id = $1", project_id)
-        if not project_record:
-            raise HTTPException(status_code=404, detail="Проект не найден")
-
-        budget_data_list = []
-
-        # Находим ID для Российской Федерации
-        rf_region_record = await conn.fetchrow("SELECT id, name FROM regions WHERE name ILIKE 'Российская Федерация'")
-
-        # --- Логика получения бюджетов (остается без изменений) ---
-        if rf_region_record:
-            rf_budget_record = await conn.fetchrow(
-                """
-                SELECT SUM(amount_allocated) as allocated, SUM(amount_executed) as executed 
-                FROM project_budgets 
-                WHERE project_id = $1 AND region_id = $2 AND EXTRACT(YEAR FROM relevance_date) = $3
-                """,
-                project_id, rf_region_record['id'], year
-            )
-            if rf_budget_record and rf_budget_record['allocated'] is not None:
-                budget_data_list.append(BudgetItem(name=rf_region_record['name'], **dict(rf_budget_record)))
-
-        if not rf_region_record or region_id != rf_region_record['id']:
-            region_record = await conn.fetchrow("SELECT name FROM regions WHERE id = $1", region_id)
-            if region_record:
-                budget_record = await conn.fetchrow(
-                    """
-                    SELECT SUM(amount_allocated) as allocated, SUM(amount_executed) as executed 
-                    FROM project_budgets 
-                    WHERE project_id = $1 AND region_id = $2 AND EXTRACT(YEAR FROM relevance_date) = $3
-                    """,
-                    project_id, region_id, year
-                )
-                if budget_record and budget_record['allocated'] is not None:
-                    budget_data_list.append(BudgetItem(name=region_record['name'], **dict(budget_record)))
-
-        # --- ИЗМЕНЕНИЕ ЗДЕСЬ: Логика получения новостей в зависимости от региона ---
-
-        # Определяем, является ли выбранный регион "Российская Федерация"
-        is_rf_selected = rf_region_record and region_id == rf_region_record['id']
-
-        if is_rf_selected:
-            # Если выбрана РФ, показываем новости со всех регионов для данного проекта
-            activities_query = """
-                SELECT title, activity_date, link, responsible_body, text, importance
-                FROM project_activities
-                WHERE project_id = $1
-                ORDER BY activity_date DESC NULLS LAST;
-            """
-            activity_records = await conn.fetch(activities_query, project_id)
-        else:
-            # Иначе, показываем новости только для выбранного региона
-            activities_query = """
-                SELECT title, activity_date, link, responsible_body, text, importance
-                FROM project_activities
-                WHERE project_id = $1 AND region_id = $2
-                ORDER BY activity_date DESC NULLS LAST;
-            """
-            activity_records = await conn.fetch(activities_query, project_id, region_id)
-
-        activities = [ProjectActivity(**dict(rec)) for rec in activity_records]
-
-        # --- КОНЕЦ ИЗМЕНЕНИЙ ---
-
-        parameter_records = await conn.fetch(
-            "SELECT name, unit FROM project_parameters WHERE project_id = $1 ORDER BY id", project_id)
-        parameters = [ProjectParameter(**dict(rec)) for rec in parameter_records]
-
-        indicators_query = """
-            SELECT
-                gm.id AS metric_id,
-                gm.name AS metric_name,
-                i.id AS indicator_id,
-                i.name AS indicator_name,
-                i.unit,
-                i.desired_direction,
-                iv.yearly_value AS region_value,
-                irv.reference_value AS target_value,
-                (SELECT AVG(iv_rf.yearly_value) FROM indicator_yearly_values iv_rf WHERE iv_rf.indicator_id = i.id AND iv_rf.year = $3) AS rf_value
-            FROM indicators i
-            JOIN goal_metrics gm ON i.metric_id = gm.id
-            JOIN indicator_to_project_mapping itpm ON i.id = itpm.indicator_id
-            LEFT JOIN indicator_yearly_values iv ON i.id = iv.indicator_id AND iv.region_id = $1 AND iv.year = $3
-            LEFT JOIN indicator_reference_values irv ON i.id = irv.indicator_id AND irv.year = $3
-            WHERE 
-                gm.goal_id = $2 
-                AND itpm.project_id = $4
-            ORDER BY gm.id, i.id;
-        """
-        indicator_rows = await conn.fetch(indicators_query, region_id, goal_id, year, project_id)
-
-        metrics_dict = {}
-        for row in indicator_rows:
-            metric_id = row['metric_id']
-            if metric_id not in metrics_dict:
-                metrics_dict[metric_id] = MetricData(name=row['metric_name'], indicators=[])
-
-            metrics_dict[metric_id].indicators.append(
-                IndicatorData(
-                    id=row['indicator_id'],
-                    name=row['indicator_name'],
-                    unit=row['unit'],
-                    region_value=row['region_value'],
-                    rf_value=row['rf_value'],
-                    target_value=row['target_value'],
-                    is_reversed=(row['desired_direction'] == 'lower')
-                )
-            )
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    # ID Российской Федерации берется из кэша справочников, без запроса к БД
+    rf_region_id = await dictionary_cache.get_id('regions', RF_REGION_NAME)
+    is_rf_selected = rf_region_id is not None and region_id == rf_region_id
+
+    # Годовые суммы бюджета РФ и выбранного региона из проекции (dashboard_budget_totals); РФ идет первой
+    budget_region_ids = [rid for rid in (rf_region_id, region_id) if rid is not None]
+    budgets_query = """
+        SELECT r.id, r.name, bt.allocated, bt.executed
+        FROM dashboard_budget_totals bt
+        JOIN regions r ON r.id = bt.region_id
+        WHERE bt.project_id = $1 AND bt.region_id = ANY($2::int[]) AND bt.year = $3
+    """
 
-        return ProjectDetails(
-            name=project_record['name'],
-            budget=budget_data_list,
-            metrics=list(metrics_dict.values()),
-            activities=activities,
-            parameters=parameters
+    # Если выбрана РФ, показываем новости со всех регионов для данного проекта,
+    # иначе -- только для выбранного региона. Здесь только первая страница, без текстов
+    activities_region_id = None if is_rf_selected else region_id
+
+    project_query = """
+        SELECT p.name,
+               ARRAY(SELECT pp.name FROM project_parameters pp WHERE pp.project_id = p.id ORDER BY pp.id)
+                   AS parameter_names,
+               ARRAY(SELECT pp.unit FROM project_parameters pp WHERE pp.project_id = p.id ORDER BY pp.id)
+                   AS parameter_units
+        FROM national_projects p
+        WHERE p.id = $1
+    """
+
+    (project_record, budget_records, (activity_records, activities_next_cursor),
+     indicator_rows) = await asyncio.gather(
+        _fetch_with_own_connection(pool, 'fetchrow', project_query, project_id),
+        _fetch_with_own_connection(pool, 'fetch', budgets_query, project_id, budget_region_ids, year),
+        _load_activities_page(pool, project_id, activities_region_id),
+        _load_indicator_rows(pool, region_id, goal_id, project_id, year),
+    )
+
+    if not project_record:
+        raise HTTPException(status_code=404, detail="Проект не найден")
+
+    budgets_by_region = {rec['id']: rec for rec in budget_records}
+    budget_data_list = [
+        BudgetItem(name=budgets_by_region[rid]['name'],
+                   allocated=budgets_by_region[rid]['allocated'], executed=budgets_by_region[rid]['executed'])
+        for rid in dict.fromkeys(budget_region_ids)
+        if rid in budgets_by_region and budgets_by_region[rid]['allocated'] is not None
+    ]
+
+    activities = [ActivitySummary(**dict(rec)) for rec in activity_records]
+    parameters = [ProjectParameter(name=name, unit=unit)
+                  for name, unit in zip(project_record['parameter_names'], project_record['parameter_units'])]
+
+    metrics_dict = {}
+    for row in indicator_rows:
+        metric_id = row['metric_id']
+        if metric_id not in metrics_dict:
+            metrics_dict[metric_id] = MetricData(name=row['metric_name'], indicators=[])
+
+        metrics_dict[metric_id].indicators.append(
+            IndicatorData(
+                id=row['indicator_id'],
+                name=row['indicator_name'],
+                unit=row['unit'],
+                region_value=row['region_value'],
+                rf_value=row['rf_value'],
+                target_value=row['target_value'],
+                is_reversed=(row['desired_direction'] == 'lower')
+            )
         )
 
+    return ProjectDetails(
+        name=project_record['name'],
+        budget=budget_data_list,
+        metrics=list(metrics_dict.values()),
+        activities=activities,
+        activities_next_cursor=activities_next_cursor,
+        parameters=parameters
+    )
+
+
+@router.get("/projects/{project_id}/activities", response_model=ActivityPage, tags=["Data"])
+async def get_project_activities(
+        project_id: int,
+        request: Request,
+        region_id: Optional[int] = Query(None, description="Регион; не указан или РФ -- все регионы"),
+        min_importance: Optional[int] = Query(None, description="Только мероприятия с важностью не ниже"),
+        limit: int = Query(ACTIVITIES_PAGE_SIZE, ge=1, le=ACTIVITIES_MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы")
+):
+    """
+    Мероприятия проекта постранично, от новых к старым (без даты -- в конце).
+    Без полного текста: его возвращает GET /api/activities/{activity_id}.
+    """
+    return await cached_json_response(
+        request, lambda: load_activities_page(project_id, region_id, min_importance, limit, cursor))
+
+
+async def load_activities_page(project_id: int, region_id: Optional[int], min_importance: Optional[int],
+                               limit: int, cursor: Optional[str]) -> ActivityPage:
+    pool = await get_db_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    rf_region_id = await dictionary_cache.get_id('regions', RF_REGION_NAME)
+    if region_id == rf_region_id:
+        region_id = None
+
+    try:
+        rows, next_cursor = await _load_activities_page(
+            pool, project_id, region_id, min_importance=min_importance, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор.")
+    return ActivityPage(items=[dict(rec) for rec in rows], next_cursor=next_cursor)
+
+
+# Объявлен до /activities/{activity_id}, иначе "search" разбирался бы как id мероприятия
+@router.get("/activities/search", response_model=ActivitySearchResponse, tags=["Data"])
+async def search_project_activities(
+        request: Request,
+        q: str = Query(..., description="Поисковый запрос: слова, \"точная фраза\", or, -исключение"),
+        project_id: Optional[int] = Query(None),
+        region_id: Optional[int] = Query(None, description="Регион; не указан или РФ -- все регионы"),
+        date_from: Optional[datetime.date] = Query(None),
+        date_to: Optional[datetime.date] = Query(None),
+        sort: str = Query('relevance', pattern='^(relevance|date)$'),
+        limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+        offset: int = Query(0, ge=0, lt=SEARCH_RANK_CANDIDATES)
+):
+    """
+    Полнотекстовый поиск по мероприятиям и новостям (русская морфология).
+    sort=relevance -- по релевантности среди самых новых совпадений, sort=date -- сначала новые.
+    snippet -- фрагменты текста с совпадениями в <mark>.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Пустой поисковый запрос.")
+    return await cached_json_response(
+        request, lambda: load_activity_search(q, project_id, region_id, date_from, date_to, sort, limit, offset))
+
+
+async def load_activity_search(q: str, project_id: Optional[int], region_id: Optional[int],
+                               date_from: Optional[datetime.date], date_to: Optional[datetime.date],
+                               sort: str, limit: int, offset: int) -> ActivitySearchResponse:
+    pool = await get_db_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    rf_region_id = await dictionary_cache.get_id('regions', RF_REGION_NAME)
+    if region_id == rf_region_id:
+        region_id = None
+
+    async with pool.acquire() as conn:
+        rows, has_more = await search_activities(
+            conn, q, project_id=project_id, region_id=region_id, date_from=date_from, date_to=date_to,
+            sort=sort, limit=limit, offset=offset)
+    return ActivitySearchResponse(items=rows, has_more=has_more)
+
+
+@router.get("/activities/{activity_id}", response_model=ProjectActivity, tags=["Data"])
+async def get_activity(activity_id: int, request: Request):
+    """Мероприятие с полным текстом новости."""
+    return await cached_json_response(request, lambda: load_activity(activity_id))
+
+
+async def load_activity(activity_id: int) -> ProjectActivity:
+    pool = await get_db_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    async with pool.acquire() as conn:
+        record = await fetch_activity(conn, activity_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Мероприятие не найдено")
+    return ProjectActivity(**dict(record))
+
 
 @router.get("/budgets/history", response_model=ProjectBudgetHistory, tags=["Data"])
-async def get_budget_history(project_id: int, region_id: int, year: int):
+async def get_budget_history(project_id: int, region_id: int, year: int, request: Request):
     """
     Возвращает помесячную историю исполнения бюджета для выбранного проекта и региона
     за указанный год, а также данные по РФ для сравнения.
     """
+    return await cached_json_response(request, lambda: load_budget_history(project_id, region_id, year))
+
+
+async def load_budget_history(project_id: int, region_id: int, year: int) -> ProjectBudgetHistory:
     pool = await get_db_pool()
+    # ID РФ берется из кэша справочников, без запроса к БД
+    rf_region_id = await dictionary_cache.get_id('regions', RF_REGION_NAME) or -1
     async with pool.acquire() as conn:
-        # Получаем ID РФ
-        rf_region_record = await conn.fetchrow("SELECT id FROM regions WHERE name ILIKE 'Российская Федерация'")
-        rf_region_id = rf_region_record['id'] if rf_region_record else -1
-
         # Запрос для получения данных
         query = """
             SELECT relevance_date, amount_allocated, amount_executed
             FROM project_budgets
-            WHERE project_id = $1 AND region_id = $2 AND EXTRACT(YEAR FROM relevance_date) = $3
+            WHERE project_id = $1 AND region_id = $2
+              AND relevance_date >= make_date($3, 1, 1) AND relevance_date < make_date($3 + 1, 1, 1)
             ORDER BY relevance_date;
         """
 
@@ -301,11 +560,15 @@ async def get_budget_history(project_id: int, region_id: int, year: int):
 
 
 @router.get("/indicator/{indicator_id}/history", response_model=IndicatorHistory, tags=["Data"])
-async def get_indicator_history(indicator_id: int, region_id: int):
+async def get_indicator_history(indicator_id: int, region_id: int, request: Request):
     """
     Возвращает годовую, месячную и эталонную историю значений для
     конкретного индикатора и региона для построения графика.
     """
+    return await cached_json_response(request, lambda: load_indicator_history(indicator_id, region_id))
+
+
+async def load_indicator_history(indicator_id: int, region_id: int) -> dict:
     pool = await get_db_pool()
     async with pool.acquire() as conn:
         # Запрос годовых данных
@@ -335,11 +598,196 @@ async def get_indicator_history(indicator_id: int, region_id: int):
         """
         reference_records = await conn.fetch(reference_query, indicator_id)
 
-        return IndicatorHistory(
-            yearly_data=[TimeSeriesDataPoint(**dict(rec)) for rec in yearly_records],
-            monthly_data=[TimeSeriesDataPoint(**dict(rec)) for rec in monthly_records],
-            reference_data=[ReferenceDataPoint(**dict(rec)) for rec in reference_records]
+        # Точки рядов отдаются словарями без сборки модели на каждую точку: числа уже float
+        # (кодек NUMERIC в пуле), а форму ответа описывает response_model эндпоинта
+        return {
+            'yearly_data': [dict(rec) for rec in yearly_records],
+            'monthly_data': [dict(rec) for rec in monthly_records],
+            'reference_data': [dict(rec) for rec in reference_records],
+        }
+
+
+@router.get("/indicator/{indicator_id}/ranking", response_model=IndicatorRanking, tags=["Data"])
+async def get_indicator_ranking(
+        indicator_id: int,
+        request: Request,
+        year_from: int = Query(..., description="Первый год"),
+        year_to: Optional[int] = Query(None, description="Последний год; по умолчанию равен year_from")
+):
+    """
+    Положение регионов по индикатору за год или диапазон лет: значение, место, перцентиль и квартиль
+    с учетом desired_direction (для 'lower' лучше меньшее значение), а также распределение
+    по регионам за каждый год (min, квартили, медиана, max, среднее). Строка РФ в рейтинг не входит.
+    """
+    year_to = year_to if year_to is not None else year_from
+    if year_to < year_from:
+        raise HTTPException(status_code=400, detail="year_to не может быть меньше year_from.")
+    return await cached_json_response(request, lambda: load_indicator_ranking(indicator_id, year_from, year_to))
+
+
+async def load_indicator_ranking(indicator_id: int, year_from: int, year_to: int) -> IndicatorRanking:
+    pool = await get_db_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    rf_region_id = await dictionary_cache.get_id('regions', RF_REGION_NAME) or -1
+
+    async with pool.acquire() as conn:
+        indicator = await conn.fetchrow(
+            "SELECT name, unit, desired_direction FROM indicators WHERE id = $1", indicator_id)
+        if indicator is None:
+            raise HTTPException(status_code=404, detail="Индикатор не найден")
+
+        # Знак "качества": значение * direction больше -- регион лучше
+        direction = -1 if indicator['desired_direction'] == 'lower' else 1
+        region_records = await conn.fetch(
+            """
+            WITH vals AS (
+                SELECT v.year, v.region_id, r.name AS region_name, v.yearly_value::float8 AS value,
+                       v.yearly_value::float8 * $5 AS score
+                FROM indicator_yearly_values v
+                JOIN regions r ON r.id = v.region_id
+                WHERE v.indicator_id = $1 AND v.year BETWEEN $2 AND $3
+                  AND v.region_id <> $4 AND v.yearly_value IS NOT NULL
+            )
+            SELECT year, region_id, region_name, value,
+                   rank() OVER (PARTITION BY year ORDER BY score DESC) AS rank,
+                   percent_rank() OVER (PARTITION BY year ORDER BY score) AS percentile,
+                   ntile(4) OVER (PARTITION BY year ORDER BY score DESC) AS quartile
+            FROM vals
+            ORDER BY year, rank, region_name
+            """,
+            indicator_id, year_from, year_to, rf_region_id, direction
+        )
+        year_records = await conn.fetch(
+            """
+            SELECT v.year,
+                   count(*) FILTER (WHERE v.region_id <> $4) AS regions_count,
+                   min(v.yearly_value::float8) FILTER (WHERE v.region_id <> $4) AS min,
+                   percentile_cont(0.25) WITHIN GROUP (ORDER BY v.yearly_value::float8)
+                       FILTER (WHERE v.region_id <> $4) AS p25,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY v.yearly_value::float8)
+                       FILTER (WHERE v.region_id <> $4) AS median,
+                   percentile_cont(0.75) WITHIN GROUP (ORDER BY v.yearly_value::float8)
+                       FILTER (WHERE v.region_id <> $4) AS p75,
+                   max(v.yearly_value::float8) FILTER (WHERE v.region_id <> $4) AS max,
+                   avg(v.yearly_value::float8) FILTER (WHERE v.region_id <> $4) AS mean,
+                   max(v.yearly_value::float8) FILTER (WHERE v.region_id = $4) AS rf_value
+            FROM indicator_yearly_values v
+            WHERE v.indicator_id = $1 AND v.year BETWEEN $2 AND $3 AND v.yearly_value IS NOT NULL
+            GROUP BY v.year
+            HAVING count(*) FILTER (WHERE v.region_id <> $4) > 0
+            ORDER BY v.year
+            """,
+            indicator_id, year_from, year_to, rf_region_id
+        )
+
+    return IndicatorRanking(
+        indicator_id=indicator_id,
+        indicator_name=indicator['name'],
+        unit=indicator['unit'],
+        desired_direction=indicator['desired_direction'],
+        years=[dict(rec) for rec in year_records],
+        regions=[dict(rec) for rec in region_records]
+    )
+
+
+# Ограничение размера пакетного запроса истории
+HISTORY_BATCH_MAX_INDICATORS = 200
+HISTORY_BATCH_MAX_REGIONS = 100
+
+
+@router.get("/indicators/history", response_model=IndicatorHistoryBatch, tags=["Data"])
+async def get_indicators_history_batch(
+        request: Request,
+        indicator_ids: List[int] = Query(..., description="Повторяющийся параметр: ?indicator_ids=1&indicator_ids=2"),
+        region_ids: List[int] = Query(..., description="Повторяющийся параметр: ?region_ids=1&region_ids=2")
+):
+    """
+    Годовые, месячные и эталонные ряды сразу для многих индикаторов и регионов.
+    Ответ колоночный: каждый ряд -- набор параллельных списков, отсортированных
+    по индикатору, региону и дате, без отдельного объекта на каждую точку.
+    """
+    if len(indicator_ids) > HISTORY_BATCH_MAX_INDICATORS or len(region_ids) > HISTORY_BATCH_MAX_REGIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не больше {HISTORY_BATCH_MAX_INDICATORS} индикаторов и {HISTORY_BATCH_MAX_REGIONS} регионов за запрос."
         )
+    return await cached_json_response(
+        request, lambda: load_indicator_history_batch(sorted(set(indicator_ids)), sorted(set(region_ids))))
+
+
+async def load_indicator_history_batch(indicator_ids: List[int], region_ids: List[int]) -> dict:
+    pool = await get_db_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    # Каждый ряд -- одна строка с массивами-колонками: asyncpg декодирует массивы целиком,
+    # а ответ собирается без построчной обработки в Python
+    yearly_query = """
+        SELECT COALESCE(array_agg(indicator_id ORDER BY indicator_id, region_id, year), '{}') AS indicator_id,
+               COALESCE(array_agg(region_id ORDER BY indicator_id, region_id, year), '{}') AS region_id,
+               COALESCE(array_agg(year ORDER BY indicator_id, region_id, year), '{}') AS year,
+               COALESCE(array_agg(yearly_value::float8 ORDER BY indicator_id, region_id, year), '{}') AS value
+        FROM indicator_yearly_values
+        WHERE indicator_id = ANY($1::int[]) AND region_id = ANY($2::int[]) AND yearly_value IS NOT NULL
+    """
+    monthly_query = """
+        SELECT COALESCE(array_agg(indicator_id ORDER BY indicator_id, region_id, value_date), '{}') AS indicator_id,
+               COALESCE(array_agg(region_id ORDER BY indicator_id, region_id, value_date), '{}') AS region_id,
+               COALESCE(array_agg(to_char(value_date, 'YYYY-MM-DD') ORDER BY indicator_id, region_id, value_date),
+                        '{}') AS date,
+               COALESCE(array_agg(measured_value::float8 ORDER BY indicator_id, region_id, value_date), '{}') AS value
+        FROM indicator_monthly_values
+        WHERE indicator_id = ANY($1::int[]) AND region_id = ANY($2::int[]) AND measured_value IS NOT NULL
+    """
+    reference_query = """
+        SELECT COALESCE(array_agg(indicator_id ORDER BY indicator_id, year), '{}') AS indicator_id,
+               COALESCE(array_agg(year ORDER BY indicator_id, year), '{}') AS year,
+               COALESCE(array_agg(reference_value ORDER BY indicator_id, year), '{}') AS value
+        FROM indicator_reference_values
+        WHERE indicator_id = ANY($1::int[]) AND reference_value IS NOT NULL
+    """
+
+    yearly, monthly, reference = await asyncio.gather(
+        _fetch_with_own_connection(pool, 'fetchrow', yearly_query, indicator_ids, region_ids),
+        _fetch_with_own_connection(pool, 'fetchrow', monthly_query, indicator_ids, region_ids),
+        _fetch_with_own_connection(pool, 'fetchrow', reference_query, indicator_ids),
+    )
+    return {'yearly': dict(yearly), 'monthly': dict(monthly), 'reference': dict(reference)}
+
+
+@router.get("/export/{dataset}", tags=["Export"])
+async def export_dataset(
+        dataset: str,
+        format: str = Query('csv', description="csv, parquet или arrow (Arrow IPC stream)"),
+        goal_id: Optional[int] = None,
+        project_id: Optional[int] = None,
+        indicator_ids: Optional[List[int]] = Query(None),
+        region_ids: Optional[List[int]] = Query(None),
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None
+):
+    """
+    Потоковая выгрузка значений: dataset = yearly, monthly (индикаторы) или budgets (бюджеты проектов),
+    с названиями регионов, индикаторов и проектов. Фильтры необязательны и объединяются через И.
+    """
+    filters = {
+        'goal_id': goal_id, 'project_id': project_id, 'indicator_ids': indicator_ids,
+        'region_ids': region_ids, 'year_from': year_from, 'year_to': year_to,
+    }
+    try:
+        validate_export(dataset, format, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if await get_db_pool() is None:
+        raise HTTPException(status_code=503, detail="База данных не подключена.")
+
+    return StreamingResponse(
+        stream_export(dataset, format, filters),
+        media_type=export_media_type(format),
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(dataset, format)}"'}
+    )
 
 
 @router.post("/news/sync", response_model=NewsSyncResponse, tags=["Parser"])
@@ -357,20 +805,19 @@ async def sync_news(file: UploadFile = File(...)):
         if not pool:
             raise HTTPException(status_code=503, detail="База данных не подключена.")
 
-        # Читаем содержимое файла
-        contents = await file.read()
+        # Передаем файл в сервис целиком: новости читаются из него потоково, без file.read()
+        processed, added, updated, duplicates = await import_news_from_upload(pool, file)
 
-        # Передаем содержимое в наш сервис
-        processed, added, updated = await import_news_from_upload(pool, contents)
-
-        print(f"--- Импорт новостей завершен: обработано {processed}, добавлено {added}, обновлено {updated} ---")
+        print(f"--- Импорт новостей завершен: обработано {processed}, добавлено {added}, обновлено {updated}, "
+              f"почти одинаковых {duplicates} ---")
         return NewsSyncResponse(
             message="Синхронизация новостей успешно завершена.",
             records_processed=processed,
             records_added=added,
-            records_updated=updated
+            records_updated=updated,
+            records_duplicates=duplicates
         )
-    except json.JSONDecodeError:
+    except ijson.JSONError:
          raise HTTPException(status_code=400, detail="Не удалось прочитать JSON. Файл поврежден или имеет неверную структуру.")
     except Exception as e:
         print(f"Критическая ошибка во время импорта новостей: {e}")
@@ -0,0 +1,137 @@
+# app/core/cache.py
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import pydantic_core
+from fastapi import Request, Response
+
+from app.core.database import settings
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    data_version: int
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Кэш готовых JSON-ответов читающих эндпоинтов внутри процесса (LRU + TTL).
+
+    Данные в БД меняются только при загрузке (парсинг индикаторов, синхронизация бюджетов и новостей),
+    поэтому загрузчики вызывают bump_data_version(), и все закэшированные ответы становятся недействительными.
+    Одновременные промахи по одному ключу объединяются: запрос к БД выполняет только первый,
+    остальные ждут его результат.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data_version = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def bump_data_version(self):
+        """Вызывается после каждой записи данных: сбрасывает все закэшированные ответы."""
+        self.data_version += 1
+        self._entries.clear()
+
+    def _get_fresh(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.data_version != self.data_version or entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[bytes]]) -> CachedResponse:
+        entry = self._get_fresh(key)
+        if entry is not None:
+            return entry
+
+        # Ключ включает версию данных: расчет, начатый до записи, не отдается запросам после нее
+        flight_key = (key, self.data_version)
+        future = self._in_flight.get(flight_key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Запрос, который выполнял расчет, был отменен (клиент отключился) -- считаем сами
+                return await self.get_or_compute(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = future
+        data_version = self.data_version
+        try:
+            body = await compute()
+            entry = CachedResponse(
+                body=body,
+                etag=f'"{hashlib.sha1(body).hexdigest()}"',
+                data_version=data_version,
+                expires_at=time.monotonic() + self.ttl,
+            )
+            if data_version == self.data_version:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            # Ошибку (например, HTTPException 404) получают все ожидающие, но в кэш она не попадает
+            future.set_exception(e)
+            future.exception()  # Помечаем исключение полученным, если ожидающих не было
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[flight_key]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl=settings.response_cache_ttl,
+)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def render_json(content: Any) -> bytes:
+    """
+    Сериализует ответ в JSON за один проход сериализатором pydantic-core (Rust):
+    модели, словари, списки, даты (ISO 8601) без промежуточного jsonable_encoder,
+    который на длинных рядах обходится на порядок дороже. NaN и бесконечности -- null.
+    """
+    return pydantic_core.to_json(content, inf_nan_mode='null')
+
+
+async def cached_json_response(request: Request, compute: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Отдает ответ эндпоинта из кэша (ключ -- путь и параметры запроса) или вычисляет его через compute().
+    Ответ содержит ETag; если клиент прислал совпадающий If-None-Match, возвращается 304 без тела.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+    async def render() -> bytes:
+        return render_json(await compute())
+
+    entry = await response_cache.get_or_compute(key, render)
+    headers = {'ETag': entry.etag, 'Cache-Control': 'no-cache'}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type='application/json', headers=headers)
@@ -1,4 +1,5 @@
 import asyncpg
+from typing import Optional
 from pydantic_settings import BaseSettings
 import asyncio # Импортируем asyncio для организации пауз
 
@@ -9,6 +10,52 @@ class Settings(BaseSettings):
     db_port: int
     db_name: str
 
+    # Пул соединений с БД: кроме запросов API соединения держат обработчики очереди заданий,
+    # планировщик, потоковые выгрузки, а промах кэша GET /api/data берет несколько соединений сразу
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 20
+
+    # Пакетная загрузка индикаторов с Fedstat
+    ingest_concurrency: int = 8  # Сколько индикаторов обрабатывается одновременно
+    ingest_host_rate_limit: float = 4.0  # Не более N запросов в секунду к одному хосту
+
+    # Общие HTTP-клиенты для внешних источников (см. app/core/http_client.py)
+    http_max_connections: int = 20  # На один хост
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 60.0
+    http_timeout: float = 45.0
+    http_connect_timeout: float = 10.0
+    http2: bool = False  # Требует установленного пакета h2
+
+    # Кэш ответов читающих эндпоинтов (см. app/core/cache.py)
+    response_cache_max_entries: int = 1024
+    response_cache_ttl: float = 300.0  # Секунды; страхует от записей в БД в обход приложения
+
+    # Окно лет, для которых строится проекция дашборда (см. app/services/dashboard_projection.py)
+    dashboard_first_year: int = 2021
+    dashboard_last_year: int = 2030
+
+    # Фоновая очередь заданий (см. app/services/job_queue.py)
+    job_workers: int = 2  # Сколько заданий выполняется одновременно в одном процессе
+    job_max_attempts: int = 3
+    job_retry_base_delay: float = 10.0  # Секунды; пауза перед повтором удваивается с каждой попыткой
+    job_poll_interval: float = 2.0  # Как часто свободный обработчик проверяет очередь
+    job_stale_after: float = 600.0  # Задание без отметки о ходе работы дольше N секунд считается брошенным
+    job_heartbeat_interval: float = 60.0  # Как часто выполняющееся задание отмечает, что оно живо (меньше job_stale_after)
+
+    # Плановое обновление индикаторов по периодичности (см. app/services/refresh_scheduler.py)
+    scheduler_enabled: bool = True
+    scheduler_interval: float = 900.0  # Секунды между проверками сроков
+    scheduler_max_enqueued: int = 20  # Не больше N плановых заданий в очереди одновременно
+    scheduler_failed_cooldown: float = 21600.0  # Секунды до новой попытки по ссылке, задание которой упало
+    scheduler_default_interval_days: float = 30.0  # Для непонятной или пустой периодичности
+
+    # Обход новостей club-rf.ru (см. app/services/news_crawler.py)
+    clubrf_concurrency: int = 4  # Сколько статей скачивается одновременно
+    clubrf_host_rate_limit: float = 2.0  # Не более N запросов в секунду к сайту
+    clubrf_max_list_pages: int = 20  # Глубина обхода ленты, если прежняя позиция не найдена
+    clubrf_default_goal: Optional[str] = None  # Нац. цель для статей, рубрики которых не совпали ни с одной целью
+
     class Config:
         env_file = (".env", "../.env")
         env_file_encoding = 'utf-8'
@@ -22,6 +69,15 @@ db_pool = None
 async def get_db_pool():
     return db_pool
 
+async def _init_connection(conn: asyncpg.Connection):
+    """
+    Настройка каждого соединения пула: NUMERIC/DECIMAL читаются сразу как float, а не decimal.Decimal.
+    Значения индикаторов и бюджетов в API и так отдаются как float, а поштучное преобразование
+    Decimal на длинных рядах заметно дороже. Параметры NUMERIC передаются в текстовом виде.
+    """
+    await conn.set_type_codec('numeric', schema='pg_catalog', encoder=str, decoder=float, format='text')
+
+
 async def connect_to_db():
     """
     Подключается к базе данных с несколькими попытками.
@@ -34,7 +90,9 @@ async def connect_to_db():
         print(f"Подключение к базе данных... (Попытка {i + 1}/{attempts})", flush=True)
         try:
             # Пытаемся создать пул соединений
-            db_pool = await asyncpg.create_pool(DB_URL, min_size=1, max_size=10, timeout=5)
+            db_pool = await asyncpg.create_pool(
+                DB_URL, min_size=settings.db_pool_min_size, max_size=settings.db_pool_max_size,
+                timeout=5, init=_init_connection)
             print("✅ Подключение к базе данных успешно!", flush=True)
             return # Выходим из функции при успехе
         except Exception as e:
@@ -0,0 +1,56 @@
+# app/core/http_client.py
+import httpx
+from typing import Dict
+from urllib.parse import urlparse
+
+from app.core.database import settings
+
+# Один долгоживущий клиент на каждый внешний хост (fedstat.ru, API бюджетов и т.д.).
+# Клиент держит keep-alive пул соединений, поэтому повторные запросы к хосту
+# не тратят время на новое TCP+TLS рукопожатие.
+http_clients: Dict[str, httpx.AsyncClient] = {}
+
+_http2_enabled = False
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_enabled)
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """
+    Возвращает общий клиент для хоста из url, создавая его при первом обращении.
+    Клиент нельзя закрывать в вызывающем коде — им владеет приложение.
+    """
+    parsed = urlparse(url)
+    key = f"{parsed.scheme}://{parsed.netloc}"
+    client = http_clients.get(key)
+    if client is None or client.is_closed:
+        client = _build_client()
+        http_clients[key] = client
+    return client
+
+
+async def start_http_clients():
+    """Настраивает реестр клиентов при старте приложения."""
+    global _http2_enabled
+    _http2_enabled = False
+    if settings.http2:
+        try:
+            import h2  # noqa: F401 -- httpx поддерживает HTTP/2 только при установленном пакете h2
+            _http2_enabled = True
+        except ImportError:
+            print("⚠️ HTTP/2 включен в настройках, но пакет h2 не установлен. Используется HTTP/1.1.", flush=True)
+
+
+async def close_http_clients():
+    """Закрывает все клиенты и их пулы соединений."""
+    for client in http_clients.values():
+        await client.aclose()
+    http_clients.clear()
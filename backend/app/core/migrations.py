@@ -0,0 +1,255 @@
+# app/core/migrations.py
+#
+# Версионированные миграции схемы поверх sql/scripts.
+# Базовый скрипт создает исходную схему, а все последующие изменения описываются здесь
+# и применяются приложением при старте (lifespan) по одному разу, в порядке версий.
+# Примененные версии записываются в таблицу schema_migrations.
+#
+# Чтобы изменить схему, добавьте в конец MIGRATIONS новую запись со следующим номером версии.
+# Уже примененные миграции менять нельзя.
+
+from datetime import date
+from typing import Awaitable, Callable, List, Tuple, Union
+
+from asyncpg import Connection
+
+from app.core.database import get_db_pool
+
+# Сессионная advisory-блокировка: миграции выполняет только один процесс, остальные ждут
+_MIGRATIONS_LOCK_KEY = 7_240_000
+
+# Годовые секции таблиц значений создаются на этот диапазон лет, остальное попадает в секцию DEFAULT
+PARTITION_FIRST_YEAR = 2000
+PARTITION_LAST_YEAR = 2035
+
+
+async def _partition_value_table(conn: Connection, table: str, key_column: str, key_type: str,
+                                 value_column: str):
+    """
+    Превращает таблицу значений в секционированную по годам (PARTITION BY RANGE).
+    Данные копируются в новую таблицу с той же структурой и тем же ключом уникальности,
+    после чего старая удаляется. Если таблица уже секционирована, ничего не делает.
+    """
+    relkind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = $1::regclass", table)
+    if relkind == 'p':
+        return
+
+    count = await conn.fetchval(f"SELECT count(*) FROM {table}")
+    print(f"Секционирование {table} по годам ({count} строк)...", flush=True)
+
+    # Старая таблица переименовывается вместе с индексами и последовательностью,
+    # чтобы новые объекты получили прежние имена
+    await conn.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    index_names = await conn.fetch("SELECT indexname FROM pg_indexes WHERE tablename = $1", f"{table}_unpartitioned")
+    for number, record in enumerate(index_names):
+        await conn.execute(f'ALTER INDEX "{record["indexname"]}" RENAME TO {table}_unpartitioned_idx{number}')
+    await conn.execute(f"ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {table}_unpartitioned_id_seq")
+    await conn.execute(
+        f"""
+        CREATE TABLE {table} (
+            id SERIAL,
+            indicator_id INT NOT NULL REFERENCES indicators(id) ON DELETE CASCADE,
+            region_id INT NOT NULL REFERENCES regions(id) ON DELETE CASCADE,
+            {key_column} {key_type} NOT NULL,
+            {value_column} DECIMAL(18, 4),
+            UNIQUE (indicator_id, region_id, {key_column})
+        ) PARTITION BY RANGE ({key_column})
+        """
+    )
+    for year in range(PARTITION_FIRST_YEAR, PARTITION_LAST_YEAR + 1):
+        if key_type == 'DATE':
+            bounds = f"'{date(year, 1, 1)}' TO '{date(year + 1, 1, 1)}'"
+        else:
+            bounds = f"{year} TO {year + 1}"
+        await conn.execute(f"CREATE TABLE {table}_y{year} PARTITION OF {table} FOR VALUES FROM ({bounds})")
+    await conn.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    await conn.execute(
+        f"""
+        INSERT INTO {table} (id, indicator_id, region_id, {key_column}, {value_column})
+        SELECT id, indicator_id, region_id, {key_column}, {value_column} FROM {table}_unpartitioned
+        """
+    )
+    await conn.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)")
+    await conn.execute(f"DROP TABLE {table}_unpartitioned")
+
+
+async def _partition_value_tables(conn: Connection):
+    await _partition_value_table(conn, 'indicator_yearly_values', 'year', 'INT', 'yearly_value')
+    await _partition_value_table(conn, 'indicator_monthly_values', 'value_date', 'DATE', 'measured_value')
+
+
+Migration = Tuple[int, str, Union[str, Callable[[Connection], Awaitable[None]]]]
+
+MIGRATIONS: List[Migration] = [
+    (1, "Отпечаток данных индикатора", """
+        ALTER TABLE indicators ADD COLUMN IF NOT EXISTS data_fingerprint TEXT;
+    """),
+    (2, "Таблицы проекции дашборда", """
+        CREATE TABLE IF NOT EXISTS dashboard_indicator_rows (
+            region_id INT NOT NULL REFERENCES regions(id) ON DELETE CASCADE,
+            goal_id INT NOT NULL,
+            project_id INT NOT NULL,
+            year INT NOT NULL,
+            indicator_id INT NOT NULL REFERENCES indicators(id) ON DELETE CASCADE,
+            metric_id INT NOT NULL,
+            metric_name TEXT NOT NULL,
+            indicator_name TEXT NOT NULL,
+            unit VARCHAR(255),
+            desired_direction VARCHAR(10),
+            region_value DECIMAL(18, 4),
+            target_value TEXT,
+            rf_value NUMERIC,
+            PRIMARY KEY (region_id, goal_id, project_id, year, indicator_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_dashboard_indicator_rows_indicator ON dashboard_indicator_rows (indicator_id);
+
+        CREATE TABLE IF NOT EXISTS dashboard_budget_totals (
+            region_id INT NOT NULL REFERENCES regions(id) ON DELETE CASCADE,
+            project_id INT NOT NULL REFERENCES national_projects(id) ON DELETE CASCADE,
+            year INT NOT NULL,
+            allocated DECIMAL(18, 2),
+            executed DECIMAL(18, 2),
+            PRIMARY KEY (project_id, region_id, year)
+        );
+    """),
+    (3, "Секционирование таблиц значений по годам", _partition_value_tables),
+    (4, "Покрывающие индексы для бюджетов, мероприятий и значений", """
+        -- История и суммы бюджета: фильтр по проекту и региону, диапазон дат, суммы без обращения к таблице
+        CREATE INDEX IF NOT EXISTS idx_project_budgets_project_region_date
+            ON project_budgets (project_id, region_id, relevance_date)
+            INCLUDE (amount_allocated, amount_executed);
+
+        -- Мероприятия проекта по региону и по всей РФ, сразу в порядке выдачи
+        CREATE INDEX IF NOT EXISTS idx_project_activities_project_region_date
+            ON project_activities (project_id, region_id, activity_date DESC NULLS LAST);
+        CREATE INDEX IF NOT EXISTS idx_project_activities_project_date
+            ON project_activities (project_id, activity_date DESC NULLS LAST);
+
+        -- История индикатора по региону и средние по РФ (пересчет проекции)
+        CREATE INDEX IF NOT EXISTS idx_indicator_yearly_values_history
+            ON indicator_yearly_values (indicator_id, region_id, year) INCLUDE (yearly_value);
+        CREATE INDEX IF NOT EXISTS idx_indicator_yearly_values_indicator_year
+            ON indicator_yearly_values (indicator_id, year) INCLUDE (region_id, yearly_value);
+        CREATE INDEX IF NOT EXISTS idx_indicator_monthly_values_history
+            ON indicator_monthly_values (indicator_id, region_id, value_date) INCLUDE (measured_value);
+
+        -- Связи, по которым собирается проекция и список проектов цели
+        CREATE INDEX IF NOT EXISTS idx_indicator_to_project_mapping_project
+            ON indicator_to_project_mapping (project_id, indicator_id);
+        CREATE INDEX IF NOT EXISTS idx_project_to_goal_mapping_goal
+            ON project_to_goal_mapping (goal_id, project_id);
+
+        ANALYZE project_budgets, project_activities, indicator_yearly_values, indicator_monthly_values;
+    """),
+    (5, "Очередь фоновых заданий", """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, succeeded, failed
+            stage TEXT,
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL,
+            run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            heartbeat_at TIMESTAMPTZ,
+            stage_timings JSONB NOT NULL DEFAULT '{}',
+            result JSONB,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_after, id) WHERE status = 'queued';
+        CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (heartbeat_at) WHERE status = 'running';
+    """),
+    (6, "Индекс заданий по ссылке для планировщика обновлений", """
+        CREATE INDEX IF NOT EXISTS idx_jobs_url ON jobs (kind, (payload->>'url'), status, finished_at);
+    """),
+    (7, "Текст мероприятий и индексы для постраничной выдачи", """
+        -- Импорт новостей пишет полный текст, а в исходной схеме колонки не было
+        ALTER TABLE project_activities ADD COLUMN IF NOT EXISTS text TEXT;
+
+        -- Keyset-пагинация: порядок выдачи (activity_date DESC NULLS LAST, id DESC) целиком в индексе.
+        -- Заменяют индексы миграции 4 без id
+        DROP INDEX IF EXISTS idx_project_activities_project_region_date;
+        DROP INDEX IF EXISTS idx_project_activities_project_date;
+        CREATE INDEX IF NOT EXISTS idx_project_activities_project_region_keyset
+            ON project_activities (project_id, region_id, activity_date DESC NULLS LAST, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_project_activities_project_keyset
+            ON project_activities (project_id, activity_date DESC NULLS LAST, id DESC);
+    """),
+    (8, "Полнотекстовый поиск по мероприятиям", """
+        -- Генерируемая колонка: Postgres пересчитывает ее при каждой вставке и обновлении,
+        -- поэтому импорт новостей поддерживает ее без изменений в коде загрузки
+        ALTER TABLE project_activities ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('russian', coalesce(responsible_body, '')), 'B') ||
+                setweight(to_tsvector('russian', coalesce(text, '')), 'C')
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_project_activities_search
+            ON project_activities USING GIN (search_vector);
+    """),
+    (9, "Отпечатки новостей для поиска почти одинаковых", """
+        -- MinHash-сигнатура текста (app/services/news_dedup.py); NULL -- текст слишком короткий
+        -- или новость импортирована до этой миграции (см. other/backfill_news_minhash.py)
+        ALTER TABLE project_activities ADD COLUMN IF NOT EXISTS minhash BYTEA;
+
+        -- LSH-индекс: ключ полосы сигнатуры (с учетом региона) -> новость
+        CREATE TABLE IF NOT EXISTS activity_lsh_bands (
+            band_hash BIGINT NOT NULL,
+            activity_id INT NOT NULL REFERENCES project_activities(id) ON DELETE CASCADE,
+            PRIMARY KEY (band_hash, activity_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_activity_lsh_bands_activity ON activity_lsh_bands (activity_id);
+    """),
+    (10, "Состояние обхода новостных сайтов", """
+        -- Курсор обходчика (app/services/news_crawler.py): валидаторы ленты для условного GET,
+        -- самая новая обработанная ссылка и статьи, которые не удалось скачать (повтор в следующий раз)
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            source TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            last_link TEXT,
+            pending JSONB NOT NULL DEFAULT '[]'::jsonb,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """),
+]
+
+
+async def run_migrations():
+    """Применяет все еще не примененные миграции. Вызывается при старте приложения."""
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", _MIGRATIONS_LOCK_KEY)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )
+                """
+            )
+            applied = {r['version'] for r in await conn.fetch("SELECT version FROM schema_migrations")}
+
+            for version, name, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+                print(f"Применение миграции {version}: {name}...", flush=True)
+                async with conn.transaction():
+                    if isinstance(migration, str):
+                        await conn.execute(migration)
+                    else:
+                        await migration(conn)
+                    await conn.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", _MIGRATIONS_LOCK_KEY)
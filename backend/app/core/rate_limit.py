@@ -0,0 +1,33 @@
+# app/core/rate_limit.py
+import asyncio
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    Ограничивает частоту исходящих запросов к каждому хосту.
+    Запросы к одному хосту выстраиваются в очередь с интервалом не меньше 1 / rate секунд,
+    запросы к разным хостам друг друга не ждут.
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self.min_interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        """Дожидается своего слота для запроса к хосту из url."""
+        if not self.min_interval:
+            return
+
+        host = urlparse(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -2,14 +2,31 @@
 
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from app.core.database import connect_to_db, close_db_connection
+from app.core.database import connect_to_db, close_db_connection, get_db_pool
+from app.core.http_client import start_http_clients, close_http_clients
+from app.core.migrations import run_migrations
 from app.api.endpoints import router as api_router
+from app.services.dictionary_cache import dictionary_cache
+from app.services.dashboard_projection import ensure_projection
+from app.services.job_queue import job_queue
+from app.services.refresh_scheduler import refresh_scheduler
 from fastapi.middleware.cors import CORSMiddleware # 1. Импортируйте middleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_to_db()
+    if await get_db_pool():
+        await run_migrations()
+        await dictionary_cache.load()
+        await ensure_projection()
+    await start_http_clients()
+    if await get_db_pool():
+        await job_queue.start()
+        refresh_scheduler.start()
     yield
+    await refresh_scheduler.stop()
+    await job_queue.stop()
+    await close_http_clients()
     await close_db_connection()
 
 app = FastAPI(
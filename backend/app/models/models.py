@@ -1,7 +1,7 @@
 # app/models/models.py
 
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional
+from pydantic import BaseModel, HttpUrl, Field
+from typing import Any, Dict, List, Optional
 import datetime
 from datetime import date
 
@@ -15,6 +15,77 @@ class ParseResponse(BaseModel):
     indicator_name: str
     monthly_rows_added: int
     yearly_rows_added: int
+    unchanged: bool = False  # Данные совпали с прошлым парсингом, запись в БД пропущена
+    rows_changed: int = 0
+
+class BatchParseRequest(BaseModel):
+    # Либо явный список ссылок, либо all_indicators=True (все индикаторы с source_url)
+    urls: Optional[List[HttpUrl]] = None
+    all_indicators: bool = False
+    concurrency: Optional[int] = Field(default=None, ge=1, le=50)
+    host_rate_limit: Optional[float] = Field(default=None, gt=0, description="Запросов в секунду к одному хосту")
+
+class BatchParseItemResult(BaseModel):
+    url: str
+    status: str  # 'ok' или 'error'
+    indicator_name: Optional[str] = None
+    monthly_rows_added: int = 0
+    yearly_rows_added: int = 0
+    unchanged: bool = False
+    rows_changed: int = 0
+    duration_seconds: float
+    error: Optional[str] = None
+
+class BatchParseResponse(BaseModel):
+    message: str
+    total: int
+    succeeded: int
+    failed: int
+    duration_seconds: float
+    results: List[BatchParseItemResult]
+
+class JobSubmitResponse(BaseModel):
+    job_id: int
+    status: str
+
+class JobStatus(BaseModel):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    status: str  # queued, running, succeeded, failed
+    stage: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    run_after: datetime.datetime
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    stage_timings: Dict[str, float] = {}  # Секунды по этапам последней попытки
+    result: Optional[Dict[str, Any]] = None  # Для parse_indicator: название и число строк, как в ParseResponse
+    error: Optional[str] = None
+
+class IndicatorStaleness(BaseModel):
+    indicator_id: int
+    name: str
+    source_url: str
+    periodicity: Optional[str] = None
+    use_for_agent: bool
+    refresh_interval_days: float
+    last_parsed_at: Optional[datetime.datetime] = None
+    last_checked_at: Optional[datetime.datetime] = None  # Последний парсинг или успешное задание по ссылке
+    next_due_at: Optional[datetime.datetime] = None  # None -- индикатор еще ни разу не парсился
+    overdue_seconds: Optional[int] = None  # Отрицательное значение -- до срока еще столько секунд
+    is_due: bool
+
+class StalenessReport(BaseModel):
+    total: int
+    due: int
+    never_parsed: int
+    items: List[IndicatorStaleness]  # В порядке приоритета обновления
+
+class RefreshDueResponse(BaseModel):
+    message: str
+    job_ids: List[int]
 
 class BudgetSyncResponse(BaseModel):
     message: str
@@ -66,7 +137,7 @@ class ProjectParameter(BaseModel):
 
 class TimeSeriesDataPoint(BaseModel):
     date: str
-    value: float
+    value: Optional[float] = None
 
 # Модель для эталонных значений (value может быть текстом)
 class ReferenceDataPoint(BaseModel):
@@ -78,8 +149,82 @@ class IndicatorHistory(BaseModel):
     monthly_data: List[TimeSeriesDataPoint]
     reference_data: List[ReferenceDataPoint] # <-- Добавлено
 
+# Пакетная история в колоночном виде: i-я точка ряда -- i-е элементы всех списков
+class YearlySeriesColumns(BaseModel):
+    indicator_id: List[int]
+    region_id: List[int]
+    year: List[int]
+    value: List[float]
+
+class MonthlySeriesColumns(BaseModel):
+    indicator_id: List[int]
+    region_id: List[int]
+    date: List[str]  # YYYY-MM-DD
+    value: List[float]
+
+class ReferenceSeriesColumns(BaseModel):
+    indicator_id: List[int]
+    year: List[int]
+    value: List[str]
+
+class IndicatorHistoryBatch(BaseModel):
+    yearly: YearlySeriesColumns
+    monthly: MonthlySeriesColumns
+    reference: ReferenceSeriesColumns
+
+class RegionRank(BaseModel):
+    year: int
+    region_id: int
+    region_name: str
+    value: float
+    rank: int  # 1 -- лучший регион с учетом desired_direction
+    percentile: float  # Доля регионов, у которых значение хуже (0..1)
+    quartile: int  # 1 -- лучшая четверть
+
+class YearDistribution(BaseModel):
+    year: int
+    regions_count: int
+    min: float
+    p25: float
+    median: float
+    p75: float
+    max: float
+    mean: float
+    rf_value: Optional[float] = None  # Значение строки "Российская Федерация", если оно загружено
+
+class IndicatorRanking(BaseModel):
+    indicator_id: int
+    indicator_name: str
+    unit: Optional[str] = None
+    desired_direction: Optional[str] = None
+    years: List[YearDistribution]
+    regions: List[RegionRank]  # По годам, внутри года -- по месту
+
+
+class ActivitySummary(BaseModel):
+    id: int
+    title: str
+    activity_date: Optional[datetime.date] = None
+    link: Optional[str] = None
+    responsible_body: Optional[str] = None
+    importance: Optional[int] = None
+
+class ActivityPage(BaseModel):
+    items: List[ActivitySummary]
+    next_cursor: Optional[str] = None  # Передать как cursor для следующей страницы; None -- страниц больше нет
+
+class ActivitySearchHit(ActivitySummary):
+    project_id: int
+    region_id: Optional[int] = None  # NULL у новостей без региона
+    rank: float
+    snippet: str  # Фрагменты текста, совпадения размечены <mark>, остальное экранировано
+
+class ActivitySearchResponse(BaseModel):
+    items: List[ActivitySearchHit]
+    has_more: bool
 
 class ProjectActivity(BaseModel):
+    id: Optional[int] = None
     title: str
     activity_date: Optional[datetime.date] = None
     link: Optional[str] = None
@@ -92,7 +237,8 @@ class ProjectDetails(BaseModel):
     name: str
     budget: List[BudgetItem]
     metrics: List[MetricData]
-    activities: List[ProjectActivity]
+    activities: List[ActivitySummary]  # Первая страница, без текста новостей
+    activities_next_cursor: Optional[str] = None  # Продолжение -- GET /api/projects/{id}/activities
     parameters: List[ProjectParameter]
 
 
@@ -119,3 +265,4 @@ class NewsSyncResponse(BaseModel):
     records_processed: int
     records_added: int
     records_updated: int
+    records_duplicates: int  # Не записаны: почти одинаковы с уже сохраненными новостями того же региона
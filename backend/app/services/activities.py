@@ -0,0 +1,87 @@
+# app/services/activities.py
+#
+# Постраничная выдача мероприятий (новостей) проекта с keyset-курсором по (activity_date, id).
+# Порядок: activity_date DESC NULLS LAST, id DESC -- как у индексов миграции 7, поэтому каждая
+# страница читается индексным диапазоном от курсора, а не пропуском OFFSET строк.
+# Списки не содержат полный текст новости: он отдается отдельно по id мероприятия.
+
+import datetime
+from typing import List, Optional, Tuple
+
+from asyncpg import Connection
+
+ACTIVITIES_PAGE_SIZE = 20
+ACTIVITIES_MAX_PAGE_SIZE = 200
+
+_SUMMARY_COLUMNS = "id, title, activity_date, link, responsible_body, importance"
+
+
+def encode_cursor(activity_date: Optional[datetime.date], activity_id: int) -> str:
+    """Курсор на строку: "<дата>_<id>", для мероприятий без даты -- "_<id>". Клиент передает его как есть."""
+    return f"{activity_date.isoformat() if activity_date else ''}_{activity_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime.date], int]:
+    """Разбирает курсор; ValueError, если он поврежден."""
+    date_part, _, id_part = cursor.rpartition('_')
+    return (datetime.date.fromisoformat(date_part) if date_part else None), int(id_part)
+
+
+async def fetch_activities_page(conn: Connection, project_id: int, region_id: Optional[int] = None,
+                                min_importance: Optional[int] = None, limit: int = ACTIVITIES_PAGE_SIZE,
+                                cursor: Optional[str] = None) -> Tuple[List, Optional[str]]:
+    """
+    Страница мероприятий проекта (region_id=None -- по всем регионам) после курсора.
+    Возвращает (строки, курсор следующей страницы или None, если страница последняя).
+    """
+    after_date, after_id = decode_cursor(cursor) if cursor else (None, None)
+
+    conditions = ["project_id = $1"]
+    args = [project_id]
+    if region_id is not None:
+        args.append(region_id)
+        conditions.append(f"region_id = ${len(args)}")
+    if min_importance is not None:
+        args.append(min_importance)
+        conditions.append(f"importance >= ${len(args)}")
+
+    async def fetch_part(part_conditions: List[str], part_args: list, part_limit: int):
+        query = f"""
+            SELECT {_SUMMARY_COLUMNS}
+            FROM project_activities
+            WHERE {' AND '.join(conditions + part_conditions)}
+            ORDER BY activity_date DESC NULLS LAST, id DESC
+            LIMIT {part_limit}
+        """
+        return await conn.fetch(query, *args, *part_args)
+
+    # Мероприятия без даты идут последними. Датированные и недатированные читаются отдельными
+    # запросами, чтобы условие на курсор в каждом было простым диапазоном по индексу
+    rows = []
+    n = len(args)
+    if cursor is None or after_date is not None:
+        dated_conditions = ["activity_date IS NOT NULL"]
+        dated_args = []
+        if after_date is not None:
+            dated_conditions.append(f"(activity_date, id) < (${n + 1}, ${n + 2})")
+            dated_args = [after_date, after_id]
+        rows = list(await fetch_part(dated_conditions, dated_args, limit + 1))
+
+    if len(rows) <= limit:
+        undated_conditions = ["activity_date IS NULL"]
+        undated_args = []
+        if cursor is not None and after_date is None:
+            undated_conditions.append(f"id < ${n + 1}")
+            undated_args = [after_id]
+        rows += await fetch_part(undated_conditions, undated_args, limit + 1 - len(rows))
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['activity_date'], rows[-1]['id'])
+
+
+async def fetch_activity(conn: Connection, activity_id: int):
+    """Мероприятие целиком, вместе с полным текстом."""
+    return await conn.fetchrow(
+        f"SELECT {_SUMMARY_COLUMNS}, text FROM project_activities WHERE id = $1", activity_id)
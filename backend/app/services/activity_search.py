@@ -0,0 +1,95 @@
+# app/services/activity_search.py
+#
+# Полнотекстовый поиск по мероприятиям и новостям (project_activities).
+# Колонка search_vector (миграция 8) -- генерируемый tsvector с русской конфигурацией:
+# заголовок (вес A), ответственный (B) и текст (C). Postgres пересчитывает ее сам при каждой
+# вставке и обновлении, в том числе при импорте новостей, а GIN-индекс обслуживает условие @@.
+#
+# Запрос пользователя разбирается websearch_to_tsquery: слова, "фразы в кавычках", or, -исключение.
+# Ранжирование -- ts_rank_cd по самым новым SEARCH_RANK_CANDIDATES совпадениям (частое слово может
+# встречаться в сотнях тысяч новостей, а ранжирование каждой требует распаковки tsvector);
+# фрагменты с подсветкой (ts_headline) строятся только для строк страницы.
+
+import html
+from typing import Any, Dict, List, Optional, Tuple
+
+from asyncpg import Connection
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+# Сколько самых новых совпадений ранжируется; дальше этой глубины страницы не листаются
+SEARCH_RANK_CANDIDATES = 5000
+
+# ts_headline выделяет совпадения управляющими символами; после экранирования HTML они заменяются на <mark>
+_START_SEL = '\x02'
+_STOP_SEL = '\x03'
+_HEADLINE_OPTIONS = (f'MaxFragments=2, MaxWords=25, MinWords=8, FragmentDelimiter=" … ", '
+                     f'StartSel="{_START_SEL}", StopSel="{_STOP_SEL}"')
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    """Экранирует HTML во фрагменте и размечает совпадения тегом <mark>."""
+    return html.escape(snippet or '').replace(_START_SEL, '<mark>').replace(_STOP_SEL, '</mark>')
+
+
+async def search_activities(conn: Connection, query: str, project_id: Optional[int] = None,
+                            region_id: Optional[int] = None, date_from=None, date_to=None,
+                            sort: str = 'relevance', limit: int = SEARCH_PAGE_SIZE,
+                            offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Ищет мероприятия по запросу с необязательными фильтрами. Возвращает (строки страницы, есть ли еще).
+    sort: 'relevance' (ts_rank_cd, при равенстве -- новее выше) или 'date' (сначала новые).
+    Каждая строка содержит rank и snippet -- фрагменты текста с совпадениями в <mark>.
+    """
+    conditions = ["a.search_vector @@ q.query"]
+    args: List[Any] = [query]
+    for condition, value in (("a.project_id = ${}", project_id), ("a.region_id = ${}", region_id),
+                             ("a.activity_date >= ${}", date_from), ("a.activity_date <= ${}", date_to)):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.format(len(args)))
+    n = len(args)
+    args += [SEARCH_RANK_CANDIDATES, limit + 1, offset, _HEADLINE_OPTIONS]
+
+    order_by = "rank DESC, m.activity_date DESC NULLS LAST, m.id DESC" if sort == 'relevance' \
+        else "m.activity_date DESC NULLS LAST, m.id DESC"
+
+    # Совпадения отбираются по GIN-индексу без чтения tsvector; ранжируются (с распаковкой tsvector)
+    # только SEARCH_RANK_CANDIDATES самых новых из них, а фрагменты строятся только для страницы
+    records = await conn.fetch(
+        f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('russian', $1) AS query
+        ),
+        matches AS (
+            SELECT a.id, a.activity_date
+            FROM project_activities a, q
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.activity_date DESC NULLS LAST, a.id DESC
+            LIMIT ${n + 1}
+        ),
+        page AS (
+            SELECT m.id, m.activity_date, ts_rank_cd(a.search_vector, q.query) AS rank
+            FROM matches m
+            JOIN project_activities a ON a.id = m.id
+            CROSS JOIN q
+            ORDER BY {order_by}
+            LIMIT ${n + 2} OFFSET ${n + 3}
+        )
+        SELECT a.id, a.title, a.activity_date, a.link, a.responsible_body, a.importance,
+               a.project_id, a.region_id, m.rank::float8 AS rank,
+               ts_headline('russian', COALESCE(NULLIF(a.text, ''), a.title), q.query, ${n + 4}) AS snippet
+        FROM page m
+        JOIN project_activities a ON a.id = m.id
+        CROSS JOIN q
+        ORDER BY {order_by}
+        """,
+        *args
+    )
+
+    rows = []
+    for record in records[:limit]:
+        row = dict(record)
+        row['snippet'] = _highlight(row['snippet'])
+        rows.append(row)
+    return rows, len(records) > limit
@@ -0,0 +1,87 @@
+# app/services/batch_ingest.py
+import asyncio
+import time
+from typing import List, Dict, Any, Optional
+
+from app.core.database import get_db_pool, settings
+from app.core.rate_limit import HostRateLimiter
+from app.services.parser import get_indicator_data_from_url, StageCallback
+from app.services.db_manager import save_parsed_data
+
+
+async def get_indicator_source_urls() -> List[str]:
+    """Возвращает ссылки на источники всех индикаторов, у которых заполнен source_url."""
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    async with pool.acquire() as conn:
+        records = await conn.fetch(
+            """
+            SELECT DISTINCT source_url
+            FROM indicators
+            WHERE source_url IS NOT NULL AND btrim(source_url) <> ''
+            ORDER BY source_url
+            """
+        )
+    return [r['source_url'].strip() for r in records]
+
+
+async def ingest_indicator_url(url: str, rate_limiter: Optional[HostRateLimiter] = None,
+                               on_stage: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """
+    Скачивает, разбирает и сохраняет один индикатор. Ошибки пробрасываются вызывающему.
+    on_stage получает этапы парсера и этап save перед записью в БД.
+    """
+    metadata, monthly_df, yearly_df = await get_indicator_data_from_url(url, rate_limiter=rate_limiter,
+                                                                        on_stage=on_stage)
+    if metadata is None or not metadata.get('name'):
+        raise ValueError("Не удалось спарсить данные.")
+
+    monthly_rows = len(monthly_df) if monthly_df is not None else 0
+    yearly_rows = len(yearly_df) if yearly_df is not None else 0
+    if on_stage:
+        await on_stage('save')
+    save_summary = await save_parsed_data(metadata=metadata, monthly_df=monthly_df, yearly_df=yearly_df)
+
+    return {
+        'indicator_name': metadata['name'],
+        'monthly_rows_added': monthly_rows,
+        'yearly_rows_added': yearly_rows,
+        'unchanged': save_summary['unchanged'],
+        'rows_changed': save_summary['yearly_rows_changed'] + save_summary['monthly_rows_changed'],
+    }
+
+
+async def run_batch_ingest(
+        urls: List[str],
+        concurrency: Optional[int] = None,
+        host_rate_limit: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Обрабатывает список ссылок конкурентно: одновременно выполняется не более concurrency
+    индикаторов, а к одному хосту уходит не более host_rate_limit запросов в секунду.
+    Ошибка одного индикатора не прерывает остальные — она попадает в его строку результата.
+    Результаты возвращаются в порядке исходного списка (дубликаты ссылок отбрасываются).
+    """
+    concurrency = concurrency or settings.ingest_concurrency
+    rate_limiter = HostRateLimiter(host_rate_limit or settings.ingest_host_rate_limit)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.monotonic()
+            result = {'url': url}
+            try:
+                result.update(await ingest_indicator_url(url, rate_limiter))
+                result['status'] = 'ok'
+            except Exception as e:
+                print(f"Ошибка пакетной обработки {url}: {e}")
+                result['status'] = 'error'
+                result['error'] = str(e)
+            result['duration_seconds'] = round(time.monotonic() - started, 3)
+            return result
+
+    unique_urls = list(dict.fromkeys(urls))
+    print(f"--- Пакетная обработка: {len(unique_urls)} ссылок, параллельно {concurrency} ---")
+    return await asyncio.gather(*(worker(url) for url in unique_urls))
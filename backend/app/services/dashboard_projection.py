@@ -0,0 +1,190 @@
+# app/services/dashboard_projection.py
+#
+# Проекция для GET /api/data: готовые строки индикаторов по ключу (регион, цель, проект, год)
+# и суммы бюджетов по (регион, проект, год). Эндпоинт читает их одним индексным запросом
+# вместо соединения пяти таблиц и расчета среднего по РФ на каждый запрос.
+#
+# Проекция обновляется точечно в той же транзакции, что и запись данных:
+# после парсинга индикатора -- его строки (по всем регионам, т.к. меняется и среднее по РФ),
+# после синхронизации бюджетов -- суммы затронутых пар (регион, проект),
+# после появления нового региона (dictionary_cache.resolve_ids) -- его строки по всем индикаторам.
+# Полная перестройка нужна только после изменения справочников (other/populate_db.py).
+
+from typing import Iterable, List, Optional, Tuple
+
+from asyncpg import Connection
+
+from app.core.database import get_db_pool, settings
+
+# Транзакционные advisory-блокировки строк индикаторов. Точечное обновление берет разделяемую
+# блокировку _PROJECTION_LOCK_KEY и исключительную (_PROJECTION_LOCK_KEY, indicator_id) на каждый
+# индикатор, поэтому параллельные загрузки разных индикаторов не ждут друг друга. Полная перестройка
+# и обновление по регионам затрагивают все индикаторы и берут _PROJECTION_LOCK_KEY исключительно.
+_PROJECTION_LOCK_KEY = 7_240_001
+# Суммы бюджетов обновляются редко (синхронизация бюджетов), им хватает одной блокировки
+_BUDGET_TOTALS_LOCK_KEY = 7_240_002
+
+
+def projection_covers_year(year: int) -> bool:
+    """Строки индикаторов хранятся только для окна лет, которое показывает дашборд."""
+    return settings.dashboard_first_year <= year <= settings.dashboard_last_year
+
+
+async def refresh_indicator_rows(conn: Connection, indicator_ids: Optional[Iterable[int]] = None,
+                                 region_ids: Optional[Iterable[int]] = None):
+    """
+    Пересчитывает строки индикаторов в проекции: indicator_ids -- только этих индикаторов,
+    region_ids -- только этих регионов (по всем индикаторам), оба None -- полная перестройка.
+    Должна вызываться внутри транзакции.
+    """
+    ids = sorted(set(indicator_ids)) if indicator_ids is not None else None
+    regions = sorted(set(region_ids)) if region_ids is not None else None
+
+    if ids is not None and regions is None:
+        # Блокировки индикаторов берутся по возрастанию id, чтобы параллельные загрузки не сцепились
+        await conn.execute("SELECT pg_advisory_xact_lock_shared($1)", _PROJECTION_LOCK_KEY)
+        await conn.execute("SELECT pg_advisory_xact_lock($1, id) FROM unnest($2::int[]) AS id",
+                           _PROJECTION_LOCK_KEY, ids)
+    else:
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", _PROJECTION_LOCK_KEY)
+
+    await conn.execute(
+        """
+        DELETE FROM dashboard_indicator_rows
+        WHERE ($1::int[] IS NULL OR indicator_id = ANY($1::int[]))
+          AND ($2::int[] IS NULL OR region_id = ANY($2::int[]))
+        """,
+        ids, regions
+    )
+
+    await conn.execute(
+        """
+        WITH scope AS (
+            SELECT i.id AS indicator_id, i.name AS indicator_name, i.unit, i.desired_direction,
+                   gm.id AS metric_id, gm.name AS metric_name, gm.goal_id, itpm.project_id
+            FROM indicators i
+            JOIN goal_metrics gm ON i.metric_id = gm.id
+            JOIN indicator_to_project_mapping itpm ON i.id = itpm.indicator_id
+            WHERE $1::int[] IS NULL OR i.id = ANY($1::int[])
+        ),
+        years AS (
+            SELECT generate_series($2::int, $3::int) AS year
+        ),
+        rf_values AS (
+            SELECT indicator_id, year, AVG(yearly_value) AS rf_value
+            FROM indicator_yearly_values
+            WHERE indicator_id IN (SELECT indicator_id FROM scope) AND year BETWEEN $2 AND $3
+            GROUP BY indicator_id, year
+        )
+        INSERT INTO dashboard_indicator_rows (
+            region_id, goal_id, project_id, year, indicator_id,
+            metric_id, metric_name, indicator_name, unit, desired_direction,
+            region_value, target_value, rf_value
+        )
+        SELECT r.id, s.goal_id, s.project_id, y.year, s.indicator_id,
+               s.metric_id, s.metric_name, s.indicator_name, s.unit, s.desired_direction,
+               iv.yearly_value, irv.reference_value, rf.rf_value
+        FROM scope s
+        CROSS JOIN years y
+        CROSS JOIN regions r
+        LEFT JOIN indicator_yearly_values iv
+            ON iv.indicator_id = s.indicator_id AND iv.region_id = r.id AND iv.year = y.year
+        LEFT JOIN indicator_reference_values irv ON irv.indicator_id = s.indicator_id AND irv.year = y.year
+        LEFT JOIN rf_values rf ON rf.indicator_id = s.indicator_id AND rf.year = y.year
+        WHERE $4::int[] IS NULL OR r.id = ANY($4::int[])
+        """,
+        ids, settings.dashboard_first_year, settings.dashboard_last_year, regions
+    )
+
+
+async def refresh_budget_totals(conn: Connection, region_project_pairs: Optional[Iterable[Tuple[int, int]]] = None):
+    """
+    Пересчитывает годовые суммы бюджетов для пар (region_id, project_id). None -- полная перестройка.
+    Должна вызываться внутри транзакции.
+    """
+    await conn.execute("SELECT pg_advisory_xact_lock($1)", _BUDGET_TOTALS_LOCK_KEY)
+
+    if region_project_pairs is None:
+        region_ids = project_ids = None
+        await conn.execute("DELETE FROM dashboard_budget_totals")
+    else:
+        pairs = set(region_project_pairs)
+        if not pairs:
+            return
+        region_ids, project_ids = (list(column) for column in zip(*pairs))
+        await conn.execute(
+            """
+            DELETE FROM dashboard_budget_totals bt
+            USING unnest($1::int[], $2::int[]) AS p(region_id, project_id)
+            WHERE bt.region_id = p.region_id AND bt.project_id = p.project_id
+            """,
+            region_ids, project_ids
+        )
+
+    await conn.execute(
+        """
+        INSERT INTO dashboard_budget_totals (region_id, project_id, year, allocated, executed)
+        SELECT pb.region_id, pb.project_id, EXTRACT(YEAR FROM pb.relevance_date)::int,
+               SUM(pb.amount_allocated), SUM(pb.amount_executed)
+        FROM project_budgets pb
+        WHERE $1::int[] IS NULL
+           OR (pb.region_id, pb.project_id) IN (SELECT * FROM unnest($1::int[], $2::int[]))
+        GROUP BY pb.region_id, pb.project_id, EXTRACT(YEAR FROM pb.relevance_date)
+        """,
+        region_ids, project_ids
+    )
+
+
+async def rebuild_projection(conn: Optional[Connection] = None):
+    """Полностью перестраивает проекцию в одной транзакции."""
+    if conn is None:
+        pool = await get_db_pool()
+        if pool is None:
+            raise ConnectionError("Пул соединений с БД не инициализирован.")
+        async with pool.acquire() as pooled_conn:
+            return await rebuild_projection(pooled_conn)
+
+    async with conn.transaction():
+        await refresh_indicator_rows(conn)
+        await refresh_budget_totals(conn)
+    print("Проекция дашборда перестроена.", flush=True)
+
+
+async def ensure_projection():
+    """При старте приложения строит проекцию, если она еще пуста (например, сразу после миграции)."""
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    async with pool.acquire() as conn:
+        is_built = await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM dashboard_indicator_rows) OR NOT EXISTS (SELECT 1 FROM indicators)")
+        if not is_built:
+            await rebuild_projection(conn)
+
+
+async def fetch_indicator_rows(conn: Connection, region_id: int, goal_id: int, project_id: int,
+                               year: int) -> Optional[List]:
+    """
+    Строки индикаторов для дашборда из проекции (в порядке показателей и индикаторов).
+    None, если в проекции нет строк по всем индикаторам проекта (пусто или неполно) --
+    тогда вызывающий код берет данные живым запросом, а не показывает часть индикаторов.
+    """
+    rows = await conn.fetch(
+        """
+        SELECT metric_id, metric_name, indicator_id, indicator_name, unit, desired_direction,
+               region_value, target_value, rf_value,
+               (SELECT count(*)
+                FROM indicators i
+                JOIN goal_metrics gm ON i.metric_id = gm.id
+                JOIN indicator_to_project_mapping itpm ON i.id = itpm.indicator_id
+                WHERE gm.goal_id = $2 AND itpm.project_id = $3) AS expected_rows
+        FROM dashboard_indicator_rows
+        WHERE region_id = $1 AND goal_id = $2 AND project_id = $3 AND year = $4
+        ORDER BY metric_id, indicator_id
+        """,
+        region_id, goal_id, project_id, year
+    )
+    if not rows or len(rows) != rows[0]['expected_rows']:
+        return None
+    return rows
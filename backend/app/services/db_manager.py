@@ -2,9 +2,13 @@ import pandas as pd
 from typing import Optional, List, Dict, Any, Tuple
 import re
 import html
+import hashlib
 from datetime import date
 
 from app.core.database import get_db_pool
+from app.core.cache import response_cache
+from app.services.dictionary_cache import dictionary_cache
+from app.services.dashboard_projection import refresh_indicator_rows, refresh_budget_totals
 from asyncpg import Connection
 
 # 1. Добавляем словарь для сопоставления имен
@@ -26,32 +30,146 @@ NAME_MAPPING = {
     'Доля государственных услуг и сервисов, по которым средняя оценка удовлетворенности качеством работы госслужащих и работников организаций социальной сферы по их оказанию в электронном виде с использованием ЕПГУ и (или) РПГУ выше 4,5': 'Доля государственных услуг и сервисов, по которым средняя оценка удовлетворенности качеством работы госслужащих и работников организаций соцсферы по их оказанию в электронном виде с использованием ЕПГУ и (или) РПГУ выше 4.5',
 }
 
-async def get_or_create_generic_id(conn: Connection, table_name: str, name: str, parent_id_column: str = None,
-                                   parent_id: int = None) -> int:
-    """Универсальная функция: получает ID по имени. Если нет - создает."""
-    # ... (эта функция остается без изменений)
-    if parent_id_column and parent_id is not None:
-        query = f"SELECT id FROM {table_name} WHERE name = $1 AND {parent_id_column} = $2"
-        record_id = await conn.fetchval(query, name, parent_id)
-        if record_id: return record_id
-        insert_query = f"INSERT INTO {table_name} (name, {parent_id_column}) VALUES ($1, $2) RETURNING id"
-        return await conn.fetchval(insert_query, name, parent_id)
+def compute_data_fingerprint(monthly_df: Optional[pd.DataFrame], yearly_df: Optional[pd.DataFrame]) -> str:
+    """
+    Считает отпечаток (sha256) нормализованных данных индикатора.
+    Строки сортируются, а значения округляются до точности колонок в БД (4 знака),
+    поэтому порядок строк в ответе fedstat и шум в младших разрядах на отпечаток не влияют.
+    """
+    digest = hashlib.sha256()
+
+    if yearly_df is not None and not yearly_df.empty:
+        yearly = yearly_df[['region_name', 'year', 'yearly_value']].copy()
+        yearly['yearly_value'] = yearly['yearly_value'].astype(float).round(4)
+        yearly = yearly.sort_values(['region_name', 'year'])
+        digest.update(b'yearly\n')
+        digest.update(yearly.to_csv(index=False, header=False).encode('utf-8'))
+
+    if monthly_df is not None and not monthly_df.empty:
+        monthly = monthly_df[['region_name', 'value_date', 'measured_value']].copy()
+        monthly['value_date'] = pd.to_datetime(monthly['value_date']).dt.strftime('%Y-%m-%d')
+        monthly['measured_value'] = monthly['measured_value'].astype(float).round(4)
+        monthly = monthly.sort_values(['region_name', 'value_date'])
+        digest.update(b'monthly\n')
+        digest.update(monthly.to_csv(index=False, header=False).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def _filter_changed_rows(df: pd.DataFrame, stored_records: list, key_columns: List[str],
+                         value_column: str) -> pd.DataFrame:
+    """Оставляет только новые строки и строки, значение которых отличается от сохраненного в БД."""
+    if not stored_records:
+        return df
+
+    stored = pd.DataFrame([dict(r) for r in stored_records], columns=key_columns + ['stored_value'])
+    stored['stored_value'] = pd.to_numeric(stored['stored_value'], errors='coerce').astype(float)
+    if 'value_date' in key_columns:
+        stored['value_date'] = pd.to_datetime(stored['value_date'])
+
+    merged = df.merge(stored, on=key_columns, how='left')
+    changed = merged['stored_value'].isna() | (
+            merged[value_column].astype(float).round(4) != merged['stored_value'].round(4))
+    return df[changed.to_numpy()]
+
+
+# --- Запись значений индикаторов ---
+
+# Описание таблиц значений: ключ уникальности (с типами для временной таблицы) и колонка значения
+YEARLY_VALUES_TABLE = {
+    'table': 'indicator_yearly_values',
+    'key_columns': [('indicator_id', 'int'), ('region_id', 'int'), ('year', 'int')],
+    'value_column': 'yearly_value',
+}
+MONTHLY_VALUES_TABLE = {
+    'table': 'indicator_monthly_values',
+    'key_columns': [('indicator_id', 'int'), ('region_id', 'int'), ('value_date', 'date')],
+    'value_column': 'measured_value',
+}
+
+# Начиная с этого числа строк значения пишутся через COPY во временную таблицу, а не executemany
+COPY_WRITE_THRESHOLD = 500
+
+
+def frame_to_value_records(df: pd.DataFrame, spec: Dict[str, Any]) -> List[tuple]:
+    """Превращает DataFrame в список кортежей (ключ..., значение) из нативных типов Python."""
+    columns = []
+    for column, column_type in spec['key_columns']:
+        if column_type == 'date':
+            columns.append(pd.to_datetime(df[column]).dt.date.tolist())
+        else:
+            columns.append(df[column].astype('int64').tolist())
+    columns.append(df[spec['value_column']].astype(float).tolist())
+    return list(zip(*columns))
+
+
+async def write_values_executemany(conn: Connection, spec: Dict[str, Any], records: List[tuple]):
+    """Построчный upsert через executemany (подходит для небольших объемов)."""
+    key_names = [name for name, _ in spec['key_columns']]
+    columns = key_names + [spec['value_column']]
+    placeholders = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+    await conn.executemany(
+        f"""
+        INSERT INTO {spec['table']} ({', '.join(columns)})
+        VALUES ({placeholders})
+        ON CONFLICT ({', '.join(key_names)}) DO UPDATE SET {spec['value_column']} = EXCLUDED.{spec['value_column']}
+        WHERE {spec['table']}.{spec['value_column']} IS DISTINCT FROM EXCLUDED.{spec['value_column']}
+        """,
+        records
+    )
+
+
+async def write_values_copy(conn: Connection, spec: Dict[str, Any], records: List[tuple]):
+    """
+    Массовый upsert: записи потоком уходят во временную таблицу через бинарный COPY,
+    затем сливаются в целевую таблицу одним INSERT ... SELECT ... ON CONFLICT.
+    Значения в промежуточной таблице хранятся как float8 и приводятся к DECIMAL при слиянии.
+    """
+    key_names = [name for name, _ in spec['key_columns']]
+    value_column = spec['value_column']
+    stage_table = f"stage_{spec['table']}"
+    stage_columns = ', '.join(f'{name} {column_type}' for name, column_type in spec['key_columns'])
+
+    async with conn.transaction():
+        await conn.execute(
+            f"CREATE TEMP TABLE {stage_table} ({stage_columns}, {value_column} float8) ON COMMIT DROP"
+        )
+        await conn.copy_records_to_table(stage_table, records=records, columns=key_names + [value_column])
+        await conn.execute(
+            f"""
+            INSERT INTO {spec['table']} ({', '.join(key_names)}, {value_column})
+            SELECT DISTINCT ON ({', '.join(key_names)}) {', '.join(key_names)}, {value_column}
+            FROM {stage_table}
+            ON CONFLICT ({', '.join(key_names)}) DO UPDATE SET {value_column} = EXCLUDED.{value_column}
+            WHERE {spec['table']}.{value_column} IS DISTINCT FROM EXCLUDED.{value_column}
+            """
+        )
+        await conn.execute(f"DROP TABLE {stage_table}")
+
+
+async def write_indicator_values(conn: Connection, spec: Dict[str, Any], records: List[tuple]):
+    """Выбирает способ записи по объему: COPY для больших наборов, executemany для маленьких."""
+    if not records:
+        return
+    if len(records) >= COPY_WRITE_THRESHOLD:
+        await write_values_copy(conn, spec, records)
     else:
-        query = f"SELECT id FROM {table_name} WHERE name = $1"
-        record_id = await conn.fetchval(query, name)
-        if record_id: return record_id
-        insert_query = f"INSERT INTO {table_name} (name) VALUES ($1) RETURNING id"
-        return await conn.fetchval(insert_query, name)
+        await write_values_executemany(conn, spec, records)
 
 
 async def save_parsed_data(
         metadata: dict,
         monthly_df: pd.DataFrame,
         yearly_df: pd.DataFrame
-):
+) -> Dict[str, Any]:
     """
     УМНАЯ ВЕРСИЯ: Находит индикатор по базовому имени (без скобок)
     и сохраняет для него спарсенные значения.
+
+    Если отпечаток данных совпадает с сохраненным в indicators.data_fingerprint,
+    значения не перезаписываются (обновляется только last_parsed_at).
+    Иначе в БД пишутся только новые и изменившиеся строки.
+    Возвращает сводку: indicator_id, unchanged, yearly_rows_changed, monthly_rows_changed.
     """
     pool = await get_db_pool()
     if pool is None:
@@ -76,139 +194,189 @@ async def save_parsed_data(
     if db_search_name != base_indicator_name:
         print(f"Найдено сопоставление! Имя для поиска в БД: '{db_search_name}'")
 
+    fingerprint = compute_data_fingerprint(monthly_df, yearly_df)
+    summary = {'indicator_id': None, 'unchanged': False, 'yearly_rows_changed': 0, 'monthly_rows_changed': 0}
+
+    # Регионы сопоставляются через общий кэш справочников до захвата соединения
+    region_names = set()
+    for df in (yearly_df, monthly_df):
+        if df is not None and not df.empty:
+            region_names.update(df['region_name'].unique())
+    region_ids = await dictionary_cache.resolve_ids('regions', region_names)
+
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            indicator_id = await conn.fetchval("SELECT id FROM indicators WHERE name = $1", db_search_name)
+        indicator_query = "SELECT id, data_fingerprint FROM indicators WHERE name = $1"
+        indicator_record = await conn.fetchrow(indicator_query, db_search_name)
+
+        if not indicator_record:
+            # На всякий случай ищем по полному декодированному имени
+            indicator_record = await conn.fetchrow(indicator_query, decoded_name)
+            if not indicator_record:
+                raise ValueError(
+                    f"Индикатор с названием '{db_search_name}' или '{decoded_name}' не найден в справочнике.")
 
-            if not indicator_id:
-                # На всякий случай ищем по полному декодированному имени
-                indicator_id = await conn.fetchval("SELECT id FROM indicators WHERE name = $1", decoded_name)
-                if not indicator_id:
-                    raise ValueError(
-                        f"Индикатор с названием '{db_search_name}' или '{decoded_name}' не найден в справочнике.")
+        indicator_id = indicator_record['id']
+        summary['indicator_id'] = indicator_id
 
+        # Данные не изменились с прошлого парсинга -- фиксируем только факт проверки
+        if indicator_record['data_fingerprint'] == fingerprint:
             await conn.execute("UPDATE indicators SET last_parsed_at = NOW() WHERE id = $1", indicator_id)
+            summary['unchanged'] = True
+            print(f"Данные индикатора '{original_indicator_name}' не изменились, запись пропущена.")
+            return summary
 
-            # ... (остальная часть функции для сохранения данных остается без изменений) ...
+        async with conn.transaction():
             if yearly_df is not None and not yearly_df.empty:
-                unique_regions_yr = yearly_df['region_name'].unique()
-                region_ids_yr = {name: await get_or_create_generic_id(conn, 'regions', name) for name in
-                                 unique_regions_yr}
                 yearly_df['indicator_id'] = indicator_id
-                yearly_df['region_id'] = yearly_df['region_name'].map(region_ids_yr)
-                yearly_records = [tuple(x) for x in
-                                  yearly_df[['indicator_id', 'region_id', 'year', 'yearly_value']].to_numpy()]
-                await conn.executemany(
-                    """
-                    INSERT INTO indicator_yearly_values (indicator_id, region_id, year, yearly_value) 
-                    VALUES ($1, $2, $3, $4) 
-                    ON CONFLICT (indicator_id, region_id, year) DO UPDATE SET yearly_value = EXCLUDED.yearly_value
-                    """,
-                    yearly_records
+                yearly_df['region_id'] = yearly_df['region_name'].map(region_ids)
+
+                stored_yearly = await conn.fetch(
+                    "SELECT region_id, year, yearly_value AS stored_value FROM indicator_yearly_values WHERE indicator_id = $1",
+                    indicator_id
                 )
+                changed_yearly = _filter_changed_rows(yearly_df, stored_yearly, ['region_id', 'year'], 'yearly_value')
+                yearly_records = frame_to_value_records(changed_yearly, YEARLY_VALUES_TABLE)
+                await write_indicator_values(conn, YEARLY_VALUES_TABLE, yearly_records)
+                summary['yearly_rows_changed'] = len(yearly_records)
+
             if monthly_df is not None and not monthly_df.empty:
-                unique_regions_mo = monthly_df['region_name'].unique()
-                region_ids_mo = {name: await get_or_create_generic_id(conn, 'regions', name) for name in
-                                 unique_regions_mo}
                 monthly_df['indicator_id'] = indicator_id
-                monthly_df['region_id'] = monthly_df['region_name'].map(region_ids_mo)
-                monthly_records = [tuple(x) for x in
-                                   monthly_df[['indicator_id', 'region_id', 'value_date', 'measured_value']].to_numpy()]
-                await conn.executemany(
-                    """
-                    INSERT INTO indicator_monthly_values (indicator_id, region_id, value_date, measured_value) 
-                    VALUES ($1, $2, $3, $4) 
-                    ON CONFLICT (indicator_id, region_id, value_date) DO UPDATE SET measured_value = EXCLUDED.measured_value
-                    """,
-                    monthly_records
+                monthly_df['region_id'] = monthly_df['region_name'].map(region_ids)
+
+                stored_monthly = await conn.fetch(
+                    "SELECT region_id, value_date, measured_value AS stored_value FROM indicator_monthly_values WHERE indicator_id = $1",
+                    indicator_id
                 )
+                changed_monthly = _filter_changed_rows(monthly_df, stored_monthly, ['region_id', 'value_date'],
+                                                       'measured_value')
+                monthly_records = frame_to_value_records(changed_monthly, MONTHLY_VALUES_TABLE)
+                await write_indicator_values(conn, MONTHLY_VALUES_TABLE, monthly_records)
+                summary['monthly_rows_changed'] = len(monthly_records)
+
+            await conn.execute(
+                "UPDATE indicators SET last_parsed_at = NOW(), data_fingerprint = $2 WHERE id = $1",
+                indicator_id, fingerprint
+            )
+            await refresh_indicator_rows(conn, [indicator_id])
+
+    # Закэшированные ответы читающих эндпоинтов больше не актуальны
+    response_cache.bump_data_version()
+    print(f"Обработка для индикатора '{original_indicator_name}' завершена: "
+          f"изменено {summary['yearly_rows_changed']} годовых и {summary['monthly_rows_changed']} месячных строк.")
+    return summary
+
+
+def describe_save_summary(summary: Dict[str, Any]) -> str:
+    """Человекочитаемый итог сохранения: 'данные не изменились' или число измененных строк."""
+    if summary['unchanged']:
+        return "Данные не изменились с прошлого парсинга"
+    rows_changed = summary['yearly_rows_changed'] + summary['monthly_rows_changed']
+    return f"Данные успешно спарсены и сохранены, изменено строк: {rows_changed}"
 
-    print(f"Обработка для индикатора '{original_indicator_name}' завершена.")
+
+def format_project_name(project_name: str) -> str:
+    """Приводит название проекта из API бюджетов к виду справочника: НП «Название»."""
+    formatted_project_name = project_name.strip()
+    if not formatted_project_name.startswith('НП «'):
+        formatted_project_name = f"НП «{formatted_project_name}»"
+    return formatted_project_name
+
+
+# Размер пачки записей бюджетов, отправляемой одним запросом (массивами через unnest)
+BUDGET_UPSERT_CHUNK_SIZE = 5000
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return None if value is None or value == '' else float(value)
+
+
+async def upsert_budget_records(conn: Connection, records: List[tuple],
+                                table: str = 'project_budgets') -> Tuple[int, int]:
+    """
+    Set-based upsert бюджетов: каждая пачка уходит одним запросом в виде колонок-массивов,
+    а число добавленных и обновленных строк считается на стороне БД.
+    records -- кортежи (region_id, project_id, relevance_date, allocated, executed, percentage).
+    Возвращает (добавлено, обновлено).
+    """
+    added_count = 0
+    updated_count = 0
+
+    for start in range(0, len(records), BUDGET_UPSERT_CHUNK_SIZE):
+        chunk = records[start:start + BUDGET_UPSERT_CHUNK_SIZE]
+        # Один INSERT не может дважды обновить одну строку: дубликаты ключа схлопываются (побеждает последний)
+        chunk = list({record[:3]: record for record in chunk}.values())
+        region_ids, project_ids, dates, allocated, executed, percentages = map(list, zip(*chunk))
+
+        result = await conn.fetchrow(
+            f"""
+            WITH upserted AS (
+                INSERT INTO {table} (
+                    region_id, project_id, relevance_date,
+                    amount_allocated, amount_executed, execution_percentage
+                )
+                SELECT * FROM unnest($1::int[], $2::int[], $3::date[], $4::float8[], $5::float8[], $6::float8[])
+                ON CONFLICT (region_id, project_id, relevance_date)
+                DO UPDATE SET
+                    amount_allocated = EXCLUDED.amount_allocated,
+                    amount_executed = EXCLUDED.amount_executed,
+                    execution_percentage = EXCLUDED.execution_percentage
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS added,
+                   count(*) FILTER (WHERE NOT inserted) AS updated
+            FROM upserted
+            """,
+            region_ids, project_ids, dates, allocated, executed, percentages
+        )
+        added_count += result['added']
+        updated_count += result['updated']
+
+    return added_count, updated_count
 
 
 async def save_budget_data(budget_data: List[Dict[str, Any]]) -> Tuple[int, int]:
     """
     Сохраняет данные о бюджетах в базу данных.
     Автоматически создает недостающие регионы и проекты в справочниках.
+    Записи проверяются и приводятся к типам в Python, а в БД уходят пачками
+    (см. upsert_budget_records) в одной транзакции.
     """
     pool = await get_db_pool()
     if pool is None:
         raise ConnectionError("Пул соединений с БД не инициализирован.")
 
-    added_count = 0
-    updated_count = 0
+    # Имена регионов и проектов сопоставляются с ID через общий кэш справочников одним проходом
+    region_ids = await dictionary_cache.resolve_ids(
+        'regions', (item.get("region_name") for item in budget_data if item.get("project_name")))
+    project_ids = await dictionary_cache.resolve_ids(
+        'national_projects', (format_project_name(item["project_name"]) for item in budget_data
+                              if item.get("region_name") and item.get("project_name")))
+
+    records = []
+    for item in budget_data:
+        region_name = item.get("region_name")
+        project_name = item.get("project_name")
+
+        if not region_name or not project_name:
+            continue
+
+        formatted_project_name = format_project_name(project_name)
+        try:
+            records.append((
+                region_ids[region_name],
+                project_ids[formatted_project_name],
+                date.fromisoformat(item['relevance_date']),
+                _optional_float(item.get('amount_allocated')),
+                _optional_float(item.get('amount_executed')),
+                _optional_float(item.get('execution_percentage')),
+            ))
+        except Exception as e:
+            print(f"Ошибка при обработке записи для {formatted_project_name} в {region_name}: {e}")
 
     async with pool.acquire() as conn:
-        # Кэшируем ID для уменьшения количества запросов к БД
-        regions_cache = {r['name']: r['id'] for r in await conn.fetch("SELECT id, name FROM regions")}
-        projects_cache = {p['name']: p['id'] for p in await conn.fetch("SELECT id, name FROM national_projects")}
-
         async with conn.transaction():
-            for item in budget_data:
-                region_name = item.get("region_name")
-                project_name = item.get("project_name")
-
-                if not region_name or not project_name:
-                    continue
-
-                # --- ИЗМЕНЕНИЕ ЗДЕСЬ: Форматируем название проекта, добавляя префикс и кавычки ---
-
-                # Изначально берем имя как есть
-                formatted_project_name = project_name.strip()
-
-                # Если у имени нет префикса "НП «", добавляем его
-                if not formatted_project_name.startswith('НП «'):
-                    formatted_project_name = f"НП «{formatted_project_name}»"
-
-                # --- КОНЕЦ ИЗМЕНЕНИЙ ---
-
-                # Проверяем и создаем регион, если его нет
-                region_id = regions_cache.get(region_name)
-                if not region_id:
-                    print(f"INFO: Регион '{region_name}' не найден. Создание новой записи...")
-                    region_id = await get_or_create_generic_id(conn, 'regions', region_name)
-                    regions_cache[region_name] = region_id  # Обновляем кэш
-
-                # Проверяем и создаем проект, если его нет, используя отформатированное имя
-                project_id = projects_cache.get(formatted_project_name)
-                if not project_id:
-                    print(f"INFO: Проект '{formatted_project_name}' не найден. Создание новой записи...")
-                    project_id = await get_or_create_generic_id(conn, 'national_projects', formatted_project_name)
-                    projects_cache[formatted_project_name] = project_id  # Обновляем кэш
-
-                query = """
-                    INSERT INTO project_budgets (
-                        region_id, project_id, relevance_date, 
-                        amount_allocated, amount_executed, execution_percentage
-                    ) VALUES ($1, $2, $3, $4, $5, $6)
-                    ON CONFLICT (region_id, project_id, relevance_date) 
-                    DO UPDATE SET 
-                        amount_allocated = EXCLUDED.amount_allocated,
-                        amount_executed = EXCLUDED.amount_executed,
-                        execution_percentage = EXCLUDED.execution_percentage
-                    RETURNING (xmax = 0) AS inserted;
-                """
-
-                try:
-                    relevance_date = date.fromisoformat(item['relevance_date'])
-
-                    result = await conn.fetchrow(
-                        query,
-                        region_id,
-                        project_id,
-                        relevance_date,
-                        item.get('amount_allocated'),
-                        item.get('amount_executed'),
-                        item.get('execution_percentage')
-                    )
-
-                    if result and result['inserted']:
-                        added_count += 1
-                    else:
-                        updated_count += 1
-
-                except Exception as e:
-                    print(f"Ошибка при обработке записи для {formatted_project_name} в {region_name}: {e}")
+            added_count, updated_count = await upsert_budget_records(conn, records)
+            await refresh_budget_totals(conn, {(record[0], record[1]) for record in records})
 
+    response_cache.bump_data_version()
     return added_count, updated_count
-
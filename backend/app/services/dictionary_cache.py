@@ -0,0 +1,105 @@
+# app/services/dictionary_cache.py
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from app.core.database import get_db_pool
+from app.core.cache import response_cache
+from app.services.dashboard_projection import refresh_indicator_rows
+
+# Справочники, которые сопоставляются по уникальному имени (name -> id)
+DICTIONARY_TABLES = ('regions', 'national_projects', 'national_goals')
+
+# Регион с общероссийскими значениями
+RF_REGION_NAME = 'Российская Федерация'
+
+
+class DictionaryCache:
+    """
+    Общий для процесса кэш справочников name -> id.
+    Загружается целиком при старте приложения, дальше пополняется при создании новых записей,
+    поэтому в обычном случае сопоставление имен не требует ни одного запроса к БД.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, Dict[str, int]] = {table: {} for table in DICTIONARY_TABLES}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """Полностью перечитывает все справочники из БД."""
+        pool = await get_db_pool()
+        if pool is None:
+            raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+        async with pool.acquire() as conn:
+            for table in DICTIONARY_TABLES:
+                records = await conn.fetch(f"SELECT id, name FROM {table}")
+                self._ids[table] = {r['name']: r['id'] for r in records}
+        self._loaded = True
+        print("Справочники загружены в кэш: " +
+              ", ".join(f"{table}={len(ids)}" for table, ids in self._ids.items()), flush=True)
+
+    async def _ensure_loaded(self):
+        if not self._loaded:
+            async with self._lock:
+                if not self._loaded:
+                    await self.load()
+
+    async def get_mapping(self, table: str) -> Dict[str, int]:
+        """Возвращает словарь name -> id справочника. Словарь нельзя изменять."""
+        await self._ensure_loaded()
+        return self._ids[table]
+
+    async def get_id(self, table: str, name: str) -> Optional[int]:
+        """ID записи справочника по точному имени или None (запись не создается)."""
+        await self._ensure_loaded()
+        return self._ids[table].get(name)
+
+    async def resolve_ids(self, table: str, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Возвращает ID для всех переданных имен, создавая недостающие записи.
+        Все отсутствующие в кэше имена вставляются одним запросом через unnest.
+        Вставка выполняется на отдельном соединении вне транзакции вызывающего кода,
+        чтобы в кэш не попали ID из транзакции, которая потом будет откачена.
+        """
+        await self._ensure_loaded()
+        wanted = {name for name in names if name}
+
+        missing = [name for name in wanted if name not in self._ids[table]]
+        if missing:
+            async with self._lock:
+                missing = [name for name in missing if name not in self._ids[table]]
+                if missing:
+                    await self._insert_missing(table, missing)
+
+        cache = self._ids[table]
+        return {name: cache[name] for name in wanted}
+
+    async def _insert_missing(self, table: str, names: list):
+        pool = await get_db_pool()
+        if pool is None:
+            raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+        print(f"INFO: Добавление {len(names)} новых записей в справочник '{table}'...")
+        async with pool.acquire() as conn, conn.transaction():
+            # DO UPDATE (а не DO NOTHING), чтобы RETURNING вернул ID и для имен,
+            # которые успел создать параллельный процесс
+            records = await conn.fetch(
+                f"""
+                INSERT INTO {table} (name)
+                SELECT DISTINCT unnest($1::text[])
+                ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id, name, (xmax = 0) AS inserted
+                """,
+                names
+            )
+            new_region_ids = [r['id'] for r in records if r['inserted']] if table == 'regions' else []
+            if new_region_ids:
+                # Иначе у нового региона в проекции будут строки только тех индикаторов, что обновятся позже
+                await refresh_indicator_rows(conn, region_ids=new_region_ids)
+        self._ids[table].update({r['name']: r['id'] for r in records})
+        # Новые записи справочников видны в /api/regions и других читающих эндпоинтах
+        response_cache.bump_data_version()
+
+
+dictionary_cache = DictionaryCache()
@@ -0,0 +1,241 @@
+# app/services/exporter.py
+#
+# Потоковая выгрузка значений индикаторов и бюджетов (GET /api/export/{dataset}).
+# Строки читаются серверным курсором порциями по EXPORT_CHUNK_SIZE внутри одной
+# read-only транзакции (согласованный снимок) и сразу пишутся в ответ, поэтому расход
+# памяти не зависит от объема выгрузки.
+#
+# Форматы: csv всегда; parquet и arrow (Arrow IPC stream) -- при установленном пакете pyarrow.
+
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+
+from app.core.database import get_db_pool
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow нужен только для колоночных форматов
+    pa = None
+    pq = None
+
+EXPORT_CHUNK_SIZE = 50_000
+
+# Колонки выгрузки: (имя, тип Arrow)
+_YEARLY_COLUMNS = [
+    ('indicator_id', 'int32'), ('indicator_name', 'string'), ('unit', 'string'),
+    ('region_id', 'int32'), ('region_name', 'string'), ('year', 'int32'), ('value', 'float64'),
+]
+_MONTHLY_COLUMNS = [
+    ('indicator_id', 'int32'), ('indicator_name', 'string'), ('unit', 'string'),
+    ('region_id', 'int32'), ('region_name', 'string'), ('date', 'date32'), ('value', 'float64'),
+]
+_BUDGET_COLUMNS = [
+    ('project_id', 'int32'), ('project_name', 'string'), ('region_id', 'int32'), ('region_name', 'string'),
+    ('date', 'date32'), ('allocated', 'float64'), ('executed', 'float64'),
+]
+
+# Набор данных -> (SELECT ... FROM ... без WHERE, ORDER BY, колонки, выражения для фильтров)
+EXPORT_DATASETS: Dict[str, Dict[str, Any]] = {
+    'yearly': {
+        'select': """
+            SELECT v.indicator_id, i.name, i.unit, v.region_id, r.name, v.year, v.yearly_value::float8
+            FROM indicator_yearly_values v
+            JOIN indicators i ON i.id = v.indicator_id
+            JOIN regions r ON r.id = v.region_id
+        """,
+        'order_by': "v.indicator_id, v.region_id, v.year",
+        'columns': _YEARLY_COLUMNS,
+        'filters': {
+            'goal_id': "i.metric_id IN (SELECT id FROM goal_metrics WHERE goal_id = {})",
+            'project_id': "v.indicator_id IN (SELECT indicator_id FROM indicator_to_project_mapping WHERE project_id = {})",
+            'indicator_ids': "v.indicator_id = ANY({}::int[])",
+            'region_ids': "v.region_id = ANY({}::int[])",
+            'year_from': "v.year >= {}",
+            'year_to': "v.year <= {}",
+        },
+    },
+    'monthly': {
+        'select': """
+            SELECT v.indicator_id, i.name, i.unit, v.region_id, r.name, v.value_date, v.measured_value::float8
+            FROM indicator_monthly_values v
+            JOIN indicators i ON i.id = v.indicator_id
+            JOIN regions r ON r.id = v.region_id
+        """,
+        'order_by': "v.indicator_id, v.region_id, v.value_date",
+        'columns': _MONTHLY_COLUMNS,
+        'filters': {
+            'goal_id': "i.metric_id IN (SELECT id FROM goal_metrics WHERE goal_id = {})",
+            'project_id': "v.indicator_id IN (SELECT indicator_id FROM indicator_to_project_mapping WHERE project_id = {})",
+            'indicator_ids': "v.indicator_id = ANY({}::int[])",
+            'region_ids': "v.region_id = ANY({}::int[])",
+            'year_from': "v.value_date >= make_date({}, 1, 1)",
+            'year_to': "v.value_date < make_date({} + 1, 1, 1)",
+        },
+    },
+    'budgets': {
+        'select': """
+            SELECT pb.project_id, np.name, pb.region_id, r.name, pb.relevance_date,
+                   pb.amount_allocated::float8, pb.amount_executed::float8
+            FROM project_budgets pb
+            JOIN national_projects np ON np.id = pb.project_id
+            JOIN regions r ON r.id = pb.region_id
+        """,
+        'order_by': "pb.project_id, pb.region_id, pb.relevance_date",
+        'columns': _BUDGET_COLUMNS,
+        'filters': {
+            'goal_id': "pb.project_id IN (SELECT project_id FROM project_to_goal_mapping WHERE goal_id = {})",
+            'project_id': "pb.project_id = {}",
+            'region_ids': "pb.region_id = ANY({}::int[])",
+            'year_from': "pb.relevance_date >= make_date({}, 1, 1)",
+            'year_to': "pb.relevance_date < make_date({} + 1, 1, 1)",
+        },
+    },
+}
+
+# Формат -> (расширение файла, media type, нужен ли pyarrow)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8', False),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', True),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream', True),
+}
+
+
+def validate_export(dataset: str, fmt: str, filters: Dict[str, Any]):
+    """Проверяет параметры до начала потока, пока еще можно вернуть ошибку статусом ответа."""
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Неизвестный набор данных: {dataset}. Доступны: {', '.join(EXPORT_DATASETS)}.")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}. Доступны: {', '.join(EXPORT_FORMATS)}.")
+    if EXPORT_FORMATS[fmt][2] and pa is None:
+        raise ValueError(f"Формат {fmt} требует установленного пакета pyarrow. Используйте csv.")
+
+    unsupported = [name for name, value in filters.items()
+                   if value is not None and name not in EXPORT_DATASETS[dataset]['filters']]
+    if unsupported:
+        raise ValueError(f"Фильтры {', '.join(unsupported)} не применимы к набору {dataset}.")
+
+
+def build_export_query(dataset: str, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Собирает запрос выгрузки: заданные фильтры превращаются в условия с параметрами $1..$n."""
+    spec = EXPORT_DATASETS[dataset]
+    conditions, args = [], []
+    for name, template in spec['filters'].items():
+        value = filters.get(name)
+        if value is None:
+            continue
+        args.append(value)
+        conditions.append(template.format(f"${len(args)}"))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"{spec['select']} {where} ORDER BY {spec['order_by']}", args
+
+
+class _ChunkSink:
+    """Файлоподобный приемник для pyarrow: копит записанные байты до очередного take()."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet записывает смещения групп строк по позиции в файле, а не в текущей порции
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class _CsvWriter:
+    def __init__(self, columns: Sequence[Tuple[str, str]]):
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        self._csv.writerow([name for name, _ in columns])
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def write(self, rows) -> bytes:
+        self._csv.writerows(rows)
+        return self._take()
+
+    def close(self) -> bytes:
+        return self._take()
+
+
+class _ArrowWriter:
+    """Arrow IPC stream или Parquet: каждая порция курсора -- отдельный batch / группа строк."""
+
+    def __init__(self, columns: Sequence[Tuple[str, str]], fmt: str):
+        self._schema = pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in columns])
+        self._sink = _ChunkSink()
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self._sink, self._schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self._schema)
+
+    def write(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema
+        )
+        self._writer.write_batch(batch)
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.take()
+
+
+async def stream_export(dataset: str, fmt: str, filters: Dict[str, Any],
+                        chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Отдает выгрузку порциями байт. Параметры должны быть заранее проверены validate_export()."""
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    query, args = build_export_query(dataset, filters)
+    columns = EXPORT_DATASETS[dataset]['columns']
+    writer = _CsvWriter(columns) if fmt == 'csv' else _ArrowWriter(columns, fmt)
+
+    async with pool.acquire() as conn:
+        # Серверный курсор живет только внутри транзакции
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            cursor = await conn.cursor(query, *args)
+            while True:
+                rows = await cursor.fetch(chunk_size)
+                if not rows:
+                    break
+                data = writer.write(rows)
+                if data:
+                    yield data
+
+    yield writer.close()
+
+
+def export_filename(dataset: str, fmt: str) -> str:
+    return f"{dataset}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def export_media_type(fmt: str) -> str:
+    return EXPORT_FORMATS[fmt][1]
@@ -0,0 +1,297 @@
+# app/services/job_queue.py
+#
+# Фоновая очередь заданий. Состояние хранится в таблице jobs (миграция 5), поэтому
+# задания переживают перезапуск приложения. Отправка задания только вставляет строку
+# и сразу возвращает его id, а выполняют задания обработчики (asyncio-задачи),
+# запущенные в lifespan: каждый забирает из очереди одно задание через FOR UPDATE SKIP LOCKED,
+# так что несколько процессов могут разбирать общую очередь без двойного выполнения.
+#
+# Упавшее задание возвращается в очередь с экспоненциальной паузой, пока не исчерпает попытки.
+# Пока обработчик работает, задание отмечает ход работы каждые job_heartbeat_interval секунд.
+# Задание, которое слишком долго не отмечало ход работы (процесс упал посреди выполнения),
+# снова забирается любым обработчиком, если у него остались попытки, иначе помечается упавшим.
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.database import get_db_pool, settings
+from app.core.rate_limit import HostRateLimiter
+from app.services.batch_ingest import ingest_indicator_url
+from app.services.news_crawler import crawl_clubrf
+
+JOB_PARSE_INDICATOR = 'parse_indicator'
+JOB_CRAWL_NEWS = 'crawl_news'
+
+
+class JobContext:
+    """Передается обработчику задания: отмечает этапы и считает время каждого из них."""
+
+    def __init__(self, job_id: int, rate_limiter: HostRateLimiter):
+        self.job_id = job_id
+        self.rate_limiter = rate_limiter
+        self.stage_timings: Dict[str, float] = {}
+        self._stage: Optional[str] = None
+        self._stage_started = time.monotonic()
+
+    def _close_stage(self):
+        if self._stage is not None:
+            elapsed = time.monotonic() - self._stage_started
+            self.stage_timings[self._stage] = round(self.stage_timings.get(self._stage, 0.0) + elapsed, 3)
+
+    async def stage(self, name: str):
+        """Завершает текущий этап и начинает следующий. Заодно обновляет heartbeat задания."""
+        self._close_stage()
+        self._stage = name
+        self._stage_started = time.monotonic()
+
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE jobs SET stage = $2, stage_timings = $3::jsonb, heartbeat_at = NOW() WHERE id = $1",
+                self.job_id, name, json.dumps(self.stage_timings)
+            )
+
+    def finish(self) -> Dict[str, float]:
+        """Закрывает последний этап и возвращает время по этапам."""
+        self._close_stage()
+        self._stage = None
+        return self.stage_timings
+
+
+async def _run_parse_indicator(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    return await ingest_indicator_url(payload['url'], ctx.rate_limiter, on_stage=ctx.stage)
+
+
+async def _run_crawl_news(payload: Dict[str, Any], ctx: JobContext) -> Dict[str, Any]:
+    return await crawl_clubrf(on_stage=ctx.stage)
+
+
+# Вид задания -> обработчик. Обработчик получает payload и JobContext и возвращает результат (JSON)
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], JobContext], Awaitable[Dict[str, Any]]]] = {
+    JOB_PARSE_INDICATOR: _run_parse_indicator,
+    JOB_CRAWL_NEWS: _run_crawl_news,
+}
+
+
+class JobQueue:
+    def __init__(self):
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._rate_limiter: Optional[HostRateLimiter] = None
+
+    async def start(self, workers: Optional[int] = None):
+        """Запускает обработчики. Вызывается из lifespan после подключения к БД."""
+        workers = workers or settings.job_workers
+        # Все обработчики процесса делят один лимит запросов к хосту, как и пакетная загрузка
+        self._rate_limiter = HostRateLimiter(settings.ingest_host_rate_limit)
+        self._workers = [asyncio.create_task(self._worker_loop()) for _ in range(workers)]
+        print(f"Очередь заданий: запущено обработчиков: {workers}", flush=True)
+
+    async def stop(self):
+        """Останавливает обработчики; прерванные задания возвращаются в очередь."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> int:
+        """Ставит задание в очередь и сразу возвращает его id."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Неизвестный вид задания: {kind}")
+
+        pool = await get_db_pool()
+        if pool is None:
+            raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+        async with pool.acquire() as conn:
+            job_id = await conn.fetchval(
+                "INSERT INTO jobs (kind, payload, max_attempts) VALUES ($1, $2::jsonb, $3) RETURNING id",
+                kind, json.dumps(payload, ensure_ascii=False), max_attempts or settings.job_max_attempts
+            )
+        self._wakeup.set()
+        return job_id
+
+    async def submit_many(self, conn, kind: str, payloads: List[Dict[str, Any]]) -> List[int]:
+        """Ставит в очередь несколько заданий одним запросом на переданном соединении (в его транзакции)."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Неизвестный вид задания: {kind}")
+        if not payloads:
+            return []
+
+        records = await conn.fetch(
+            """
+            INSERT INTO jobs (kind, payload, max_attempts)
+            SELECT $1, payload, $3 FROM unnest($2::jsonb[]) WITH ORDINALITY AS p(payload, n)
+            ORDER BY n
+            RETURNING id
+            """,
+            kind, [json.dumps(payload, ensure_ascii=False) for payload in payloads], settings.job_max_attempts
+        )
+        self._wakeup.set()
+        return [r['id'] for r in records]
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Состояние задания или None, если такого нет."""
+        pool = await get_db_pool()
+        if pool is None:
+            raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+        async with pool.acquire() as conn:
+            record = await conn.fetchrow(
+                """
+                SELECT id, kind, payload, status, stage, attempts, max_attempts, run_after,
+                       created_at, started_at, finished_at, stage_timings, result, error
+                FROM jobs WHERE id = $1
+                """,
+                job_id
+            )
+        if record is None:
+            return None
+
+        job = dict(record)
+        for key in ('payload', 'stage_timings', 'result'):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Забирает одно готовое к выполнению задание (или брошенное упавшим процессом)."""
+        pool = await get_db_pool()
+        if pool is None:
+            return None
+
+        async with pool.acquire() as conn:
+            # Брошенное задание без оставшихся попыток (например, раз за разом роняет процесс) больше не берется
+            await conn.execute(
+                """
+                UPDATE jobs SET status = 'failed', finished_at = NOW(),
+                                error = 'Обработчик перестал отвечать, попытки исчерпаны'
+                WHERE status = 'running' AND attempts >= max_attempts
+                  AND heartbeat_at < NOW() - make_interval(secs => $1)
+                """,
+                settings.job_stale_after
+            )
+            record = await conn.fetchrow(
+                """
+                UPDATE jobs SET
+                    status = 'running', stage = 'started', attempts = attempts + 1,
+                    started_at = NOW(), heartbeat_at = NOW(), finished_at = NULL, stage_timings = '{}'
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE (status = 'queued' AND run_after <= NOW())
+                       OR (status = 'running' AND attempts < max_attempts
+                           AND heartbeat_at < NOW() - make_interval(secs => $1))
+                    ORDER BY run_after, id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+                """,
+                settings.job_stale_after
+            )
+        if record is None:
+            return None
+        job = dict(record)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    async def _finish(self, job_id: int, ctx: JobContext, result: Dict[str, Any]):
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE jobs SET status = 'succeeded', stage = 'done', finished_at = NOW(), heartbeat_at = NOW(),
+                                stage_timings = $2::jsonb, result = $3::jsonb, error = NULL
+                WHERE id = $1
+                """,
+                job_id, json.dumps(ctx.finish()), json.dumps(result, ensure_ascii=False, default=str)
+            )
+
+    async def _fail(self, job: Dict[str, Any], ctx: JobContext, error: str):
+        """Возвращает задание в очередь с паузой или помечает его упавшим, если попытки исчерпаны."""
+        pool = await get_db_pool()
+        retry = job['attempts'] < job['max_attempts']
+        delay = settings.job_retry_base_delay * 2 ** (job['attempts'] - 1)
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN $2 THEN 'queued' ELSE 'failed' END,
+                    run_after = CASE WHEN $2 THEN NOW() + make_interval(secs => $3) ELSE run_after END,
+                    finished_at = CASE WHEN $2 THEN NULL ELSE NOW() END,
+                    stage_timings = $4::jsonb, error = $5
+                WHERE id = $1
+                """,
+                job['id'], retry, delay, json.dumps(ctx.finish()), error
+            )
+        if retry:
+            print(f"Задание {job['id']}: попытка {job['attempts']} не удалась ({error}), "
+                  f"повтор через {delay:.0f} с", flush=True)
+        else:
+            print(f"Задание {job['id']}: попытки исчерпаны ({error})", flush=True)
+
+    async def _requeue(self, job_id: int):
+        """Возвращает прерванное остановкой задание в очередь, не засчитывая попытку."""
+        pool = await get_db_pool()
+        async with pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, run_after = NOW() "
+                "WHERE id = $1 AND status = 'running'",
+                job_id
+            )
+
+    async def _heartbeat_loop(self, job_id: int):
+        """Пока обработчик работает, обновляет heartbeat: долгий этап не должен выглядеть брошенным."""
+        while True:
+            await asyncio.sleep(settings.job_heartbeat_interval)
+            try:
+                pool = await get_db_pool()
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE jobs SET heartbeat_at = NOW() WHERE id = $1 AND status = 'running'", job_id)
+            except Exception as e:
+                print(f"Задание {job_id}: не удалось обновить heartbeat: {e}", flush=True)
+
+    async def _run(self, job: Dict[str, Any]):
+        ctx = JobContext(job['id'], self._rate_limiter)
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job['id']))
+        try:
+            result = await JOB_HANDLERS[job['kind']](job['payload'], ctx)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._requeue(job['id']))
+            raise
+        except Exception as e:
+            await self._fail(job, ctx, str(e) or type(e).__name__)
+        else:
+            await self._finish(job['id'], ctx, result)
+        finally:
+            heartbeat.cancel()
+
+    async def _worker_loop(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"Очередь заданий: ошибка при получении задания: {e}", flush=True)
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Не удалось записать итог в БД: задание подберет проверка брошенных заданий
+                print(f"Очередь заданий: ошибка при завершении задания {job['id']}: {e}", flush=True)
+
+
+job_queue = JobQueue()
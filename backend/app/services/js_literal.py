@@ -0,0 +1,250 @@
+# app/services/js_literal.py
+#
+# Однопроходный разбор литерала объекта JavaScript прямо из HTML-страницы.
+# Поддерживает то, что встречается в конфигурации FGrid на fedstat.ru:
+# ключи без кавычек, строки в одинарных и двойных кавычках, висячие запятые,
+# комментарии, а также произвольные выражения вроде $('#grid') -- они пропускаются.
+#
+# Разбор идет одним циклом по токенам без рекурсии: каждый токен (вместе с пробелами
+# перед ним) находит одно регулярное выражение, а страница не копируется и не переписывается.
+# Внутри объекта член целиком (ключ с простым значением, ключ с открывающей скобкой или '}')
+# берется одним совпадением: на большой странице это основная масса текста.
+
+import json
+import re
+from typing import Any, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<close>[}\]](?:\s*,)?)
+      | (?P<punct>[{\[,:])
+      | '(?P<sstr>(?:[^'\\]|\\.)*)'
+      | "(?P<dstr>(?:[^"\\]|\\.)*)"
+      | (?P<num>[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))(?![\w$])
+      | (?P<ident>[A-Za-z_$][\w$]*)
+      | (?P<comment>//[^\n]*|/\*.*?\*/)
+    )""", re.VERBOSE | re.DOTALL)
+# Член объекта одним совпадением: закрывающая '}', пара "ключ: простое значение" вместе с запятой
+# после нее или ключ вместе с '{' / '[' своего значения. Иначе -- только ключ, значение разбирает цикл токенов
+_MEMBER_RE = re.compile(r"""
+    \s*(?:
+        (?P<close>}(?:\s*,)?)
+      | (?:'(?P<ksstr>[^'\\]*)'|"(?P<kdstr>[^"\\]*)"|(?P<kword>[\w$]+))\s*:\s*
+        (?:
+            (?:
+                '(?P<sstr>[^'\\]*)'
+              | "(?P<dstr>[^"\\]*)"
+              | (?P<num>-?\d+(?P<frac>\.\d+)?)(?![\w$.])
+              | (?P<kw>true|false|null)(?![\w$])
+            )(?=\s*[,}\]])\s*,?
+          | (?P<open>[{\[])
+        )?
+    )""", re.VERBOSE)
+_COLON_RE = re.compile(r'\s*(?://[^\n]*\s*|/\*.*?\*/\s*)*:', re.DOTALL)
+_VALUE_END_RE = re.compile(r'\s*(?://[^\n]*\s*|/\*.*?\*/\s*)*[,}\]]', re.DOTALL)
+_STRING_RE = re.compile(r""""(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'""", re.DOTALL)
+_INTEGER_RE = re.compile(r'[-+]?\d+')
+_ESCAPE_RE = re.compile(r"\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|.)", re.DOTALL)
+
+_SIMPLE_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+_KEYWORDS = {'true': True, 'false': False, 'null': None, 'undefined': None,
+             'NaN': float('nan'), 'Infinity': float('inf')}
+
+# Значение, которое нельзя представить данными (вызов функции, ссылка на переменную)
+_SKIPPED = object()
+
+
+class JsLiteralError(ValueError):
+    """Литерал не удалось разобрать; pos -- позиция ошибки в исходном тексте."""
+
+    def __init__(self, message: str, pos: int):
+        super().__init__(f"{message} (позиция {pos})")
+        self.pos = pos
+
+
+def _decode_escape(match: re.Match) -> str:
+    escape = match.group(1)
+    if escape[0] in 'ux' and len(escape) > 1:
+        return chr(int(escape[1:], 16))
+    if escape in ('\n', '\r\n', '\r'):
+        return ''  # Перенос строки после обратной косой черты -- продолжение строки
+    return _SIMPLE_ESCAPES.get(escape, escape)
+
+
+def _decode_string(content: str, double_quoted: bool) -> str:
+    if '\\' not in content:
+        return content
+    if double_quoted:
+        # Обычно это валидная JSON-строка (в т.ч. с суррогатными парами) -- ее разбирает C-декодер
+        try:
+            return json.loads(f'"{content}"')
+        except ValueError:
+            pass
+    return _ESCAPE_RE.sub(_decode_escape, content)
+
+
+def _decode_number(literal: str):
+    if 'x' in literal or 'X' in literal:
+        return int(literal, 16)
+    if _INTEGER_RE.fullmatch(literal):
+        return int(literal)
+    return float(literal)
+
+
+def _skip_expression(text: str, pos: int) -> int:
+    """Пропускает произвольное выражение до ',' / '}' / ']' на своем уровне вложенности."""
+    depth = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            if depth == 0:
+                return pos
+            depth -= 1
+        elif char == ',' and depth == 0:
+            return pos
+        elif char == '"' or char == "'":
+            match = _STRING_RE.match(text, pos)
+            if not match:
+                raise JsLiteralError("Незакрытая строка", pos)
+            pos = match.end()
+            continue
+        pos += 1
+    raise JsLiteralError("Незавершенное выражение", pos)
+
+
+def parse_js_literal(text: str, pos: int = 0) -> Tuple[Any, int]:
+    """Разбирает литерал, начинающийся с позиции pos. Возвращает (значение, позиция после него)."""
+    match_token = _TOKEN_RE.match
+    match_member = _MEMBER_RE.match
+    stack = []  # Открытые объекты и массивы, последний -- текущий
+    container = None  # Текущий контейнер (stack[-1])
+    in_object = False  # Текущий контейнер -- объект
+    key = None  # Ключ текущего объекта, ожидающий значения
+    expect_key = False  # Следующий токен -- ключ объекта
+
+    while True:
+        if expect_key:
+            member = match_member(text, pos)
+            if member is not None:
+                pos = member.end()
+                kind = member.lastgroup
+                if kind == 'close':
+                    stack.pop()
+                    if not stack:
+                        return container, member.start(kind) + 1
+                    container = stack[-1]
+                    in_object = type(container) is dict
+                    # Запятая после закрывающей скобки уже поглощена вместе с ней
+                    expect_key = in_object and text[pos - 1] == ','
+                    continue
+                member_key = member.group('kword') or member.group('ksstr') or member.group('kdstr')
+                if kind == 'open':
+                    value = {} if text[pos - 1] == '{' else []
+                    container[member_key] = value
+                    stack.append(value)
+                    container = value
+                    in_object = expect_key = type(value) is dict
+                elif kind == 'num':
+                    literal = member.group('num')
+                    container[member_key] = float(literal) if member.group('frac') else int(literal)
+                elif kind == 'kw':
+                    container[member_key] = _KEYWORDS[member.group('kw')]
+                elif kind == 'sstr' or kind == 'dstr':
+                    container[member_key] = member.group(kind)
+                else:
+                    # Значение не простое -- его разберет цикл токенов
+                    key = member_key
+                    expect_key = False
+                continue
+
+        match = match_token(text, pos)
+        if match is None:
+            raise JsLiteralError("Неожиданный символ или конец текста", pos)
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind == 'close':
+            char = text[match.start(kind)]
+            if container is None or in_object != (char == '}') or key is not None:
+                raise JsLiteralError(f"Неожиданная '{char}'", match.start(kind))
+            closed = stack.pop()
+            if not stack:
+                return closed, match.start(kind) + 1
+            container = stack[-1]
+            in_object = type(container) is dict
+            # Запятая после закрывающей скобки уже поглощена вместе с ней
+            expect_key = in_object and text[pos - 1] == ','
+            continue
+
+        if kind == 'punct':
+            char = text[pos - 1]
+            if char == ',':
+                if container is None:
+                    raise JsLiteralError("Неожиданная ','", pos - 1)
+                expect_key = in_object
+                continue
+            if char == ':':
+                raise JsLiteralError("Неожиданное ':'", pos - 1)
+            value = {} if char == '{' else []
+        elif expect_key:
+            # Ключ объекта: идентификатор, строка или число
+            if kind == 'sstr' or kind == 'dstr':
+                key = _decode_string(match.group(kind), kind == 'dstr')
+            elif kind == 'comment':
+                continue
+            else:
+                key = match.group(kind)
+            colon = _COLON_RE.match(text, pos)
+            if colon is None:
+                raise JsLiteralError("Ожидалось ':' после ключа", pos)
+            pos = colon.end()
+            expect_key = False
+            continue
+        elif kind == 'sstr' or kind == 'dstr':
+            value = _decode_string(match.group(kind), kind == 'dstr')
+        elif kind == 'num':
+            value = _decode_number(match.group(kind))
+        elif kind == 'ident':
+            word = match.group(kind)
+            if word in _KEYWORDS and _VALUE_END_RE.match(text, pos):
+                value = _KEYWORDS[word]
+            else:
+                value = _SKIPPED
+                pos = _skip_expression(text, match.start(kind))
+        else:
+            continue  # Комментарий
+
+        # Значение готово: прикрепляем его к текущему контейнеру
+        if container is None:
+            if type(value) is not dict and type(value) is not list:
+                return (None if value is _SKIPPED else value), pos
+        elif in_object:
+            if key is None:
+                raise JsLiteralError("Значение без ключа", pos)
+            if value is not _SKIPPED:
+                container[key] = value
+            key = None
+        else:
+            container.append(None if value is _SKIPPED else value)
+
+        if type(value) is dict:
+            stack.append(value)
+            container, in_object, expect_key = value, True, True
+        elif type(value) is list:
+            stack.append(value)
+            container, in_object = value, False
+
+
+def extract_call_argument(text: str, call_prefix: str) -> Optional[Any]:
+    """
+    Находит в тексте первый вызов call_prefix (например, 'new FGrid(')
+    и разбирает его первый аргумент. Возвращает None, если вызова в тексте нет.
+    """
+    start = text.find(call_prefix)
+    if start == -1:
+        return None
+    value, _ = parse_js_literal(text, start + len(call_prefix))
+    return value
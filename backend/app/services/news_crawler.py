@@ -0,0 +1,292 @@
+# app/services/news_crawler.py
+#
+# Инкрементальный обход новостей club-rf.ru (замена синхронного parsers/clubrfparser.py).
+#
+# Лента запрашивается условным GET (If-None-Match / If-Modified-Since): если она не менялась,
+# сайт отвечает 304 и обход заканчивается без скачивания статей. Иначе лента читается страница за
+# страницей до ссылки, на которой остановился прошлый обход (курсор в таблице crawl_state,
+# миграция 10). Новые статьи скачиваются параллельно, но не более clubrf_concurrency одновременно
+# и не чаще clubrf_host_rate_limit запросов в секунду, и записываются в project_activities
+# тем же пакетным путем, что и загрузка файла (news_importer.import_news_items), включая отсев перепечаток.
+# Статьи, которые не удалось скачать, остаются в курсоре и повторяются при следующих обходах
+# (до ARTICLE_MAX_ATTEMPTS попыток).
+#
+# Нац. цель статьи определяется по ее рубрикам (совпадение с названием цели), иначе берется
+# clubrf_default_goal; статьи без цели не записываются. Регион -- рубрика, совпавшая с названием региона.
+
+import asyncio
+import datetime
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import httpx
+from bs4 import BeautifulSoup
+
+from app.core.database import get_db_pool, settings
+from app.core.http_client import get_http_client
+from app.core.rate_limit import HostRateLimiter
+from app.services.dictionary_cache import dictionary_cache
+from app.services.news_importer import import_news_items
+from app.services.parser import StageCallback
+
+CLUBRF_SOURCE = 'club-rf'
+BASE_URL = 'http://club-rf.ru'
+NEWS_URL = f'{BASE_URL}/news'
+SOURCE_NAME = 'club-rf.ru'
+# После стольких неудачных попыток статья убирается из курсора
+ARTICLE_MAX_ATTEMPTS = 3
+
+# Заголовки для HTTP-запроса, чтобы имитировать браузер
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+_MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12,
+}
+_NUMERIC_DATE_RE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})')
+_TEXT_DATE_RE = re.compile(r'(\d{1,2})\s+([а-яё]+)\s+(\d{4})', re.IGNORECASE)
+
+
+def parse_news_date(value: Optional[str]) -> Optional[datetime.date]:
+    """Дата из ленты: "07.07.2025 15:23", "07.07.2025" или "7 июля 2025"."""
+    if not value:
+        return None
+    try:
+        match = _NUMERIC_DATE_RE.search(value)
+        if match:
+            day, month, year = (int(part) for part in match.groups())
+            return datetime.date(year, month, day)
+        match = _TEXT_DATE_RE.search(value)
+        if match and match.group(2).lower() in _MONTHS:
+            return datetime.date(int(match.group(3)), _MONTHS[match.group(2).lower()], int(match.group(1)))
+    except ValueError:
+        pass
+    return None
+
+
+def parse_news_list(html: str, page_url: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Разбирает страницу ленты. Возвращает (статьи от новых к старым, ссылка на следующую страницу или None)."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    entries = []
+    for item in soup.find_all('div', class_='news-item'):
+        title_tag = item.find('a', class_='news-item__title')
+        date_tag = item.find('span', class_='news-item__date')
+        if title_tag and title_tag.get('href'):
+            entries.append({
+                'link': urljoin(page_url, title_tag['href']),
+                'title': title_tag.get_text(strip=True),
+                'date': date_tag.get_text(strip=True) if date_tag else None,
+            })
+
+    next_tag = soup.find(['a', 'link'], rel='next')
+    next_url = urljoin(page_url, next_tag['href']) if next_tag and next_tag.get('href') else None
+    return entries, next_url
+
+
+def parse_article(html: str) -> Tuple[Optional[str], List[str]]:
+    """Разбирает страницу статьи. Возвращает (текст или None, рубрики статьи)."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    text = None
+    article_text_div = soup.find('div', class_='article__text')
+    if article_text_div:
+        # Собираем все текстовые блоки из <p> внутри основного контейнера
+        text = '\n'.join(p.get_text(strip=True) for p in article_text_div.find_all('p')) or None
+
+    tags = []
+    for container in soup.find_all(class_=re.compile(r'article__(tags|rubrics?)')):
+        tags.extend(a.get_text(strip=True) for a in container.find_all('a'))
+    return text, [tag for tag in tags if tag]
+
+
+async def _load_state(conn) -> Dict[str, Any]:
+    record = await conn.fetchrow(
+        "SELECT etag, last_modified, last_link, pending FROM crawl_state WHERE source = $1", CLUBRF_SOURCE)
+    if record is None:
+        return {'etag': None, 'last_modified': None, 'last_link': None, 'pending': []}
+    state = dict(record)
+    state['pending'] = json.loads(state['pending'])
+    return state
+
+
+async def _save_state(conn, state: Dict[str, Any]):
+    await conn.execute(
+        """
+        INSERT INTO crawl_state (source, etag, last_modified, last_link, pending, updated_at)
+        VALUES ($1, $2, $3, $4, $5::jsonb, NOW())
+        ON CONFLICT (source) DO UPDATE SET
+            etag = EXCLUDED.etag,
+            last_modified = EXCLUDED.last_modified,
+            last_link = EXCLUDED.last_link,
+            pending = EXCLUDED.pending,
+            updated_at = EXCLUDED.updated_at
+        """,
+        CLUBRF_SOURCE, state['etag'], state['last_modified'], state['last_link'],
+        json.dumps(state['pending'], ensure_ascii=False)
+    )
+
+
+async def _get(url: str, rate_limiter: HostRateLimiter, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    await rate_limiter.wait(url)
+    return await get_http_client(url).get(url, headers={**HEADERS, **(headers or {})}, follow_redirects=True)
+
+
+async def _fetch_new_entries(state: Dict[str, Any], rate_limiter: HostRateLimiter) -> Optional[List[Dict[str, Any]]]:
+    """
+    Статьи ленты новее курсора (от новых к старым) или None, если лента не менялась (304).
+    Обновляет в state валидаторы ленты и курсор.
+    """
+    conditional = {}
+    if state['etag']:
+        conditional['If-None-Match'] = state['etag']
+    if state['last_modified']:
+        conditional['If-Modified-Since'] = state['last_modified']
+
+    response = await _get(NEWS_URL, rate_limiter, conditional)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    new_entries = []
+    seen_links = set()
+    page_url, html = NEWS_URL, response.text
+    for page in range(settings.clubrf_max_list_pages):
+        entries, next_url = await asyncio.to_thread(parse_news_list, html, page_url)
+        reached_cursor = False
+        for entry in entries:
+            if entry['link'] == state['last_link']:
+                reached_cursor = True
+                break
+            if entry['link'] not in seen_links:
+                seen_links.add(entry['link'])
+                new_entries.append(entry)
+        if reached_cursor or not next_url or page + 1 == settings.clubrf_max_list_pages:
+            break
+
+        page_response = await _get(next_url, rate_limiter)
+        page_response.raise_for_status()
+        page_url, html = next_url, page_response.text
+
+    state['etag'] = response.headers.get('ETag')
+    state['last_modified'] = response.headers.get('Last-Modified')
+    if new_entries:
+        state['last_link'] = new_entries[0]['link']
+    return new_entries
+
+
+async def _fetch_article(entry: Dict[str, Any], rate_limiter: HostRateLimiter,
+                         semaphore: asyncio.Semaphore) -> Optional[Tuple[Optional[str], List[str]]]:
+    """(текст, рубрики) статьи или None, если ее не удалось скачать."""
+    async with semaphore:
+        try:
+            response = await _get(entry['link'], rate_limiter)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"  Не удалось загрузить статью по ссылке {entry['link']}: {e}", flush=True)
+            return None
+    return await asyncio.to_thread(parse_article, response.text)
+
+
+def _match_tags(tags: List[str], names_by_upper: Dict[str, str]) -> Optional[str]:
+    for tag in tags:
+        name = names_by_upper.get(tag.upper())
+        if name:
+            return name
+    return None
+
+
+async def crawl_clubrf(on_stage: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """Один инкрементальный обход club-rf.ru. Возвращает сводку (используется как результат задания)."""
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    async def stage(name: str):
+        if on_stage:
+            await on_stage(name)
+
+    async with pool.acquire() as conn:
+        state = await _load_state(conn)
+
+    rate_limiter = HostRateLimiter(settings.clubrf_host_rate_limit)
+    await stage('fetch_list')
+    new_entries = await _fetch_new_entries(state, rate_limiter)
+    if new_entries:
+        # Страховка на случай, если статья-курсор пропала из ленты: уже записанные ссылки не скачиваются
+        async with pool.acquire() as conn:
+            known = {r['link'] for r in await conn.fetch(
+                "SELECT link FROM project_activities WHERE link = ANY($1::text[])",
+                [entry['link'] for entry in new_entries])}
+        new_entries = [entry for entry in new_entries if entry['link'] not in known]
+
+    # Сначала старые: при отсеве перепечаток остается более ранняя публикация
+    pending_links = {entry['link'] for entry in state['pending']}
+    entries = state['pending'] + [entry for entry in reversed(new_entries or []) if entry['link'] not in pending_links]
+
+    await stage('fetch_articles')
+    semaphore = asyncio.Semaphore(settings.clubrf_concurrency)
+    articles = await asyncio.gather(*(_fetch_article(entry, rate_limiter, semaphore) for entry in entries))
+
+    goals_by_upper = {name.upper(): name for name in await dictionary_cache.get_mapping('national_goals')}
+    regions_by_upper = {name.upper(): name for name in await dictionary_cache.get_mapping('regions')}
+    today = datetime.date.today().isoformat()
+    failed, items = [], []
+    without_text = without_goal = 0
+    for entry, article in zip(entries, articles):
+        if article is None:
+            attempts = entry.get('attempts', 0) + 1
+            if attempts < ARTICLE_MAX_ATTEMPTS:
+                failed.append({**entry, 'attempts': attempts})
+            continue
+        text, tags = article
+        if not text:
+            without_text += 1
+            continue
+        goal = _match_tags(tags, goals_by_upper) or settings.clubrf_default_goal
+        if not goal:
+            without_goal += 1
+            continue
+        published_date = parse_news_date(entry['date'])
+        items.append({
+            'url': entry['link'],
+            'title': entry['title'],
+            'content': text,
+            'published_date': published_date.isoformat() if published_date else None,
+            'national_goal': goal,
+            'region_name': _match_tags(tags, regions_by_upper),
+            'source_name': SOURCE_NAME,
+            'last_update': today,
+        })
+
+    await stage('save')
+
+    async def iter_items() -> AsyncIterator[Dict[str, Any]]:
+        for item in items:
+            yield item
+
+    processed, added, updated, duplicates = await import_news_items(pool, iter_items())
+
+    # Курсор сохраняется только после записи: при сбое следующий обход повторит те же статьи
+    state['pending'] = failed
+    async with pool.acquire() as conn:
+        await _save_state(conn, state)
+
+    summary = {
+        'not_modified': new_entries is None,
+        'new_links': len(new_entries or []),
+        'fetched': sum(1 for article in articles if article is not None),
+        'failed': sum(1 for article in articles if article is None),
+        'without_text': without_text,
+        'without_goal': without_goal,
+        'processed': processed,
+        'added': added,
+        'updated': updated,
+        'duplicates': duplicates,
+    }
+    print(f"INFO: Обход {SOURCE_NAME}: " + ", ".join(f"{key}={value}" for key, value in summary.items()), flush=True)
+    return summary
@@ -0,0 +1,111 @@
+# app/services/news_dedup.py
+#
+# Поиск почти одинаковых новостей (перепечаток под разными ссылками) при импорте.
+#
+# Отпечаток новости -- MinHash-сигнатура множества ее шинглов (нормализованных троек слов подряд):
+# доля совпадающих позиций двух сигнатур оценивает сходство Жаккара их текстов.
+# Для поиска кандидатов сигнатура режется на LSH_BANDS полос; хэши полос хранятся в таблице
+# activity_lsh_bands (миграция 9), и новости, совпавшие с новой хотя бы в одной полосе, проверяются
+# по полной сигнатуре (project_activities.minhash). При 12 полосах по 5 значений пара со сходством 0.8
+# становится кандидатом с вероятностью ~0.99, со сходством 0.5 -- ~0.32, а 0.3 -- ~0.03.
+#
+# Хэш полосы включает регион: одна и та же новость в разных регионах дубликатом не считается,
+# иначе она пропала бы с дашборда одного из них.
+#
+# Параметры хэш-функций фиксированы (MINHASH_SEED): при их изменении сохраненные отпечатки
+# нужно пересчитать (python -m other.backfill_news_minhash --all).
+
+import hashlib
+import re
+import zlib
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+MINHASH_PERMUTATIONS = 60
+LSH_BANDS = 12
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+NEAR_DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+# Короче этого текст не получает отпечатка: у коротких заметок слишком много случайных совпадений
+MIN_SHINGLE_WORDS = 8
+MINHASH_SEED = 20240501
+
+_WORD_RE = re.compile(r"\w+")
+
+# Хэш-функции семейства multiply-add-shift: h(x) = ((a * x + b) mod 2^64) >> 32, a -- нечетное
+_rng = np.random.default_rng(MINHASH_SEED)
+_HASH_A = (_rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+_HASH_B = _rng.integers(0, 2 ** 63, MINHASH_PERMUTATIONS, dtype=np.uint64)[:, None]
+_SHINGLE_BASE = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _shingle_hashes(text: str) -> Optional[np.ndarray]:
+    """Хэши различных шинглов текста или None, если слов меньше MIN_SHINGLE_WORDS."""
+    words = _WORD_RE.findall(text.lower().replace('ё', 'е'))
+    if len(words) < MIN_SHINGLE_WORDS:
+        return None
+    # Слово хэшируется один раз, хэш шингла -- полином от хэшей его слов (векторно, по модулю 2^64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words),
+                              dtype=np.uint64, count=len(words))
+    count = len(words) - SHINGLE_SIZE + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        shingles = shingles * _SHINGLE_BASE + word_hashes[offset:offset + count]
+    return np.unique(shingles >> np.uint64(32))
+
+
+def minhash_signature(text: Optional[str]) -> Optional[np.ndarray]:
+    """MinHash-сигнатура текста (uint32 x MINHASH_PERMUTATIONS) или None, если текст слишком короткий."""
+    hashes = _shingle_hashes(text or '')
+    if hashes is None:
+        return None
+    # Переполнение uint64 здесь и есть взятие по модулю 2^64
+    return ((_HASH_A * hashes[None, :] + _HASH_B) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def band_hashes(signature: np.ndarray, region_id: Optional[int]) -> List[int]:
+    """Ключи LSH-полос сигнатуры (знаковые 64-битные, под BIGINT) с учетом региона."""
+    region = (region_id if region_id is not None else -1).to_bytes(4, 'little', signed=True)
+    keys = []
+    for band in range(LSH_BANDS):
+        digest = hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(),
+                                 digest_size=8, key=region + band.to_bytes(1, 'little')).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def signature_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка сходства Жаккара по доле совпадающих позиций сигнатур."""
+    return float(np.count_nonzero(a == b)) / MINHASH_PERMUTATIONS
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype('<u4').tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<u4').astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH-индекс в памяти: ключ полосы -> записи с такой полосой. Используется внутри пачки импорта."""
+
+    def __init__(self):
+        self._buckets: Dict[int, List[Any]] = {}
+
+    def add(self, key: Hashable, signature: np.ndarray, bands: List[int]):
+        for band_key in bands:
+            self._buckets.setdefault(band_key, []).append((key, signature))
+
+    def find(self, signature: np.ndarray, bands: List[int]) -> Optional[Hashable]:
+        """Ключ первой записи со сходством не ниже порога или None."""
+        seen = set()
+        for band_key in bands:
+            for key, candidate in self._buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if signature_similarity(signature, candidate) >= NEAR_DUPLICATE_THRESHOLD:
+                    return key
+        return None
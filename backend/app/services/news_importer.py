@@ -1,8 +1,16 @@
-import json
+import io
+import asyncio
 import asyncpg
-from typing import Tuple
+import ijson
+from typing import Tuple, Dict, List, Any, AsyncIterator, Union
 from datetime import date
 
+from app.core.cache import response_cache
+from app.services.dictionary_cache import dictionary_cache
+from app.services.news_dedup import (
+    NearDuplicateIndex, minhash_signature, band_hashes, signature_to_bytes, signature_from_bytes
+)
+
 # Константа JSON_FILE_PATH больше не нужна, так как файл будет передаваться напрямую
 # JSON_FILE_PATH = "app/services/filtered_news.json"
 
@@ -11,84 +19,242 @@ TYPO_MAP = {
     "РЕАЛИЗАЦИЯ ПОТЕНЦИАЛА КАЖДОГО ЧЕЛОВЕКА, РАЗВИТИЕ ЕГО ТАЛАНТОВ, ВОСПИТАНИЕ ПАТРИОТИЧНОЙ И СОЦИАЛЬНО ОТВЕТСТВЕННОЙ ЛИЧНОСТИ"
 }
 
+# Сколько новостей накапливается перед записью в БД; каждая пачка пишется в своей транзакции
+NEWS_BATCH_SIZE = 1000
+
+
+async def _iter_news_items(source: Union[bytes, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Потоково отдает элементы массива "results" без загрузки всего JSON в память.
+    source -- содержимое файла (bytes) или объект с асинхронным read() (например, UploadFile).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        for item in ijson.items(io.BytesIO(source), 'results.item', use_float=True):
+            yield item
+    else:
+        async for item in ijson.items_async(source, 'results.item', use_float=True):
+            yield item
+
+
+async def _load_goal_projects(conn: asyncpg.Connection) -> Dict[int, List[int]]:
+    """Связи цель -> проекты одним запросом на весь импорт."""
+    records = await conn.fetch(
+        """
+        SELECT goal_id, array_agg(project_id ORDER BY project_id) AS project_ids
+        FROM project_to_goal_mapping
+        GROUP BY goal_id
+        """
+    )
+    return {r['goal_id']: r['project_ids'] for r in records}
+
+
+async def _write_news_batch(conn: asyncpg.Connection, news_items: List[Dict[str, Any]],
+                            goals_by_upper_name: Dict[str, int],
+                            goal_projects: Dict[int, List[int]]) -> Tuple[int, int, int]:
+    """
+    Записывает пачку новостей одним upsert через unnest, отбросив почти одинаковые.
+    Возвращает (добавлено, обновлено, отброшено как почти одинаковые).
+    """
+    region_ids = await dictionary_cache.resolve_ids('regions', (item.get("region_name") for item in news_items))
+
+    # Ссылка уникальна в project_activities, поэтому новость с несколькими проектами
+    # дает одну строку (с первым проектом), а повтор ссылки в пачке обновляет ее поля
+    rows_by_link = {}
+    rows_without_link = []
+    for news_item in news_items:
+        goal_name = news_item.get("national_goal")
+        if not goal_name:
+            continue
+
+        goal_name_upper = goal_name.upper()
+        if goal_name_upper in TYPO_MAP:
+            goal_name_upper = TYPO_MAP[goal_name_upper].upper()
+
+        goal_id = goals_by_upper_name.get(goal_name_upper)
+        project_ids = goal_projects.get(goal_id) if goal_id else None
+        if not project_ids:
+            continue
+
+        published_date_obj = date.fromisoformat(news_item["published_date"]) if news_item.get(
+            "published_date") else None
+        last_update_obj = date.fromisoformat(news_item["last_update"]) if news_item.get("last_update") else None
+        importance = news_item.get("importance")
+
+        link = news_item.get("url")
+        project_id = rows_by_link[link][0] if link in rows_by_link else project_ids[0]
+        row = (
+            project_id, region_ids.get(news_item.get("region_name")), news_item.get("title"),
+            published_date_obj, link, news_item.get("source_name"), news_item.get("content"),
+            int(importance) if importance is not None else None, last_update_obj
+        )
+        if link is None:
+            rows_without_link.append(row)
+        else:
+            rows_by_link[link] = row
+
+    rows = list(rows_by_link.values()) + rows_without_link
+    if not rows:
+        return 0, 0, 0
+
+    rows, duplicates = await _collapse_near_duplicates(conn, rows)
+    if not rows:
+        return 0, 0, duplicates
+
+    columns = [list(column) for column in zip(*rows)]
+    records = await conn.fetch(
+        """
+        INSERT INTO project_activities (
+            project_id, region_id, title, activity_date, link,
+            responsible_body, text, importance, last_update, minhash
+        )
+        SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::date[], $5::text[],
+                             $6::text[], $7::text[], $8::int[], $9::date[], $10::bytea[])
+        ON CONFLICT (link) DO UPDATE SET
+            title = EXCLUDED.title,
+            activity_date = EXCLUDED.activity_date,
+            responsible_body = EXCLUDED.responsible_body,
+            text = EXCLUDED.text,
+            importance = EXCLUDED.importance,
+            last_update = EXCLUDED.last_update,
+            minhash = EXCLUDED.minhash
+        RETURNING id, region_id, minhash, (xmax = 0) AS inserted
+        """,
+        *columns
+    )
+    await _write_lsh_bands(conn, records)
+
+    added = sum(1 for r in records if r['inserted'])
+    return added, len(records) - added, duplicates
 
-# --- ИЗМЕНЕНИЕ 1: Функция теперь принимает содержимое файла (в байтах) ---
-async def import_news_from_upload(pool: asyncpg.Pool, file_content: bytes) -> Tuple[int, int, int]:
+
+async def _collapse_near_duplicates(conn: asyncpg.Connection,
+                                    rows: List[tuple]) -> Tuple[List[tuple], int]:
+    """
+    Отбрасывает новые новости, почти совпадающие (news_dedup.NEAR_DUPLICATE_THRESHOLD) с уже
+    сохраненными в том же регионе или с более ранними новостями пачки. Новости с уже известной
+    ссылкой не отбрасываются -- это обновление существующей строки.
+    Возвращает (оставшиеся строки с сигнатурой последним полем, число отброшенных).
+    """
+    # Сигнатуры считаются в отдельном потоке, чтобы пачка не блокировала цикл событий
+    texts = [row[6] or row[2] for row in rows]
+    signatures = await asyncio.to_thread(lambda: [minhash_signature(text) for text in texts])
+    bands = [band_hashes(signature, row[1]) if signature is not None else None
+             for row, signature in zip(rows, signatures)]
+
+    links = [row[4] for row in rows if row[4] is not None]
+    existing_links = {r['link'] for r in await conn.fetch(
+        "SELECT link FROM project_activities WHERE link = ANY($1::text[])", links)}
+
+    # Кандидаты из БД: новости, совпавшие с новыми хотя бы в одной LSH-полосе
+    index = NearDuplicateIndex()
+    candidate_keys = list({key for row, row_bands in zip(rows, bands)
+                           if row_bands is not None and row[4] not in existing_links for key in row_bands})
+    if candidate_keys:
+        candidates = await conn.fetch(
+            """
+            SELECT b.band_hash, a.id, a.minhash
+            FROM activity_lsh_bands b
+            JOIN project_activities a ON a.id = b.activity_id
+            WHERE b.band_hash = ANY($1::bigint[]) AND a.minhash IS NOT NULL
+            """,
+            candidate_keys
+        )
+        for r in candidates:
+            index.add(('db', r['id']), signature_from_bytes(r['minhash']), [r['band_hash']])
+
+    kept = []
+    duplicates = 0
+    for position, (row, signature, row_bands) in enumerate(zip(rows, signatures, bands)):
+        if signature is None:
+            kept.append(row + (None,))
+            continue
+        if row[4] not in existing_links and index.find(signature, row_bands) is not None:
+            duplicates += 1
+            continue
+        index.add(('batch', position), signature, row_bands)
+        kept.append(row + (signature_to_bytes(signature),))
+    return kept, duplicates
+
+
+async def _write_lsh_bands(conn: asyncpg.Connection, records: List[asyncpg.Record]):
+    """Заменяет LSH-полосы записанных новостей на полосы их текущих сигнатур."""
+    updated_ids = [r['id'] for r in records if not r['inserted']]
+    if updated_ids:
+        await conn.execute("DELETE FROM activity_lsh_bands WHERE activity_id = ANY($1::int[])", updated_ids)
+
+    band_rows = [(key, r['id']) for r in records if r['minhash'] is not None
+                 for key in band_hashes(signature_from_bytes(r['minhash']), r['region_id'])]
+    if band_rows:
+        band_keys, activity_ids = zip(*band_rows)
+        await conn.execute(
+            """
+            INSERT INTO activity_lsh_bands (band_hash, activity_id)
+            SELECT * FROM unnest($1::bigint[], $2::int[])
+            ON CONFLICT DO NOTHING
+            """,
+            list(band_keys), list(activity_ids)
+        )
+
+
+async def import_news_from_upload(pool: asyncpg.Pool, source: Union[bytes, Any],
+                                  batch_size: int = NEWS_BATCH_SIZE) -> Tuple[int, int, int, int]:
     """
     Импортирует новости из загруженного JSON-файла в базу данных.
+    Элементы "results" разбираются потоково (ijson) и записываются через import_news_items.
     """
-    # --- ИЗМЕНЕНИЕ 2: Загружаем JSON из содержимого файла, а не из диска ---
-    news_data = json.loads(file_content)
+    return await import_news_items(pool, _iter_news_items(source), batch_size)
+
 
+async def import_news_items(pool: asyncpg.Pool, news_items: AsyncIterator[Dict[str, Any]],
+                            batch_size: int = NEWS_BATCH_SIZE) -> Tuple[int, int, int, int]:
+    """
+    Записывает новости (элементы в формате выгрузки: url, title, content, national_goal, ...)
+    в project_activities. Используется загрузкой файла и обходчиком новостных сайтов.
+
+    Новости накапливаются пачками по batch_size и записываются по одной транзакции на пачку,
+    поэтому расход памяти ограничен размером пачки, а уже записанные пачки сохраняются,
+    даже если источник оборвется на середине.
+    Перепечатки под другими ссылками (почти одинаковый текст в том же регионе) не записываются.
+    Возвращает (обработано, добавлено, обновлено, отброшено как почти одинаковые).
+    """
     inserted_count = 0
     updated_count = 0
+    duplicate_count = 0
     processed_count = 0
 
+    # Цели сопоставляются через общий кэш справочников, связи цель -> проекты читаются один раз
+    goals_by_upper_name = {name.upper(): goal_id
+                           for name, goal_id in (await dictionary_cache.get_mapping('national_goals')).items()}
+
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            regions_cache = {r['name']: r['id'] for r in await conn.fetch("SELECT id, name FROM regions")}
-            goals_cache = {g['name'].upper(): g['id'] for g in await conn.fetch("SELECT id, name FROM national_goals")}
-
-            # Проверяем, есть ли ключ "results" в JSON
-            for news_item in news_data.get("results", []):
-                processed_count += 1
-                region_name = news_item.get("region_name")
-                goal_name = news_item.get("national_goal")
-
-                region_id = regions_cache.get(region_name)
-                if not region_id:
-                    region_id = await conn.fetchval(
-                        "INSERT INTO regions (name) VALUES ($1) ON CONFLICT (name) DO UPDATE SET name=EXCLUDED.name RETURNING id",
-                        region_name)
-                    regions_cache[region_name] = region_id
-
-                if not goal_name:
-                    continue
-
-                goal_name_upper = goal_name.upper()
-                if goal_name_upper in TYPO_MAP:
-                    goal_name = TYPO_MAP[goal_name_upper]
-                    goal_name_upper = goal_name.upper()
-
-                goal_id = goals_cache.get(goal_name_upper)
-                if not goal_id:
-                    continue
-
-                project_ids = await conn.fetch(
-                    "SELECT project_id FROM project_to_goal_mapping WHERE goal_id = $1",
-                    goal_id
-                )
-                if not project_ids:
-                    continue
-
-                published_date_obj = date.fromisoformat(news_item["published_date"]) if news_item.get(
-                    "published_date") else None
-                last_update_obj = date.fromisoformat(news_item["last_update"]) if news_item.get("last_update") else None
-
-                for record in project_ids:
-                    project_id = record['project_id']
-                    query = """
-                        INSERT INTO project_activities (
-                            project_id, region_id, title, activity_date, link,
-                            responsible_body, text, importance, last_update
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                        ON CONFLICT (link) DO UPDATE SET
-                            title = EXCLUDED.title,
-                            activity_date = EXCLUDED.activity_date,
-                            responsible_body = EXCLUDED.responsible_body,
-                            text = EXCLUDED.text,
-                            importance = EXCLUDED.importance,
-                            last_update = EXCLUDED.last_update
-                        RETURNING (xmax = 0) AS inserted;
-                    """
-                    result = await conn.fetchrow(
-                        query, project_id, region_id, news_item.get("title"),
-                        published_date_obj, news_item.get("url"), news_item.get("source_name"),
-                        news_item.get("content"), news_item.get("importance"), last_update_obj
-                    )
-                    if result and result['inserted']:
-                        inserted_count += 1
-                    else:
-                        updated_count += 1
-
-    return processed_count, inserted_count, updated_count
\ No newline at end of file
+        goal_projects = await _load_goal_projects(conn)
+
+        batch = []
+        async for news_item in news_items:
+            processed_count += 1
+            batch.append(news_item)
+            if len(batch) < batch_size:
+                continue
+
+            async with conn.transaction():
+                added, updated, duplicates = await _write_news_batch(conn, batch, goals_by_upper_name,
+                                                                     goal_projects)
+            response_cache.bump_data_version()
+            inserted_count += added
+            updated_count += updated
+            duplicate_count += duplicates
+            batch = []
+            print(f"INFO: Импорт новостей: обработано {processed_count}, "
+                  f"добавлено {inserted_count}, обновлено {updated_count}, "
+                  f"почти одинаковых {duplicate_count}", flush=True)
+
+        if batch:
+            async with conn.transaction():
+                added, updated, duplicates = await _write_news_batch(conn, batch, goals_by_upper_name,
+                                                                     goal_projects)
+            response_cache.bump_data_version()
+            inserted_count += added
+            updated_count += updated
+            duplicate_count += duplicates
+
+    return processed_count, inserted_count, updated_count, duplicate_count
@@ -1,29 +1,35 @@
 import httpx
-import json
 import re
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, Callable, Awaitable
+
+from app.core.http_client import get_http_client
+from app.core.rate_limit import HostRateLimiter
+from app.services.js_literal import extract_call_argument, JsLiteralError
 
 DATA_API_URL = "https://fedstat.ru/indicator/dataGrid.do"
 
+# Вызывается при переходе к очередному этапу обработки индикатора (используется очередью заданий)
+StageCallback = Callable[[str], Awaitable[None]]
+
 
 def extract_grid_config(html_content: str) -> Optional[Dict[str, Any]]:
-    """Извлекает и очищает объект конфигурации FGrid из HTML-кода."""
-    match = re.search(r"new FGrid\((.*?)\);", html_content, re.DOTALL)
-    if not match:
-        print("Ошибка: Конфигурация FGrid не найдена на странице.")
+    """
+    Извлекает объект конфигурации FGrid из HTML-кода.
+    Литерал разбирается напрямую со своей позиции в странице (см. js_literal),
+    без регулярных замен по всему тексту.
+    """
+    try:
+        config = extract_call_argument(html_content, "new FGrid(")
+    except JsLiteralError as e:
+        print(f"Критическая ошибка разбора конфигурации FGrid: {e}")
         return None
 
-    config_str = match.group(1).strip()
-    try:
-        config_str = re.sub(r"block\s*:\s*\$\('#grid'\),?", "", config_str)
-        config_str = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', config_str)
-        config_str = config_str.replace("'", '"')
-        config_str = re.sub(r',\s*([}\]])', r'\1', config_str)
-        return json.loads(config_str)
-    except json.JSONDecodeError as e:
-        print(f"Критическая ошибка декодирования JSON: {e}")
+    if not isinstance(config, dict):
+        print("Ошибка: Конфигурация FGrid не найдена на странице.")
         return None
+    return config
 
 
 def find_filter_id_by_title(config: Dict[str, Any], keywords: list[str]) -> Optional[str]:
@@ -37,7 +43,8 @@ def find_filter_id_by_title(config: Dict[str, Any], keywords: list[str]) -> Opti
 
 
 async def fetch_all_indicator_data(client: httpx.AsyncClient, indicator_id: int, config: Dict[str, Any],
-                                   source_url: str) -> Optional[Dict[str, Any]]:
+                                   source_url: str, rate_limiter: Optional[HostRateLimiter] = None
+                                   ) -> Optional[Dict[str, Any]]:
     """Автоматически определяет все измерения для строк и столбцов и формирует payload."""
     region_filter_id = find_filter_id_by_title(config, ["территори", "окато", "оксм"])
     period_filter_id = find_filter_id_by_title(config, ["период"])
@@ -62,6 +69,8 @@ async def fetch_all_indicator_data(client: httpx.AsyncClient, indicator_id: int,
             payload['selectedFilterIds'].append(f"{filter_id}_{value_id}")
 
     try:
+        if rate_limiter:
+            await rate_limiter.wait(DATA_API_URL)
         headers = {'User-Agent': 'Mozilla/5.0', 'Referer': source_url}
         response = await client.post(DATA_API_URL, data=payload, headers=headers, timeout=45.0)
         response.raise_for_status()
@@ -71,8 +80,75 @@ async def fetch_all_indicator_data(client: httpx.AsyncClient, indicator_id: int,
         return None
 
 
+YEARLY_PERIOD_NAME = "значение показателя за год"
+
+# Порядок важен: для периодов вида "январь-декабрь" берется последний месяц
+MONTH_KEYWORDS = [
+    ('декабрь', 12), ('ноябрь', 11), ('октябрь', 10), ('сентябрь', 9), ('август', 8), ('июль', 7),
+    ('июнь', 6), ('май', 5), ('апрель', 4), ('март', 3), ('февраль', 2), ('январь', 1),
+]
+
+
+def get_month_from_period(period_name: str) -> Optional[int]:
+    """Номер месяца по названию периода fedstat или None, если период не месячный."""
+    p_lower = period_name.lower()
+    for keyword, month in MONTH_KEYWORDS:
+        if keyword in p_lower:
+            return month
+    return None
+
+
+def compile_column_map(column_keys, period_map: Dict[str, str]) -> Dict[str, Tuple[int, str, Optional[int], bool]]:
+    """
+    Разбирает ключи колонок ответа dataGrid (dim...) один раз на весь ответ.
+    Возвращает {ключ: (год, название периода, месяц или None, это годовое значение)}
+    только для ключей, в которых удалось распознать год и период.
+    """
+    column_map = {}
+    for key in column_keys:
+        if not isinstance(key, str) or not key.startswith("dim"): continue
+
+        parts = key[3:].split('_')
+        year, period_name = None, None
+
+        # Сценарий 1: ключ = dim<ГОД> (например, для 40466)
+        if len(parts) == 1 and parts[0].isdigit():
+            year, period_name = int(parts[0]), YEARLY_PERIOD_NAME
+
+        elif len(parts) > 1:
+            # Сценарий 2: ключ = dim<ГОД>_<ID_ПЕРИОДА>... (для 62083)
+            if parts[0].isdigit() and len(parts[0]) == 4 and parts[1] in period_map:
+                year, period_name = int(parts[0]), period_map.get(parts[1])
+            # Сценарий 3: ключ = dim<ID_ПЕРИОДА>_<ГОД>... (для 59263)
+            elif parts[1].isdigit() and len(parts[1]) == 4 and parts[0] in period_map:
+                year, period_name = int(parts[1]), period_map.get(parts[0])
+
+        if year and period_name:
+            is_yearly = YEARLY_PERIOD_NAME in period_name.lower()
+            column_map[key] = (year, period_name, get_month_from_period(period_name), is_yearly)
+    return column_map
+
+
+def _to_numeric_values(raw_values: np.ndarray) -> np.ndarray:
+    """
+    Приводит значения ячеек к float. Числа конвертируются векторно,
+    строки с десятичной запятой ("12,5") -- отдельным проходом только по ним.
+    """
+    values = pd.Series(raw_values, dtype=object)
+    numeric = pd.to_numeric(values, errors='coerce')
+    needs_text_parse = numeric.isna() & values.notna()
+    if needs_text_parse.any():
+        text_values = values[needs_text_parse].astype(str).str.replace(',', '.', regex=False)
+        numeric[needs_text_parse] = pd.to_numeric(text_values, errors='coerce')
+    return numeric.to_numpy(dtype=float)
+
+
 def process_api_response(api_data: Dict[str, Any], config: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """ФИНАЛЬНАЯ ВЕРСИЯ: Обрабатывает все известные структуры ответа API."""
+    """
+    Обрабатывает все известные структуры ответа API.
+    Ключи колонок разбираются один раз (compile_column_map), а таблица строится по колонкам:
+    значения всех строк переводятся в длинный формат и приводятся к числам векторно.
+    """
     region_filter_id = find_filter_id_by_title(config, ["территори", "окато", "оксм"])
     period_filter_id = find_filter_id_by_title(config, ["период"])
 
@@ -87,65 +163,42 @@ def process_api_response(api_data: Dict[str, Any], config: Dict[str, Any]) -> Tu
         print(f"Ошибка в структуре конфигурации: {e}")
         return pd.DataFrame(), pd.DataFrame()
 
-    all_rows = []
-    for result_row in api_data.get("results", []):
-        region_name = result_row.get(region_dim_key)
-        if not region_name: continue
-
-        for key, value in result_row.items():
-            if not key.startswith("dim"): continue
-
-            parts = key[3:].split('_')
-            year, period_name = None, None
-
-            # --- НАЧАЛО УНИВЕРСАЛЬНОЙ ЛОГИКИ ---
-            # Сценарий 1: ключ = dim<ГОД> (например, для 40466)
-            if len(parts) == 1 and parts[0].isdigit():
-                year, period_name = int(parts[0]), "значение показателя за год"
-
-            elif len(parts) > 1:
-                # Сценарий 2: ключ = dim<ГОД>_<ID_ПЕРИОДА>... (для 62083)
-                if parts[0].isdigit() and len(parts[0]) == 4 and parts[1] in period_map:
-                    year, period_name = int(parts[0]), period_map.get(parts[1])
-                # Сценарий 3: ключ = dim<ID_ПЕРИОДА>_<ГОД>... (для 59263)
-                elif parts[1].isdigit() and len(parts[1]) == 4 and parts[0] in period_map:
-                    year, period_name = int(parts[1]), period_map.get(parts[0])
-            # --- КОНЕЦ УНИВЕРСАЛЬНОЙ ЛОГИКИ ---
-
-            if year and period_name:
-                all_rows.append({
-                    "region_name": region_name, "year": year,
-                    "period_name": period_name,
-                    "measured_value": str(value).replace(',', '.') if value is not None else None
-                })
-
-    if not all_rows: return pd.DataFrame(), pd.DataFrame()
-
-    df = pd.DataFrame(all_rows)
-    df = df[pd.to_numeric(df['measured_value'], errors='coerce').notna()]
-    df['measured_value'] = pd.to_numeric(df['measured_value'])
-
-    yearly_df = df[df['period_name'].str.contains('значение показателя за год', case=False, na=False)].copy()
+    results = api_data.get("results", [])
+    if not results: return pd.DataFrame(), pd.DataFrame()
+
+    # Разбираем ключи колонок один раз на весь ответ, а не для каждой строки
+    column_keys = dict.fromkeys(key for row in results for key in row)
+    if region_dim_key not in column_keys: return pd.DataFrame(), pd.DataFrame()
+
+    column_map = compile_column_map(column_keys, period_map)
+    value_keys = [key for key in column_keys if key in column_map]
+    rows = [row for row in results if row.get(region_dim_key)]
+    if not value_keys or not rows: return pd.DataFrame(), pd.DataFrame()
+
+    # Матрица "строка ответа x колонка" и длинный формат в порядке обхода строк,
+    # чтобы drop_duplicates(keep='first') оставлял те же значения, что и построчная обработка
+    row_count, key_count = len(rows), len(value_keys)
+    grid = np.empty((row_count, key_count), dtype=object)
+    grid[:] = [[row.get(key) for key in value_keys] for row in rows]
+    regions = np.array([row[region_dim_key] for row in rows], dtype=object)
+    raw_values = grid.ravel()
+    key_meta = pd.DataFrame([column_map[key] for key in value_keys],
+                            columns=['year', 'period_name', 'month', 'is_yearly'])
+    key_meta['month'] = pd.to_numeric(key_meta['month'])
+
+    df = pd.DataFrame({
+        'region_name': np.repeat(regions, key_count),
+        'key_index': np.tile(np.arange(key_count), row_count),
+        'measured_value': _to_numeric_values(raw_values),
+    })
+    df = df[df['measured_value'].notna()]
+    df = df.join(key_meta, on='key_index').drop(columns='key_index')
+
+    yearly_df = df[df['is_yearly']].copy()
     yearly_df.drop_duplicates(subset=['region_name', 'year'], keep='first', inplace=True)
     yearly_df.rename(columns={'measured_value': 'yearly_value'}, inplace=True)
+    yearly_df = yearly_df[['region_name', 'year', 'yearly_value']]
 
-    def get_month_from_period(p_name):
-        p_lower = p_name.lower()
-        if 'декабрь' in p_lower: return 12
-        if 'ноябрь' in p_lower: return 11
-        if 'октябрь' in p_lower: return 10
-        if 'сентябрь' in p_lower: return 9
-        if 'август' in p_lower: return 8
-        if 'июль' in p_lower: return 7
-        if 'июнь' in p_lower: return 6
-        if 'май' in p_lower: return 5
-        if 'апрель' in p_lower: return 4
-        if 'март' in p_lower: return 3
-        if 'февраль' in p_lower: return 2
-        if 'январь' in p_lower: return 1
-        return None
-
-    df['month'] = df['period_name'].apply(get_month_from_period)
     monthly_df = df.dropna(subset=['month']).copy()
 
     if not monthly_df.empty:
@@ -154,37 +207,50 @@ def process_api_response(api_data: Dict[str, Any], config: Dict[str, Any]) -> Tu
         monthly_df['value_date'] = pd.to_datetime({'year': monthly_df['year'], 'month': monthly_df['month'], 'day': 1},
                                                   errors='coerce')
         monthly_df.dropna(subset=['value_date'], inplace=True)
-        return monthly_df[['region_name', 'value_date', 'measured_value']], yearly_df[
-            ['region_name', 'year', 'yearly_value']]
+        return monthly_df[['region_name', 'value_date', 'measured_value']], yearly_df
 
-    return pd.DataFrame(), yearly_df[['region_name', 'year', 'yearly_value']]
+    return pd.DataFrame(), yearly_df
 
 
-async def get_indicator_data_from_url(url: str):
-    """Главная функция, которая управляет сессией и выполняет все запросы."""
+async def get_indicator_data_from_url(url: str, rate_limiter: Optional[HostRateLimiter] = None,
+                                      on_stage: Optional[StageCallback] = None):
+    """
+    Главная функция, которая управляет сессией и выполняет все запросы.
+    Если передан rate_limiter, каждый запрос к fedstat ждет своего слота (используется пакетной загрузкой).
+    Если передан on_stage, он вызывается перед каждым этапом: fetch_page, fetch_data, process.
+    """
     indicator_id_match = re.search(r"/indicator/(\d+)", url)
     if not indicator_id_match: return None, None, None
     indicator_id = int(indicator_id_match.group(1))
 
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = await client.get(url, headers=headers, follow_redirects=True, timeout=20.0)
-            response.raise_for_status()
-            html_content = response.text
-        except httpx.RequestError as e:
-            print(f"Ошибка получения HTML страницы: {e}")
-            return None, None, None
-
-        config = extract_grid_config(html_content)
-        if not config: return None, None, None
-
-        print("Конфигурация получена. Запрашиваем все данные одним запросом...")
-        api_data = await fetch_all_indicator_data(client, indicator_id, config, url)
-        if not api_data: return None, None, None
-
-        print(f"Получено {len(api_data.get('results', []))} строк от API. Обрабатываем...")
-        monthly_df, yearly_df = process_api_response(api_data, config)
+    # Общий клиент держит открытым соединение с fedstat между запросами и индикаторами
+    client = get_http_client(url)
+    if on_stage:
+        await on_stage('fetch_page')
+    try:
+        if rate_limiter:
+            await rate_limiter.wait(url)
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        response = await client.get(url, headers=headers, follow_redirects=True, timeout=20.0)
+        response.raise_for_status()
+        html_content = response.text
+    except httpx.RequestError as e:
+        print(f"Ошибка получения HTML страницы: {e}")
+        return None, None, None
+
+    config = extract_grid_config(html_content)
+    if not config: return None, None, None
+
+    print("Конфигурация получена. Запрашиваем все данные одним запросом...")
+    if on_stage:
+        await on_stage('fetch_data')
+    api_data = await fetch_all_indicator_data(client, indicator_id, config, url, rate_limiter)
+    if not api_data: return None, None, None
+
+    print(f"Получено {len(api_data.get('results', []))} строк от API. Обрабатываем...")
+    if on_stage:
+        await on_stage('process')
+    monthly_df, yearly_df = process_api_response(api_data, config)
 
     metadata = {'name': config.get('title', ''), 'unit': config.get('unit', '')}
     return metadata, monthly_df, yearly_df
\ No newline at end of file
@@ -0,0 +1,177 @@
+# app/services/refresh_scheduler.py
+#
+# Плановое обновление индикаторов по их периодичности.
+# Для каждого индикатора с source_url срок следующего обновления = последняя проверка + интервал,
+# который выводится из текстового поля periodicity ("Ежемесячно", "Ежеквартально", "2 раза в год"...).
+# Непарсившиеся индикаторы считаются просроченными сильнее всех.
+#
+# Раз в scheduler_interval секунд планировщик ставит просроченные ссылки в очередь заданий
+# (app/services/job_queue.py) в порядке приоритета: сначала use_for_agent, затем самые просроченные.
+# Параллельность ограничивают обработчики очереди, а число одновременно поставленных
+# плановых заданий -- scheduler_max_enqueued. Ссылка не ставится повторно, пока по ней есть
+# незавершенное задание или недавно упавшее (scheduler_failed_cooldown).
+
+import asyncio
+import datetime
+import re
+from typing import Any, Dict, List, Optional
+
+from app.core.database import get_db_pool, settings
+from app.services.job_queue import job_queue, JOB_PARSE_INDICATOR
+
+# Транзакционная advisory-блокировка: планирование в нескольких процессах не ставит задания дважды
+_SCHEDULER_LOCK_KEY = 7_240_002
+
+_DAY = datetime.timedelta(days=1)
+
+# "N раз(а) в год/квартал/месяц/неделю"
+_TIMES_PER_RE = re.compile(r'(\d+)\s*раз[а]?\s+в\s+(год|квартал|месяц|недел)')
+_TIMES_PER_PERIODS = {'год': 365 * _DAY, 'квартал': 91 * _DAY, 'месяц': 30 * _DAY, 'недел': 7 * _DAY}
+
+# Порядок важен: более частая периодичность проверяется раньше ("ежемесячно, с начала года" -- месяц)
+PERIODICITY_INTERVALS = [
+    (re.compile(r'ежедневн|раз в день'), _DAY),
+    (re.compile(r'еженедел|раз в недел'), 7 * _DAY),
+    (re.compile(r'ежемесяч|месячн|раз в месяц'), 30 * _DAY),
+    (re.compile(r'ежекварт|квартальн|раз в квартал'), 91 * _DAY),
+    (re.compile(r'полугод|раз в полгода'), 182 * _DAY),
+    (re.compile(r'ежегод|годов|раз в год'), 365 * _DAY),
+]
+
+
+def periodicity_interval(periodicity: Optional[str]) -> datetime.timedelta:
+    """Интервал обновления по тексту периодичности; неизвестная -- scheduler_default_interval_days."""
+    text = (periodicity or '').lower()
+
+    match = _TIMES_PER_RE.search(text)
+    if match and int(match.group(1)) > 0:
+        return _TIMES_PER_PERIODS[match.group(2)] / int(match.group(1))
+
+    for pattern, interval in PERIODICITY_INTERVALS:
+        if pattern.search(text):
+            return interval
+    return datetime.timedelta(days=settings.scheduler_default_interval_days)
+
+
+async def load_staleness(now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Срок обновления каждого индикатора с source_url в порядке приоритета:
+    use_for_agent, затем по убыванию просрочки (непарсившиеся -- первыми).
+    """
+    pool = await get_db_pool()
+    if pool is None:
+        raise ConnectionError("Пул соединений с БД не инициализирован.")
+
+    async with pool.acquire() as conn:
+        # Успешное задание по ссылке тоже считается проверкой: если fedstat вернул индикатор
+        # под другим названием, last_parsed_at не обновится, но дергать ссылку снова рано
+        records = await conn.fetch(
+            """
+            SELECT i.id, i.name, btrim(i.source_url) AS source_url, i.periodicity, i.use_for_agent,
+                   i.last_parsed_at, j.last_success_at
+            FROM indicators i
+            LEFT JOIN (
+                SELECT payload->>'url' AS url, max(finished_at) AS last_success_at
+                FROM jobs
+                WHERE kind = $1 AND status = 'succeeded'
+                GROUP BY 1
+            ) j ON j.url = btrim(i.source_url)
+            WHERE i.source_url IS NOT NULL AND btrim(i.source_url) <> ''
+            """,
+            JOB_PARSE_INDICATOR
+        )
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    items = []
+    for r in records:
+        interval = periodicity_interval(r['periodicity'])
+        checked = [t for t in (r['last_parsed_at'], r['last_success_at']) if t is not None]
+        last_checked_at = max(checked) if checked else None
+        next_due_at = last_checked_at + interval if last_checked_at else None
+        overdue = (now - next_due_at).total_seconds() if next_due_at else None
+        items.append({
+            'indicator_id': r['id'],
+            'name': r['name'],
+            'source_url': r['source_url'],
+            'periodicity': r['periodicity'],
+            'use_for_agent': bool(r['use_for_agent']),
+            'refresh_interval_days': round(interval / _DAY, 2),
+            'last_parsed_at': r['last_parsed_at'],
+            'last_checked_at': last_checked_at,
+            'next_due_at': next_due_at,
+            'overdue_seconds': round(overdue) if overdue is not None else None,
+            'is_due': overdue is None or overdue >= 0,
+        })
+
+    items.sort(key=lambda item: (
+        not item['use_for_agent'],
+        item['overdue_seconds'] is not None,
+        -(item['overdue_seconds'] or 0),
+    ))
+    return items
+
+
+async def enqueue_due_indicators() -> List[int]:
+    """Ставит в очередь просроченные ссылки в порядке приоритета. Возвращает id новых заданий."""
+    items = await load_staleness()
+
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEDULER_LOCK_KEY)
+            busy = await conn.fetch(
+                """
+                SELECT DISTINCT payload->>'url' AS url, (payload ? 'scheduled') AS scheduled, status
+                FROM jobs
+                WHERE kind = $1
+                  AND (status IN ('queued', 'running')
+                       OR (status = 'failed' AND finished_at > NOW() - make_interval(secs => $2)))
+                """,
+                JOB_PARSE_INDICATOR, settings.scheduler_failed_cooldown
+            )
+            busy_urls = {r['url'] for r in busy}
+            in_flight = sum(1 for r in busy if r['scheduled'] and r['status'] != 'failed')
+
+            # Одна ссылка может быть у нескольких индикаторов: берется первый по приоритету
+            payloads = []
+            for item in items:
+                if len(payloads) + in_flight >= settings.scheduler_max_enqueued:
+                    break
+                if not item['is_due'] or item['source_url'] in busy_urls:
+                    continue
+                busy_urls.add(item['source_url'])
+                payloads.append({'url': item['source_url'], 'indicator_id': item['indicator_id'],
+                                 'scheduled': True})
+
+            job_ids = await job_queue.submit_many(conn, JOB_PARSE_INDICATOR, payloads)
+
+    if job_ids:
+        print(f"Планировщик: поставлено в очередь {len(job_ids)} индикаторов", flush=True)
+    return job_ids
+
+
+class RefreshScheduler:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запускает периодическое планирование. Вызывается из lifespan после запуска очереди."""
+        if settings.scheduler_enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await enqueue_due_indicators()
+            except Exception as e:
+                print(f"Планировщик: ошибка планирования: {e}", flush=True)
+            await asyncio.sleep(settings.scheduler_interval)
+
+
+refresh_scheduler = RefreshScheduler()
@@ -0,0 +1,89 @@
+# backfill_news_minhash.py
+#
+# Считает MinHash-отпечатки и LSH-полосы (app/services/news_dedup.py) для новостей, импортированных
+# до миграции 9, чтобы новые перепечатки сверялись и с ними. Уже сохраненные дубликаты не удаляются.
+# С флагом --all пересчитывает отпечатки всех новостей (нужно после изменения параметров MinHash).
+# Запуск из каталога backend: python -m other.backfill_news_minhash [--all]
+
+import asyncio
+import sys
+import time
+
+import asyncpg
+
+from app.core.database import settings
+from app.services.news_dedup import minhash_signature, band_hashes, signature_to_bytes
+
+BATCH_SIZE = 2000
+
+
+async def backfill_batch(conn, records) -> int:
+    ids, minhashes, band_keys, band_ids = [], [], [], []
+    for r in records:
+        signature = minhash_signature(r['text'] or r['title'])
+        ids.append(r['id'])
+        minhashes.append(signature_to_bytes(signature) if signature is not None else None)
+        if signature is not None:
+            for key in band_hashes(signature, r['region_id']):
+                band_keys.append(key)
+                band_ids.append(r['id'])
+
+    async with conn.transaction():
+        await conn.execute(
+            """
+            UPDATE project_activities a SET minhash = v.minhash
+            FROM unnest($1::int[], $2::bytea[]) AS v(id, minhash)
+            WHERE a.id = v.id
+            """,
+            ids, minhashes
+        )
+        await conn.execute("DELETE FROM activity_lsh_bands WHERE activity_id = ANY($1::int[])", ids)
+        await conn.execute(
+            """
+            INSERT INTO activity_lsh_bands (band_hash, activity_id)
+            SELECT * FROM unnest($1::bigint[], $2::int[])
+            ON CONFLICT DO NOTHING
+            """,
+            band_keys, band_ids
+        )
+    return sum(1 for m in minhashes if m is not None)
+
+
+async def main():
+    recompute_all = '--all' in sys.argv[1:]
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        started = time.perf_counter()
+        processed = 0
+        fingerprinted = 0
+        last_id = 0
+        while True:
+            # Проход по id: без --all обновленные строки выпадают из выборки, с --all -- остаются позади
+            records = await conn.fetch(
+                f"""
+                SELECT id, region_id, title, text
+                FROM project_activities
+                WHERE id > $1 {'' if recompute_all else 'AND minhash IS NULL'}
+                ORDER BY id
+                LIMIT {BATCH_SIZE}
+                """,
+                last_id
+            )
+            if not records:
+                break
+            fingerprinted += await backfill_batch(conn, records)
+            processed += len(records)
+            last_id = records[-1]['id']
+            print(f"Обработано {processed}, с отпечатком {fingerprinted}", flush=True)
+
+        print(f"Готово за {time.perf_counter() - started:.1f} с: обработано {processed}, "
+              f"с отпечатком {fingerprinted} (остальные слишком короткие)")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
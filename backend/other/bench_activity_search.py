@@ -0,0 +1,132 @@
+# bench_activity_search.py
+#
+# Замеряет задержку полнотекстового поиска (GET /api/activities/search) на синтетическом корпусе
+# в несколько сотен тысяч новостей. Корпус пишется во временную таблицу project_activities
+# (копия структуры с генерируемой search_vector и GIN-индексом) -- в этом соединении она
+# перекрывает настоящую, поэтому реальные данные не затрагиваются.
+# Частоты слов распределены неравномерно: первые слова словаря встречаются почти в каждой новости,
+# последние -- редко, как в настоящем новостном корпусе. Каждая десятая новость без региона
+# (region_id NULL, как у новостей, для которых регион не определился): в проекте 1 таких половина.
+# Каждая страница результатов проверяется моделью ответа эндпоинта.
+# Запуск из каталога backend: python -m other.bench_activity_search [число новостей]
+
+import asyncio
+import datetime
+import statistics
+import sys
+import time
+
+import asyncpg
+from tabulate import tabulate
+
+from app.core.database import settings
+from app.models.models import ActivitySearchResponse
+from app.services.activity_search import search_activities
+
+CORPUS_SIZE = 300_000
+INSERT_BATCH = 50_000
+SAMPLES = 20
+TARGET_P95_MS = 200.0
+
+VOCABULARY = [
+    'регион', 'проект', 'национальный', 'программа', 'развитие', 'министерство', 'область', 'работа',
+    'строительство', 'школа', 'больница', 'дорога', 'ремонт', 'финансирование', 'поддержка', 'семья',
+    'образование', 'здравоохранение', 'культура', 'спорт', 'экология', 'жилье', 'туризм', 'наука',
+    'цифровой', 'экономика', 'предприятие', 'инвестиции', 'молодежь', 'волонтер', 'студент', 'учитель',
+    'врач', 'поликлиника', 'детский', 'сад', 'библиотека', 'музей', 'театр', 'парк', 'благоустройство',
+    'водоснабжение', 'очистные', 'сооружения', 'мост', 'автобус', 'электричка', 'аэропорт', 'порт',
+    'газификация', 'интернет', 'связь', 'платформа', 'госуслуги', 'технопарк', 'лаборатория',
+    'грант', 'конкурс', 'фестиваль', 'выставка', 'форум', 'соглашение', 'губернатор', 'мэр',
+    'депутат', 'совещание', 'проверка', 'контракт', 'подрядчик', 'смета', 'капитальный', 'модернизация',
+    'реконструкция', 'ввод', 'эксплуатация', 'открытие', 'запуск', 'завершение', 'этап', 'график',
+    'ипотека', 'многодетный', 'пенсионер', 'занятость', 'безработица', 'производительность', 'экспорт',
+    'агропромышленный', 'фермер', 'урожай', 'лес', 'заповедник', 'мусор', 'полигон', 'переработка',
+]
+RESPONSIBLE_BODIES = ['Минтруд России', 'Минздрав России', 'Минпросвещения России', 'Минстрой России',
+                      'Минприроды России', 'Минцифры России', 'Минтранс России', 'Минкультуры России']
+
+# (название, запрос, фильтры, sort)
+CASES = [
+    ("Частое слово", "регион", {}, 'relevance'),
+    ("Частое слово, сначала новые", "регион", {}, 'date'),
+    ("Два слова", "ремонт школа", {}, 'relevance'),
+    ("Фраза", '"капитальный ремонт"', {}, 'relevance'),
+    ("Редкое слово", "заповедник", {}, 'relevance'),
+    ("Исключение", "больница -поликлиника", {}, 'relevance'),
+    ("Частое слово в проекте", "развитие", {'project_id': 3}, 'relevance'),
+    ("Проект с новостями без региона", "регион", {'project_id': 1}, 'date'),
+    ("Проект, регион и период", "строительство",
+     {'project_id': 3, 'region_id': 7, 'date_from': datetime.date(2022, 1, 1),
+      'date_to': datetime.date(2023, 12, 31)}, 'relevance'),
+]
+
+
+async def fill_corpus(conn, size: int):
+    await conn.execute("CREATE TEMP TABLE project_activities (LIKE public.project_activities INCLUDING ALL)")
+    for start in range(1, size + 1, INSERT_BATCH):
+        stop = min(start + INSERT_BATCH - 1, size)
+        # Индекс слова -- floor(n * random()^3): первые слова словаря частые, последние редкие.
+        # Условие g > 0 во вложенных запросах делает их коррелированными -- свои слова у каждой строки
+        await conn.execute(
+            """
+            INSERT INTO project_activities (id, project_id, region_id, title, activity_date, link,
+                                            responsible_body, text, importance)
+            SELECT g, 1 + g % 20, CASE WHEN g % 10 = 0 THEN NULL ELSE 1 + g % 89 END,
+                   (SELECT string_agg($1::text[][1 + floor(cardinality($1::text[]) * random() ^ 3)::int], ' ')
+                    FROM generate_series(1, 8) WHERE g > 0),
+                   DATE '2019-01-01' + g % 2200,
+                   'https://example.ru/news/' || g,
+                   $2::text[][1 + g % cardinality($2::text[])],
+                   (SELECT string_agg($1::text[][1 + floor(cardinality($1::text[]) * random() ^ 3)::int], ' ')
+                    FROM generate_series(1, 150) WHERE g > 0),
+                   g % 11
+            FROM generate_series($3::int, $4::int) g
+            """,
+            VOCABULARY, RESPONSIBLE_BODIES, start, stop
+        )
+        print(f"  записано {stop} из {size}", flush=True)
+    await conn.execute("ANALYZE project_activities")
+
+
+async def measure(conn, query: str, filters: dict, sort: str):
+    durations = []
+    response = None
+    for _ in range(SAMPLES):
+        started = time.perf_counter()
+        rows, has_more = await search_activities(conn, query, sort=sort, **filters)
+        durations.append((time.perf_counter() - started) * 1000)
+        # Как в load_activity_search: страница должна проходить валидацию ответа
+        response = ActivitySearchResponse(items=rows, has_more=has_more)
+    durations.sort()
+    without_region = sum(1 for hit in response.items if hit.region_id is None)
+    return statistics.median(durations), durations[int(len(durations) * 0.95) - 1], len(response.items), without_region
+
+
+async def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_SIZE
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        print(f"Заполнение временного корпуса ({size} новостей)...")
+        started = time.perf_counter()
+        await fill_corpus(conn, size)
+        print(f"Корпус готов за {time.perf_counter() - started:.1f} с\n")
+
+        rows = []
+        worst_p95 = 0.0
+        for title, query, filters, sort in CASES:
+            p50, p95, found, without_region = await measure(conn, query, filters, sort)
+            worst_p95 = max(worst_p95, p95)
+            rows.append([title, query, sort, found, without_region, f"{p50:.1f}", f"{p95:.1f}"])
+        print(tabulate(rows, headers=["Случай", "Запрос", "Порядок", "На странице", "Без региона",
+                                      "p50, мс", "p95, мс"], tablefmt="psql"))
+        status = "OK" if worst_p95 <= TARGET_P95_MS else "ВНИМАНИЕ"
+        print(f"\n[{status}] худший p95: {worst_p95:.1f} мс, цель -- не более {TARGET_P95_MS:.0f} мс")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
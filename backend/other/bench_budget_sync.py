@@ -0,0 +1,99 @@
+# bench_budget_sync.py
+#
+# Сравнивает прежнюю построчную запись бюджетов (fetchrow ... ON CONFLICT на каждую запись)
+# и set-based upsert пачками через unnest (upsert_budget_records).
+# Пишет во временную копию project_budgets, поэтому реальные данные не затрагиваются.
+# Запуск из каталога backend: python -m other.bench_budget_sync
+
+import asyncio
+import random
+import time
+from datetime import date
+
+import asyncpg
+from tabulate import tabulate
+
+from app.core.database import settings
+from app.services.db_manager import upsert_budget_records
+
+RECORD_COUNTS = [1_000, 10_000, 50_000]
+REGIONS = 89
+PROJECTS = 20
+
+
+def make_records(count: int, seed: int) -> list[tuple]:
+    """Синтетическая выгрузка iminfin: регионы x проекты x даты актуальности."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        region_id = i % REGIONS + 1
+        project_id = i // REGIONS % PROJECTS + 1
+        month_index = i // (REGIONS * PROJECTS)
+        relevance_date = date(2020 + month_index // 12, month_index % 12 + 1, 1)
+        allocated = round(rng.uniform(1e6, 1e9), 2)
+        executed = round(allocated * rng.random(), 2)
+        records.append((region_id, project_id, relevance_date, allocated, executed,
+                        round(executed / allocated * 100, 2)))
+    return records
+
+
+async def legacy_upsert(conn, records: list[tuple], table: str):
+    """Прежний способ: один fetchrow на запись."""
+    added_count = updated_count = 0
+    for record in records:
+        result = await conn.fetchrow(
+            f"""
+            INSERT INTO {table} (
+                region_id, project_id, relevance_date,
+                amount_allocated, amount_executed, execution_percentage
+            ) VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (region_id, project_id, relevance_date)
+            DO UPDATE SET
+                amount_allocated = EXCLUDED.amount_allocated,
+                amount_executed = EXCLUDED.amount_executed,
+                execution_percentage = EXCLUDED.execution_percentage
+            RETURNING (xmax = 0) AS inserted
+            """,
+            *record
+        )
+        if result['inserted']:
+            added_count += 1
+        else:
+            updated_count += 1
+    return added_count, updated_count
+
+
+async def time_writer(conn, writer, records) -> tuple:
+    started = time.perf_counter()
+    async with conn.transaction():
+        counts = await writer(conn, records, 'bench_project_budgets')
+    return time.perf_counter() - started, counts
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        rows = []
+        for count in RECORD_COUNTS:
+            for writer in (legacy_upsert, upsert_budget_records):
+                # Временная копия таблицы с тем же уникальным ключом, но без внешних ключей
+                await conn.execute("DROP TABLE IF EXISTS bench_project_budgets")
+                await conn.execute(
+                    "CREATE TEMP TABLE bench_project_budgets (LIKE project_budgets INCLUDING ALL)")
+
+                insert_time, inserted = await time_writer(conn, writer, make_records(count, seed=1))
+                update_time, updated = await time_writer(conn, writer, make_records(count, seed=2))
+                rows.append([count, writer.__name__, f"{insert_time:.3f}", f"{update_time:.3f}",
+                             f"{inserted[0]}/{updated[1]}"])
+
+        print(tabulate(rows, headers=['Записей', 'Способ', 'Вставка, с', 'Обновление, с',
+                                      'Добавлено/обновлено'], tablefmt='psql'))
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+# bench_extract_grid_config.py
+#
+# Проверяет extract_grid_config на корпусе сохраненных страниц (other/fixtures/fgrid)
+# и сравнивает скорость с прежней версией на регулярных выражениях.
+# Для каждой страницы <имя>.html рядом лежит <имя>.expected.json с ожидаемой конфигурацией.
+# Запуск из каталога backend: python -m other.bench_extract_grid_config
+
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.services.parser import extract_grid_config
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "fgrid"
+
+
+def legacy_extract_grid_config(html_content: str) -> Optional[Dict[str, Any]]:
+    """Прежняя версия: нежадный поиск по всей странице и четыре регулярные замены перед json.loads."""
+    match = re.search(r"new FGrid\((.*?)\);", html_content, re.DOTALL)
+    if not match:
+        return None
+
+    config_str = match.group(1).strip()
+    try:
+        config_str = re.sub(r"block\s*:\s*\$\('#grid'\),?", "", config_str)
+        config_str = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', config_str)
+        config_str = config_str.replace("'", '"')
+        config_str = re.sub(r',\s*([}\]])', r'\1', config_str)
+        return json.loads(config_str)
+    except json.JSONDecodeError:
+        return None
+
+
+def make_large_page(regions: int = 20_000, padding_scripts: int = 4_000) -> str:
+    """Страница в несколько мегабайт: много стороннего JS до таблицы и большой справочник регионов."""
+    padding = "\n".join(
+        f"<script>var widget{i} = {{name: 'Виджет {i}', items: [{i}, {i + 1}], run: function () {{ return {i}; }}}};</script>"
+        for i in range(padding_scripts)
+    )
+    values = ",\n".join(
+        f"                        '{i}': {{title: 'Муниципальное образование №{i}', order: {i}, checked: true}}"
+        for i in range(regions)
+    )
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>
+{padding}
+<script>
+    var grid = new FGrid({{
+        block: $('#grid'),
+        id: 31074,
+        title: 'Синтетический показатель',
+        filters: {{
+            '57831': {{
+                title: 'Территория',
+                values: {{
+{values}
+                }}
+            }},
+        }},
+    }});
+</script>
+</body></html>"""
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    print("--- Корпус страниц ---")
+    for page_path in sorted(FIXTURES_DIR.glob("*.html")):
+        html_content = page_path.read_text(encoding="utf-8")
+        expected = json.loads(page_path.with_suffix(".expected.json").read_text(encoding="utf-8"))
+
+        new_result = extract_grid_config(html_content)
+        legacy_result = legacy_extract_grid_config(html_content)
+        status = "OK" if new_result == expected else "ОШИБКА"
+        legacy_status = "совпадает" if legacy_result == expected else "не справляется"
+        print(f"  {page_path.name:32} новая версия: {status:7} прежняя: {legacy_status}")
+
+    print("\n--- Большая страница ---")
+    large_page = make_large_page()
+    print(f"  Размер страницы: {len(large_page) / 1024 / 1024:.1f} МБ")
+    assert extract_grid_config(large_page) == legacy_extract_grid_config(large_page)
+
+    legacy_time = best_of(lambda: legacy_extract_grid_config(large_page))
+    new_time = best_of(lambda: extract_grid_config(large_page))
+    print(f"  Прежняя версия: {legacy_time * 1000:8.1f} мс")
+    print(f"  Новая версия:   {new_time * 1000:8.1f} мс")
+    print(f"  Ускорение: x{legacy_time / new_time:.1f}")
@@ -0,0 +1,144 @@
+# bench_get_final_data.py
+#
+# Замеряет задержку GET /api/data до и после перевода на параллельные запросы (load_project_details, без кэша ответов).
+# Прежняя версия (восемь последовательных запросов на одном соединении и коррелированный AVG
+# на каждую строку индикаторов) сохранена ниже для сравнения.
+# Комбинации регион/цель/проект берутся из текущей БД, поэтому результаты отражают реальные объемы данных.
+# Замер идет дважды: запросы по одному и CONCURRENT_CLIENTS одновременных клиентов -- во втором случае
+# видно, хватает ли соединений пула (settings.db_pool_max_size) параллельным промахам кэша.
+# Запуск из каталога backend: python -m other.bench_get_final_data
+
+import asyncio
+import random
+import statistics
+import time
+
+from tabulate import tabulate
+
+from app.core.database import connect_to_db, close_db_connection, get_db_pool, settings
+from app.api.endpoints import load_project_details
+from app.services.dictionary_cache import dictionary_cache
+
+YEAR = 2024
+SAMPLES = 200
+CONCURRENT_CLIENTS = 8
+
+
+async def legacy_get_final_data(region_id: int, goal_id: int, project_id: int, year: int):
+    """Прежняя версия: все разделы по очереди на одном соединении (без сборки моделей ответа)."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.fetchrow("SELECT name FROM national_projects WHERE id = $1", project_id)
+        rf_region_record = await conn.fetchrow("SELECT id, name FROM regions WHERE name ILIKE 'Российская Федерация'")
+        budget_query = """
+            SELECT SUM(amount_allocated) as allocated, SUM(amount_executed) as executed
+            FROM project_budgets
+            WHERE project_id = $1 AND region_id = $2 AND EXTRACT(YEAR FROM relevance_date) = $3
+        """
+        if rf_region_record:
+            await conn.fetchrow(budget_query, project_id, rf_region_record['id'], year)
+        if not rf_region_record or region_id != rf_region_record['id']:
+            await conn.fetchrow("SELECT name FROM regions WHERE id = $1", region_id)
+            await conn.fetchrow(budget_query, project_id, region_id, year)
+
+        if rf_region_record and region_id == rf_region_record['id']:
+            await conn.fetch("""
+                SELECT title, activity_date, link, responsible_body, text, importance
+                FROM project_activities WHERE project_id = $1
+                ORDER BY activity_date DESC NULLS LAST""", project_id)
+        else:
+            await conn.fetch("""
+                SELECT title, activity_date, link, responsible_body, text, importance
+                FROM project_activities WHERE project_id = $1 AND region_id = $2
+                ORDER BY activity_date DESC NULLS LAST""", project_id, region_id)
+
+        await conn.fetch("SELECT name, unit FROM project_parameters WHERE project_id = $1 ORDER BY id", project_id)
+        await conn.fetch("""
+            SELECT
+                gm.id AS metric_id, gm.name AS metric_name, i.id AS indicator_id, i.name AS indicator_name,
+                i.unit, i.desired_direction, iv.yearly_value AS region_value, irv.reference_value AS target_value,
+                (SELECT AVG(iv_rf.yearly_value) FROM indicator_yearly_values iv_rf
+                 WHERE iv_rf.indicator_id = i.id AND iv_rf.year = $3) AS rf_value
+            FROM indicators i
+            JOIN goal_metrics gm ON i.metric_id = gm.id
+            JOIN indicator_to_project_mapping itpm ON i.id = itpm.indicator_id
+            LEFT JOIN indicator_yearly_values iv ON i.id = iv.indicator_id AND iv.region_id = $1 AND iv.year = $3
+            LEFT JOIN indicator_reference_values irv ON i.id = irv.indicator_id AND irv.year = $3
+            WHERE gm.goal_id = $2 AND itpm.project_id = $4
+            ORDER BY gm.id, i.id""", region_id, goal_id, year, project_id)
+
+
+async def load_request_params() -> list[tuple]:
+    """Случайные комбинации (регион, цель, проект), для которых в БД есть связь цели и проекта."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        pairs = await conn.fetch("SELECT goal_id, project_id FROM project_to_goal_mapping")
+        region_ids = [r['id'] for r in await conn.fetch("SELECT id FROM regions")]
+    rng = random.Random(42)
+    return [(rng.choice(region_ids), pair['goal_id'], pair['project_id'])
+            for pair in rng.choices(pairs, k=SAMPLES)]
+
+
+async def measure(func, params: list[tuple]) -> list[float]:
+    timings = []
+    for region_id, goal_id, project_id in params:
+        started = time.perf_counter()
+        await func(region_id=region_id, goal_id=goal_id, project_id=project_id, year=YEAR)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def measure_concurrent(func, params: list[tuple], clients: int) -> list[float]:
+    """Те же запросы, но их одновременно отправляют clients клиентов."""
+    queue = list(params)
+    timings = []
+
+    async def client():
+        while queue:
+            region_id, goal_id, project_id = queue.pop()
+            started = time.perf_counter()
+            await func(region_id=region_id, goal_id=goal_id, project_id=project_id, year=YEAR)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return timings
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1]
+
+
+async def main():
+    await connect_to_db()
+    if not await get_db_pool():
+        return
+    try:
+        await dictionary_cache.load()
+        params = await load_request_params()
+        if not params:
+            print("В БД нет связей целей и проектов -- замерять нечего.")
+            return
+
+        # Прогрев: планы запросов и соединения пула
+        await measure(legacy_get_final_data, params[:10])
+        await measure(load_project_details, params[:10])
+
+        rows = []
+        for clients in (1, CONCURRENT_CLIENTS):
+            for name, func in (("Прежняя (последовательно)", legacy_get_final_data),
+                               ("Новая (параллельно)", load_project_details)):
+                if clients == 1:
+                    timings = await measure(func, params)
+                else:
+                    timings = await measure_concurrent(func, params, clients)
+                rows.append([name, clients, f"{statistics.median(timings):.1f}", f"{percentile(timings, 95):.1f}",
+                             f"{percentile(timings, 99):.1f}"])
+
+        print(f"Запросов: {len(params)}, год: {YEAR}, соединений в пуле: до {settings.db_pool_max_size}")
+        print(tabulate(rows, headers=['Версия', 'Клиентов', 'p50, мс', 'p95, мс', 'p99, мс'], tablefmt='psql'))
+    finally:
+        await close_db_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+# bench_process_api_response.py
+#
+# Сравнивает векторизованный process_api_response с прежней построчной версией
+# и проверяет, что обе возвращают одинаковые данные.
+# По умолчанию использует синтетический ответ dataGrid размером с месячный индикатор по всем регионам;
+# можно передать путь к сохраненному ответу: JSON вида {"config": {...}, "api_data": {...}}.
+# Запуск из каталога backend: python -m other.bench_process_api_response [путь_к_json]
+
+import json
+import random
+import sys
+import time
+from typing import Dict, Any, Tuple
+
+import pandas as pd
+
+from app.services.parser import process_api_response, find_filter_id_by_title
+
+MONTHS = ['январь', 'февраль', 'март', 'апрель', 'май', 'июнь',
+          'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь']
+
+
+def legacy_process_api_response(api_data: Dict[str, Any], config: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Построчная версия process_api_response до векторизации (для сравнения)."""
+    region_filter_id = find_filter_id_by_title(config, ["территори", "окато", "оксм"])
+    period_filter_id = find_filter_id_by_title(config, ["период"])
+
+    if not region_filter_id: return pd.DataFrame(), pd.DataFrame()
+
+    try:
+        period_map = {}
+        if period_filter_id:
+            period_map = {k: v['title'].strip() for k, v in config['filters'][period_filter_id]['values'].items()}
+        region_dim_key = f"dim{region_filter_id}"
+    except KeyError as e:
+        print(f"Ошибка в структуре конфигурации: {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+    all_rows = []
+    for result_row in api_data.get("results", []):
+        region_name = result_row.get(region_dim_key)
+        if not region_name: continue
+
+        for key, value in result_row.items():
+            if not key.startswith("dim"): continue
+
+            parts = key[3:].split('_')
+            year, period_name = None, None
+
+            # --- НАЧАЛО УНИВЕРСАЛЬНОЙ ЛОГИКИ ---
+            # Сценарий 1: ключ = dim<ГОД> (например, для 40466)
+            if len(parts) == 1 and parts[0].isdigit():
+                year, period_name = int(parts[0]), "значение показателя за год"
+
+            elif len(parts) > 1:
+                # Сценарий 2: ключ = dim<ГОД>_<ID_ПЕРИОДА>... (для 62083)
+                if parts[0].isdigit() and len(parts[0]) == 4 and parts[1] in period_map:
+                    year, period_name = int(parts[0]), period_map.get(parts[1])
+                # Сценарий 3: ключ = dim<ID_ПЕРИОДА>_<ГОД>... (для 59263)
+                elif parts[1].isdigit() and len(parts[1]) == 4 and parts[0] in period_map:
+                    year, period_name = int(parts[1]), period_map.get(parts[0])
+            # --- КОНЕЦ УНИВЕРСАЛЬНОЙ ЛОГИКИ ---
+
+            if year and period_name:
+                all_rows.append({
+                    "region_name": region_name, "year": year,
+                    "period_name": period_name,
+                    "measured_value": str(value).replace(',', '.') if value is not None else None
+                })
+
+    if not all_rows: return pd.DataFrame(), pd.DataFrame()
+
+    df = pd.DataFrame(all_rows)
+    df = df[pd.to_numeric(df['measured_value'], errors='coerce').notna()]
+    df['measured_value'] = pd.to_numeric(df['measured_value'])
+
+    yearly_df = df[df['period_name'].str.contains('значение показателя за год', case=False, na=False)].copy()
+    yearly_df.drop_duplicates(subset=['region_name', 'year'], keep='first', inplace=True)
+    yearly_df.rename(columns={'measured_value': 'yearly_value'}, inplace=True)
+
+    def get_month_from_period(p_name):
+        p_lower = p_name.lower()
+        if 'декабрь' in p_lower: return 12
+        if 'ноябрь' in p_lower: return 11
+        if 'октябрь' in p_lower: return 10
+        if 'сентябрь' in p_lower: return 9
+        if 'август' in p_lower: return 8
+        if 'июль' in p_lower: return 7
+        if 'июнь' in p_lower: return 6
+        if 'май' in p_lower: return 5
+        if 'апрель' in p_lower: return 4
+        if 'март' in p_lower: return 3
+        if 'февраль' in p_lower: return 2
+        if 'январь' in p_lower: return 1
+        return None
+
+    df['month'] = df['period_name'].apply(get_month_from_period)
+    monthly_df = df.dropna(subset=['month']).copy()
+
+    if not monthly_df.empty:
+        monthly_df['month'] = monthly_df['month'].astype(int)
+        monthly_df.drop_duplicates(subset=['region_name', 'year', 'month'], keep='first', inplace=True)
+        monthly_df['value_date'] = pd.to_datetime({'year': monthly_df['year'], 'month': monthly_df['month'], 'day': 1},
+                                                  errors='coerce')
+        monthly_df.dropna(subset=['value_date'], inplace=True)
+        return monthly_df[['region_name', 'value_date', 'measured_value']], yearly_df[
+            ['region_name', 'year', 'yearly_value']]
+
+    return pd.DataFrame(), yearly_df[['region_name', 'year', 'yearly_value']]
+
+
+def make_synthetic_response(regions: int = 95, years: range = range(2010, 2025)) -> Tuple[Dict, Dict]:
+    """Ответ со структурой dim<ГОД>_<ID_ПЕРИОДА>: 12 месяцев + годовое значение для каждого региона."""
+    rng = random.Random(42)
+    period_values = {str(100 + m): {'title': f' {name} '} for m, name in enumerate(MONTHS)}
+    period_values['200'] = {'title': 'значение показателя за год'}
+    config = {
+        'title': 'Синтетический индикатор',
+        'filters': {
+            '57831': {'title': 'Территория', 'values': {str(r): {'title': f'Регион {r}'} for r in range(regions)}},
+            '33560': {'title': 'Период', 'values': period_values},
+            '3': {'title': 'Год', 'values': {str(y): {'title': str(y)} for y in years}},
+        },
+    }
+    results = []
+    for r in range(regions):
+        row = {'dim57831': f'Регион {r}'}
+        for year in years:
+            for period_id in period_values:
+                value = rng.uniform(0, 1000)
+                # Часть значений приходит строкой с запятой или отсутствует -- как в реальных ответах
+                if rng.random() < 0.1:
+                    value = f"{value:.2f}".replace('.', ',')
+                elif rng.random() < 0.05:
+                    value = None
+                row[f'dim{year}_{period_id}'] = value
+        results.append(row)
+    return config, {'results': results}
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def assert_same(new: pd.DataFrame, old: pd.DataFrame, name: str):
+    pd.testing.assert_frame_equal(new.reset_index(drop=True), old.reset_index(drop=True), check_dtype=False)
+    print(f"  {name}: {len(new)} строк, результаты совпадают")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            recorded = json.load(f)
+        config, api_data = recorded['config'], recorded['api_data']
+    else:
+        config, api_data = make_synthetic_response()
+
+    print(f"Строк в ответе: {len(api_data['results'])}, "
+          f"колонок в строке: {len(api_data['results'][0]) if api_data['results'] else 0}")
+
+    new_monthly, new_yearly = process_api_response(api_data, config)
+    old_monthly, old_yearly = legacy_process_api_response(api_data, config)
+    assert_same(new_monthly, old_monthly, 'месячные')
+    assert_same(new_yearly, old_yearly, 'годовые')
+
+    legacy_time = best_of(lambda: legacy_process_api_response(api_data, config))
+    vectorized_time = best_of(lambda: process_api_response(api_data, config))
+    print(f"Построчная версия:     {legacy_time * 1000:8.1f} мс")
+    print(f"Векторизованная версия: {vectorized_time * 1000:8.1f} мс")
+    print(f"Ускорение: x{legacy_time / vectorized_time:.1f}")
@@ -0,0 +1,158 @@
+# bench_serialization.py
+#
+# Замеряет стоимость сборки и сериализации ответов читающих эндпоинтов (без БД, на синтетических данных
+# реалистичного объема): прежний путь -- Decimal из asyncpg, Pydantic-модель на каждую строку,
+# jsonable_encoder и json.dumps -- против текущего: float из кодека NUMERIC, словари и render_json (pydantic-core).
+# Запуск из каталога backend: python -m other.bench_serialization
+
+import datetime
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from tabulate import tabulate
+
+from app.core.cache import render_json
+from typing import List
+
+from app.models.models import (
+    IndicatorHistory, TimeSeriesDataPoint, ReferenceDataPoint, ProjectDetails, ProjectActivity, ActivitySummary,
+    MetricData, IndicatorData, BudgetItem, ProjectParameter
+)
+
+SAMPLES = 30
+random.seed(1)
+
+
+class LegacyProjectDetails(ProjectDetails):
+    """Прежняя форма /api/data: все мероприятия проекта вместе с полными текстами."""
+    activities: List[ProjectActivity]
+
+
+def legacy_render(content) -> bytes:
+    """Прежняя сериализация cached_json_response."""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def make_history_rows(numeric):
+    yearly = [{'date': str(year), 'value': numeric(round(random.uniform(0, 1000), 4))} for year in range(2000, 2025)]
+    monthly = [{'date': f"{year}-{month:02d}-01", 'value': numeric(round(random.uniform(0, 1000), 4))}
+               for year in range(2000, 2025) for month in range(1, 13)]
+    reference = [{'date': str(year), 'value': f"не менее {year - 1990}"} for year in range(2021, 2031)]
+    return yearly, monthly, reference
+
+
+def history_legacy():
+    yearly, monthly, reference = make_history_rows(lambda v: Decimal(str(v)))
+    return legacy_render(IndicatorHistory(
+        yearly_data=[TimeSeriesDataPoint(**rec) for rec in yearly],
+        monthly_data=[TimeSeriesDataPoint(**rec) for rec in monthly],
+        reference_data=[ReferenceDataPoint(**rec) for rec in reference]
+    ))
+
+
+def history_current():
+    yearly, monthly, reference = make_history_rows(float)
+    return render_json({'yearly_data': yearly, 'monthly_data': monthly, 'reference_data': reference})
+
+
+def make_details(numeric, legacy: bool) -> ProjectDetails:
+    if legacy:
+        activities = [
+            ProjectActivity(title=f"Мероприятие {i}",
+                            activity_date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365),
+                            link=f"https://example.ru/news/{i}", responsible_body="Минтруд России",
+                            text="Текст новости. " * 100, importance=i % 5)
+            for i in range(500)
+        ]
+    else:
+        # Первая страница без текстов; остальное -- через /api/projects/{id}/activities
+        activities = [
+            ActivitySummary(id=i, title=f"Мероприятие {i}",
+                            activity_date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365),
+                            link=f"https://example.ru/news/{i}", responsible_body="Минтруд России",
+                            importance=i % 5)
+            for i in range(20)
+        ]
+    metrics = [
+        MetricData(name=f"Показатель {m}", indicators=[
+            IndicatorData(id=m * 10 + i, name=f"Индикатор {m}.{i}", unit="%",
+                          region_value=numeric(round(random.uniform(0, 100), 4)),
+                          rf_value=numeric(round(random.uniform(0, 100), 4)), target_value="не менее 50",
+                          is_reversed=False)
+            for i in range(5)
+        ])
+        for m in range(6)
+    ]
+    model = LegacyProjectDetails if legacy else ProjectDetails
+    return model(
+        name="Национальный проект",
+        budget=[BudgetItem(name="Российская Федерация", allocated=numeric(1.5e12), executed=numeric(9.1e11))],
+        metrics=metrics, activities=activities, activities_next_cursor=None if legacy else "2024-01-20_19",
+        parameters=[ProjectParameter(name=f"Параметр {i}", unit="ед.") for i in range(10)]
+    )
+
+
+def details_legacy():
+    return legacy_render(make_details(lambda v: Decimal(str(v)), legacy=True))
+
+
+def details_current():
+    return render_json(make_details(float, legacy=False))
+
+
+def make_batch_columns():
+    points = [(indicator_id, region_id, year, round(random.uniform(0, 1000), 4))
+              for indicator_id in range(20) for region_id in range(89) for year in range(2015, 2025)]
+    return [list(column) for column in zip(*points)]
+
+
+def batch_per_point_legacy():
+    """Тот же объем, что у пакетной истории, но по точке-объекту, как отдавала бы история по одному индикатору."""
+    indicator_ids, region_ids, years, values = make_batch_columns()
+    return legacy_render([
+        {'indicator_id': i, 'region_id': r, 'data': TimeSeriesDataPoint(date=str(y), value=Decimal(str(v)))}
+        for i, r, y, v in zip(indicator_ids, region_ids, years, values)
+    ])
+
+
+def batch_columnar_current():
+    indicator_ids, region_ids, years, values = make_batch_columns()
+    return render_json({'yearly': {'indicator_id': indicator_ids, 'region_id': region_ids,
+                                   'year': years, 'value': values}})
+
+
+CASES = [
+    ("/api/indicator/{id}/history (25 лет, 300 месяцев)", history_legacy, history_current),
+    ("/api/data (500 мероприятий с текстом -> первая страница, 30 индикаторов)", details_legacy, details_current),
+    ("История 20 индикаторов x 89 регионов x 10 лет", batch_per_point_legacy, batch_columnar_current),
+]
+
+
+def measure(func):
+    durations = []
+    size = 0
+    for _ in range(SAMPLES):
+        started = time.perf_counter()
+        size = len(func())
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations), size
+
+
+def main():
+    rows = []
+    for title, legacy, current in CASES:
+        legacy_ms, legacy_size = measure(legacy)
+        current_ms, current_size = measure(current)
+        rows.append([title, f"{legacy_ms:.2f}", f"{current_ms:.2f}", f"{legacy_ms / current_ms:.1f}x",
+                     f"{legacy_size // 1024} / {current_size // 1024}"])
+    print(tabulate(rows, headers=["Эндпоинт", "Прежний путь, мс", "Текущий, мс", "Ускорение", "Размер, КБ"],
+                   tablefmt="psql"))
+
+
+if __name__ == "__main__":
+    main()
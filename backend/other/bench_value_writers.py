@@ -0,0 +1,71 @@
+# bench_value_writers.py
+#
+# Сравнивает два способа записи значений индикаторов:
+# построчный executemany ... ON CONFLICT и COPY во временную таблицу + один set-based upsert.
+# Пишет во временные копии таблиц значений, поэтому реальные данные не затрагиваются.
+# Запуск из каталога backend: python -m other.bench_value_writers
+
+import asyncio
+import random
+import time
+from datetime import date
+
+import asyncpg
+from tabulate import tabulate
+
+from app.core.database import settings
+from app.services.db_manager import (
+    MONTHLY_VALUES_TABLE, write_values_executemany, write_values_copy
+)
+
+ROW_COUNTS = [500, 5_000, 50_000]
+REGIONS = 95
+
+
+def make_records(count: int, seed: int) -> list[tuple]:
+    """Синтетические месячные значения: регионы x месяцы, как у всероссийского месячного индикатора."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        region_id = i % REGIONS + 1
+        month_index = i // REGIONS
+        value_date = date(2000 + month_index // 12, month_index % 12 + 1, 1)
+        records.append((1, region_id, value_date, round(rng.uniform(0, 1000), 4)))
+    return records
+
+
+async def time_writer(conn, writer, spec, records) -> float:
+    started = time.perf_counter()
+    async with conn.transaction():
+        await writer(conn, spec, records)
+    return time.perf_counter() - started
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        rows = []
+        for count in ROW_COUNTS:
+            for writer in (write_values_executemany, write_values_copy):
+                # Временная копия таблицы с тем же уникальным ключом, но без внешних ключей
+                await conn.execute("DROP TABLE IF EXISTS bench_monthly_values")
+                await conn.execute(
+                    "CREATE TEMP TABLE bench_monthly_values (LIKE indicator_monthly_values INCLUDING ALL)")
+                spec = dict(MONTHLY_VALUES_TABLE, table='bench_monthly_values')
+
+                insert_time = await time_writer(conn, writer, spec, make_records(count, seed=1))
+                update_time = await time_writer(conn, writer, spec, make_records(count, seed=2))
+                rows.append([count, writer.__name__, f"{insert_time:.3f}", f"{update_time:.3f}",
+                             f"{count / update_time:,.0f}"])
+
+        print(tabulate(rows, headers=['Строк', 'Способ', 'Вставка, с', 'Обновление, с', 'Строк/с (обновл.)'],
+                       tablefmt='psql'))
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
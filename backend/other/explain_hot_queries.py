@@ -0,0 +1,111 @@
+# explain_hot_queries.py
+#
+# Печатает планы (EXPLAIN ANALYZE) горячих запросов читающих эндпоинтов
+# и проверяет, что они обслуживаются индексами из миграций app/core/migrations.py.
+# Параметры запросов берутся из текущей БД. Перед замерами выполняется VACUUM ANALYZE:
+# index-only scan возможен только для страниц, отмеченных в карте видимости.
+# Запуск из каталога backend: python -m other.explain_hot_queries
+
+import asyncio
+
+import asyncpg
+
+from app.core.database import settings
+
+YEAR = 2024
+
+# (название, запрос, имена параметров $1..$n, ожидаемый узел плана)
+HOT_QUERIES = [
+    ("Сумма бюджета за год (/api/data, проекция бюджетов)", """
+        SELECT SUM(amount_allocated), SUM(amount_executed)
+        FROM project_budgets
+        WHERE project_id = $1 AND region_id = $2
+          AND relevance_date >= make_date($3, 1, 1) AND relevance_date < make_date($3 + 1, 1, 1)
+    """, ('project_id', 'region_id', 'year'), "Index Only Scan"),
+    ("История бюджета (/api/budgets/history)", """
+        SELECT relevance_date, amount_allocated, amount_executed
+        FROM project_budgets
+        WHERE project_id = $1 AND region_id = $2
+          AND relevance_date >= make_date($3, 1, 1) AND relevance_date < make_date($3 + 1, 1, 1)
+        ORDER BY relevance_date
+    """, ('project_id', 'region_id', 'year'), "Index Only Scan"),
+    ("Страница мероприятий проекта в регионе (/api/projects/{id}/activities)", """
+        SELECT id, title, activity_date, link, responsible_body, importance
+        FROM project_activities
+        WHERE project_id = $1 AND region_id = $2 AND activity_date IS NOT NULL
+          AND (activity_date, id) < (make_date($3, 12, 31), 2147483647)
+        ORDER BY activity_date DESC NULLS LAST, id DESC
+        LIMIT 21
+    """, ('project_id', 'region_id', 'year'), "Index Scan"),
+    ("Полнотекстовый поиск совпадений (/api/activities/search)", """
+        SELECT a.id, a.activity_date
+        FROM project_activities a
+        WHERE a.search_vector @@ websearch_to_tsquery('russian', 'развитие проекта')
+          AND a.project_id = $1
+        ORDER BY a.activity_date DESC NULLS LAST, a.id DESC
+        LIMIT 5000
+    """, ('project_id',), "Bitmap Index Scan on idx_project_activities_search"),
+    ("Годовая история индикатора (/api/indicator/{id}/history)", """
+        SELECT year, yearly_value
+        FROM indicator_yearly_values
+        WHERE indicator_id = $1 AND region_id = $2
+        ORDER BY year
+    """, ('indicator_id', 'region_id'), "Index Only Scan"),
+    ("Месячная история индикатора (/api/indicator/{id}/history)", """
+        SELECT value_date, measured_value
+        FROM indicator_monthly_values
+        WHERE indicator_id = $1 AND region_id = $2
+        ORDER BY value_date
+    """, ('indicator_id', 'region_id'), "Index Only Scan"),
+    ("Строки индикаторов из проекции (/api/data)", """
+        SELECT metric_id, indicator_id, region_value, target_value, rf_value
+        FROM dashboard_indicator_rows
+        WHERE region_id = $1 AND goal_id = $2 AND project_id = $3 AND year = $4
+        ORDER BY metric_id, indicator_id
+    """, ('region_id', 'goal_id', 'project_id', 'year'), "Index Scan"),
+]
+
+
+async def load_params(conn) -> dict:
+    """Проект и регион с наибольшим числом записей бюджета, индикатор с наибольшей историей."""
+    budget = await conn.fetchrow(
+        "SELECT project_id, region_id FROM project_budgets GROUP BY 1, 2 ORDER BY count(*) DESC LIMIT 1")
+    indicator_id = await conn.fetchval(
+        "SELECT indicator_id FROM indicator_monthly_values GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    goal_id = await conn.fetchval(
+        "SELECT goal_id FROM project_to_goal_mapping WHERE project_id = $1 LIMIT 1",
+        budget['project_id'] if budget else None)
+    return {
+        'project_id': budget['project_id'] if budget else 0,
+        'region_id': budget['region_id'] if budget else 0,
+        'year': YEAR,
+        'indicator_id': indicator_id or 0,
+        'goal_id': goal_id or 0,
+    }
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        await conn.execute("VACUUM ANALYZE project_budgets, project_activities, indicator_yearly_values, "
+                           "indicator_monthly_values, dashboard_indicator_rows")
+        params = await load_params(conn)
+        print("Параметры: " + ", ".join(f"{name}={value}" for name, value in params.items()) + "\n")
+
+        for title, query, param_names, expected_node in HOT_QUERIES:
+            plan_rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {query}",
+                                         *[params[name] for name in param_names])
+            plan = "\n".join(row[0] for row in plan_rows)
+            status = "OK" if expected_node in plan and "Seq Scan" not in plan else "ВНИМАНИЕ"
+            print(f"=== {title} [{status}: ожидается {expected_node}] ===")
+            print(plan)
+            print()
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,56 @@
-# /backend/pdf_data_extractor.py (ФИНАЛЬНАЯ РАБОЧАЯ ВЕРСИЯ)
+# pdf_data_extractor.py
+#
+# Загружает эталонные значения индикаторов из PDF с национальными целями в indicator_reference_values.
+#
+# Разбор страницы (extract_text + extract_tables: pdfminer раскладывает символы страницы) -- самая
+# дорогая часть, поэтому страницы разбираются в пуле процессов. Результат разбора страницы кэшируется
+# на диске по хэшу ее содержимого (потоки контента, ресурсы, размеры, поворот) и версии разбора: повторный запуск
+# на исправленном PDF разбирает заново только изменившиеся страницы.
+#
+# Заголовки целей и показателей переходят со страницы на страницу, поэтому строки собираются из
+# результатов страниц строго по порядку -- по мере готовности, не дожидаясь всего файла, -- и порциями
+# уходят через COPY во временную таблицу. В конце одной транзакцией: upsert в indicator_reference_values
+# и пересчет проекции дашборда для затронутых индикаторов.
+# Индикаторы сопоставляются со справочником по нормализованному названию; не найденные печатаются в конце.
+#
+# Запуск из каталога backend:
+#   python -m other.pdf_data_extractor путь/к/файлу.pdf [--workers N] [--cache-dir DIR] [--dry-run]
 
-import pdfplumber
-import pandas as pd
-import re
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import asyncpg
+import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+
+from app.core.database import settings
+from app.services.dashboard_projection import refresh_indicator_rows
 
-# --- НАСТРОЙКИ ---
-PDF_FILE_PATH = "/Users/andrey/Desktop/Наццели 7 шт.pdf"
-OUTPUT_EXCEL_PATH = "наццели_результат.xlsx"
+# Увеличить при изменении разбора страницы (настроек таблиц, допусков текста): старый кэш перестанет совпадать
+EXTRACTION_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pdf_page_cache')
+COPY_BATCH_SIZE = 1000
+
+# Настройки для лучшего распознавания таблиц
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "text",
+    "snap_tolerance": 3,
+}
+
+_GOAL_RE = re.compile(r'^[IVX]+\.\s(.+)')
+_METRIC_RE = re.compile(r'^\d+\.\s(.+)')
+_YEAR_RE = re.compile(r'(\d{4})')
+# Нумерация и префиксы перед названием индикатора, как в populate_db
+_INDICATOR_PREFIX_RE = re.compile(r'^((\d+(\.\d+)*(\.?[а-я])?\.\s*)|(Дополнительный:\s*))')
+_EMPTY_VALUES = {'', '-', '–', '—', 'х', 'x'}
 
 
 def clean_text(text):
@@ -17,122 +60,296 @@ def clean_text(text):
     return ' '.join(text.strip().split())
 
 
-def parse_goals_pdf(file_path: str):
+def normalize_indicator_name(name: str) -> str:
+    return clean_text(_INDICATOR_PREFIX_RE.sub('', clean_text(name))).lower().replace('ё', 'е')
+
+
+# --- Хэши и кэш страниц ---
+
+def _hash_pdf_object(digest, obj, seen: set):
+    """Добавляет в хэш объект PDF со всем, на что он ссылается (словари, массивы, потоки)."""
+    if isinstance(obj, PDFObjRef):
+        # Ссылки на уже учтенный объект (общие шрифты, циклы) хэшируются по номеру
+        digest.update(f"R{obj.objid}".encode())
+        if obj.objid in seen:
+            return
+        seen.add(obj.objid)
+        obj = resolve1(obj)
+    if isinstance(obj, PDFStream):
+        digest.update(b"S")
+        _hash_pdf_object(digest, obj.attrs, seen)
+        digest.update(obj.get_data())
+    elif isinstance(obj, dict):
+        digest.update(b"D")
+        for key in sorted(obj, key=str):
+            digest.update(str(key).encode())
+            _hash_pdf_object(digest, obj[key], seen)
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"A")
+        for item in obj:
+            _hash_pdf_object(digest, item, seen)
+    else:
+        digest.update(repr(obj).encode())
+
+
+def page_content_hash(page) -> str:
     """
-    Основная функция для парсинга PDF-файла с наццелями, показателями и индикаторами.
+    Хэш содержимого страницы: потоки контента, ресурсы (шрифты с ToUnicode, Form XObject с таблицей),
+    размеры и поворот, плюс версия разбора.
     """
-    if not os.path.exists(file_path):
-        print(f"ОШИБКА: Файл не найден по указанному пути: {file_path}")
+    digest = hashlib.sha256(f"{EXTRACTION_VERSION}|{page.width}|{page.height}|{page.rotation}".encode())
+    seen = set()
+    contents = page.page_obj.contents
+    for stream in contents if isinstance(contents, list) else [contents]:
+        # В массиве /Contents элементы -- неразрешенные ссылки на потоки
+        stream = resolve1(stream)
+        if stream is not None:
+            digest.update(stream.get_data())
+    _hash_pdf_object(digest, page.page_obj.resources, seen)
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir: str, page_hash: str) -> str:
+    return os.path.join(cache_dir, f"{page_hash}.json")
+
+
+def load_cached_page(cache_dir: str, page_hash: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_cache_path(cache_dir, page_hash), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
-    all_indicators = []
-    current_goal = "Не определена"
-    current_metric = "Не определен"
 
-    print(f"Начинаем обработку файла: {file_path}")
+def store_cached_page(cache_dir: str, page_hash: str, result: Dict[str, Any]):
+    # Запись через временный файл: прерванный запуск не оставит в кэше обрезанный результат
+    path = _cache_path(cache_dir, page_hash)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# --- Разбор страницы (в процессах пула) ---
+
+_worker_pdf = None
+
+
+def _init_worker(file_path: str):
+    """Каждый процесс пула открывает PDF один раз."""
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(file_path)
+
 
-    # Настройки для лучшего распознавания таблиц
-    table_settings = {
-        "vertical_strategy": "lines",
-        "horizontal_strategy": "text",
-        "snap_tolerance": 3,
+def extract_page(page_index: int) -> Dict[str, Any]:
+    """Строки текста (для заголовков целей и показателей) и таблицы страницы."""
+    page = _worker_pdf.pages[page_index]
+    full_text = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
+    result = {
+        'lines': full_text.split('\n'),
+        'tables': page.extract_tables(TABLE_SETTINGS) or [],
     }
+    # pdfminer держит разобранную раскладку страницы до закрытия файла
+    page.close()
+    return result
 
-    with pdfplumber.open(file_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, 1):
-            print(f"--- Обрабатываем страницу {page_num} из {len(pdf.pages)} ---")
-
-            # Извлекаем текст для поиска заголовков
-            full_text = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
-            lines = full_text.split('\n')
-
-            for line in lines:
-                goal_match = re.match(r'^[IVX]+\.\s(.+)', line)
-                if goal_match and '...' not in line:
-                    current_goal = clean_text(goal_match.group(1))
-                    print(f"  [Найдена Наццель]: {current_goal}")
-                    current_metric = "Не определен"  # Сбрасываем показатель при смене цели
-                    continue
 
-                metric_match = re.match(r'^\d+\.\s(.+)', line)
-                if metric_match and '...' not in line:
-                    current_metric = clean_text(metric_match.group(1))
-                    print(f"    [Найден Показатель]: {current_metric}")
+# --- Сборка строк (последовательно, по порядку страниц) ---
+
+class ReferenceAssembler:
+    """Переносит текущие цель и показатель между страницами и превращает таблицы в строки значений."""
 
-            # Извлекаем таблицы
-            tables = page.extract_tables(table_settings)
-            if not tables:
+    def __init__(self):
+        self.current_goal = "Не определена"
+        self.current_metric = "Не определен"
+
+    def feed(self, page: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for line in page['lines']:
+            goal_match = _GOAL_RE.match(line)
+            if goal_match and '...' not in line:
+                self.current_goal = clean_text(goal_match.group(1))
+                self.current_metric = "Не определен"  # Сбрасываем показатель при смене цели
                 continue
 
-            for table_data in tables:
-                if not table_data or len(table_data) < 2:
-                    continue
+            metric_match = _METRIC_RE.match(line)
+            if metric_match and '...' not in line:
+                self.current_metric = clean_text(metric_match.group(1))
 
-                header = [clean_text(h) for h in table_data[0]]
+        for table_data in page['tables']:
+            yield from self._table_rows(table_data)
 
-                # --- ИСПРАВЛЕНИЕ: Ищем любой из правильных заголовков ---
-                indicator_col_name = next((h for h in header if 'индикатор' in h.lower()), None)
-                unit_col_name = next((h for h in header if 'изм' in h.lower()), None)
+    def _table_rows(self, table_data: List[List[Optional[str]]]) -> Iterator[Dict[str, Any]]:
+        # Горизонтальная стратегия "text" дает пустые строки между строками таблицы
+        table_data = [row for row in table_data if any(clean_text(cell) for cell in row)]
+        if len(table_data) < 2:
+            return
 
-                if not indicator_col_name:
-                    continue
+        header = [clean_text(h) for h in table_data[0]]
+        indicator_col_idx = next((idx for idx, h in enumerate(header) if 'индикатор' in h.lower()), None)
+        if indicator_col_idx is None:
+            return
+        unit_col_idx = next((idx for idx, h in enumerate(header) if 'изм' in h.lower()), None)
+        year_columns = {idx: int(match.group(1)) for idx, col in enumerate(header)
+                        if (match := _YEAR_RE.search(col))}
+        if not year_columns:
+            return
 
-                print(f"      [Найдена валидная таблица] Заголовок индикатора: '{indicator_col_name}'")
+        for row in table_data[1:]:
+            if indicator_col_idx >= len(row):
+                continue
+            indicator_name = clean_text(row[indicator_col_idx])
+            if len(indicator_name) < 5:
+                continue
 
-                year_columns = {idx: int(re.search(r'(\d{4})', col).group(1)) for idx, col in enumerate(header) if
-                                re.search(r'(\d{4})', col)}
-                if not year_columns:
+            unit = clean_text(row[unit_col_idx]) if unit_col_idx is not None and unit_col_idx < len(row) else ''
+            for col_idx, year in year_columns.items():
+                # Значение хранится текстом, как в исходной таблице: "48,5", "не менее 48"
+                value = clean_text(row[col_idx]) if col_idx < len(row) else ''
+                if value in _EMPTY_VALUES:
                     continue
+                yield {
+                    'goal': self.current_goal,
+                    'metric': self.current_metric,
+                    'indicator': indicator_name,
+                    'unit': unit,
+                    'year': year,
+                    'value': value,
+                }
+
+
+# --- Конвейер ---
+
+async def iter_pages(file_path: str, cache_dir: str, workers: int):
+    """Результаты разбора страниц по порядку: из кэша или из пула процессов, по мере готовности."""
+    with pdfplumber.open(file_path) as pdf:
+        page_hashes = [page_content_hash(page) for page in pdf.pages]
 
-                indicator_col_idx = header.index(indicator_col_name)
-                unit_col_idx = header.index(unit_col_name) if unit_col_name else -1
+    cached = {}
+    for index, page_hash in enumerate(page_hashes):
+        result = load_cached_page(cache_dir, page_hash)
+        if result is not None:
+            cached[index] = result
+    missing = [index for index in range(len(page_hashes)) if index not in cached]
+    print(f"Страниц: {len(page_hashes)}, из кэша: {len(cached)}, к разбору: {len(missing)}", flush=True)
 
-                for row in table_data[1:]:
-                    if indicator_col_idx >= len(row): continue
+    if not missing:
+        for index in range(len(page_hashes)):
+            yield cached[index]
+        return
 
-                    indicator_name = clean_text(row[indicator_col_idx])
-                    if not indicator_name or len(indicator_name) < 5: continue
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=min(workers, len(missing)), initializer=_init_worker,
+                             initargs=(file_path,)) as executor:
+        futures = {index: loop.run_in_executor(executor, extract_page, index) for index in missing}
+        for index, page_hash in enumerate(page_hashes):
+            if index in cached:
+                yield cached[index]
+                continue
+            result = await futures[index]
+            store_cached_page(cache_dir, page_hash, result)
+            yield result
+
+
+async def load_indicator_ids(conn) -> Dict[str, int]:
+    records = await conn.fetch("SELECT id, name FROM indicators")
+    return {normalize_indicator_name(r['name']): r['id'] for r in records}
+
+
+async def run(file_path: str, cache_dir: str, workers: int, dry_run: bool):
+    os.makedirs(cache_dir, exist_ok=True)
+    started = time.perf_counter()
+    assembler = ReferenceAssembler()
+
+    if dry_run:
+        rows = 0
+        indicators = set()
+        async for page in iter_pages(file_path, cache_dir, workers):
+            for item in assembler.feed(page):
+                rows += 1
+                indicators.add(item['indicator'])
+        print(f"Найдено значений: {rows}, индикаторов: {len(indicators)} "
+              f"({time.perf_counter() - started:.1f} с). БД не изменялась (--dry-run).")
+        return
 
-                    unit = clean_text(row[unit_col_idx]) if unit_col_idx != -1 and row[unit_col_idx] else ''
-                    for col_idx, year in year_columns.items():
-                        if col_idx < len(row):
-                            ref_val_str = (row[col_idx] or "").replace(',', '.')
-                            try:
-                                ref_val = float(ref_val_str)
-                            except (ValueError, TypeError):
-                                ref_val = None
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        indicator_ids = await load_indicator_ids(conn)
+        unmatched: Dict[str, str] = {}
+        staged = 0
 
-                            all_indicators.append({
-                                'Национальная цель': current_goal,
-                                'Показатель нац. цели': current_metric,
-                                'Статистический индикатор': indicator_name,
-                                'Единица измерения': unit,
-                                'Год': year,
-                                'Эталонное значение': ref_val
-                            })
+        async with conn.transaction():
+            await conn.execute(
+                """
+                CREATE TEMP TABLE stage_reference_values (
+                    indicator_id INT, year INT, reference_value TEXT, seq INT
+                ) ON COMMIT DROP
+                """
+            )
 
-    print("\nПарсинг завершен. Создаем DataFrame...")
-    df = pd.DataFrame(all_indicators)
-    return df
+            buffer: List[Tuple[int, int, str, int]] = []
+            async for page in iter_pages(file_path, cache_dir, workers):
+                for item in assembler.feed(page):
+                    indicator_id = indicator_ids.get(normalize_indicator_name(item['indicator']))
+                    if indicator_id is None:
+                        unmatched.setdefault(item['indicator'], item['goal'])
+                        continue
+                    staged += 1
+                    buffer.append((indicator_id, item['year'], item['value'], staged))
+                    if len(buffer) >= COPY_BATCH_SIZE:
+                        await conn.copy_records_to_table('stage_reference_values', records=buffer)
+                        buffer = []
+            if buffer:
+                await conn.copy_records_to_table('stage_reference_values', records=buffer)
+
+            # Если индикатор с годом встретился в файле несколько раз, побеждает последнее вхождение
+            result = await conn.fetchrow(
+                """
+                WITH upserted AS (
+                    INSERT INTO indicator_reference_values (indicator_id, year, reference_value)
+                    SELECT DISTINCT ON (indicator_id, year) indicator_id, year, reference_value
+                    FROM stage_reference_values
+                    ORDER BY indicator_id, year, seq DESC
+                    ON CONFLICT (indicator_id, year) DO UPDATE SET reference_value = EXCLUDED.reference_value
+                    WHERE indicator_reference_values.reference_value IS DISTINCT FROM EXCLUDED.reference_value
+                    RETURNING indicator_id, (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted) AS added,
+                       count(*) FILTER (WHERE NOT inserted) AS updated,
+                       array_agg(DISTINCT indicator_id) AS indicator_ids
+                FROM upserted
+                """
+            )
+            changed_ids = result['indicator_ids'] or []
+            if changed_ids:
+                # Эталонные значения входят в проекцию дашборда (target_value)
+                await refresh_indicator_rows(conn, changed_ids)
+
+        print(f"Значений в файле: {staged}, добавлено: {result['added']}, изменено: {result['updated']}, "
+              f"индикаторов затронуто: {len(changed_ids)} ({time.perf_counter() - started:.1f} с)")
+        if unmatched:
+            print(f"\nНе найдены в справочнике indicators ({len(unmatched)}):")
+            for name, goal in sorted(unmatched.items()):
+                print(f"  - {name} [{goal}]")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эталонные значения индикаторов из PDF с национальными целями")
+    parser.add_argument('pdf', help="Путь к PDF-файлу")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Процессов для разбора страниц")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Каталог кэша разобранных страниц")
+    parser.add_argument('--dry-run', action='store_true', help="Только разобрать файл, без записи в БД")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pdf):
+        print(f"ОШИБКА: Файл не найден по указанному пути: {args.pdf}")
+        return
+    asyncio.run(run(args.pdf, args.cache_dir, args.workers, args.dry_run))
 
 
-# --- Главный блок для запуска ---
 if __name__ == "__main__":
-    final_df = parse_goals_pdf(PDF_FILE_PATH)
-
-    if final_df is not None and not final_df.empty:
-        try:
-            # Сортируем данные для наглядности
-            final_df.sort_values(by=['Национальная цель', 'Показатель нац. цели', 'Статистический индикатор', 'Год'],
-                                 inplace=True)
-
-            final_df.to_excel(OUTPUT_EXCEL_PATH, index=False, engine='openpyxl')
-            print("\n=======================================================")
-            print(f"🎉 УСПЕХ! Данные успешно сохранены в файл:")
-            print(f"   {os.path.abspath(OUTPUT_EXCEL_PATH)}")
-            print("=======================================================")
-
-        except Exception as e:
-            print(f"\nОШИБКА: Не удалось сохранить Excel-файл. Причина: {e}")
-    else:
-        print("\nНе найдено данных для сохранения. Проверьте PDF-файл или логику парсера.")
\ No newline at end of file
+    main()
@@ -1,139 +1,241 @@
 # populate_db.py
+#
+# Загружает справочник целей, показателей, индикаторов и нацпроектов с эталонными значениями из CSV.
+#
+# Загрузка множествами, а не построчно: CSV нормализуется векторно в pandas, каждое множество сущностей
+# (цели, показатели, индикаторы, проекты, связи, эталонные значения) уходит через COPY в свою временную
+# таблицу, и все id и связи разрешаются несколькими INSERT ... SELECT ... ON CONFLICT в одной короткой
+# транзакции вместе с перестройкой проекции дашборда. В конце печатается, сколько строк каждой таблицы
+# добавлено, изменено и осталось без изменений.
+# Запуск из каталога backend: python -m other.populate_db [путь к CSV]
 
 import asyncio
-import pandas as pd
+import sys
+import time
+from typing import List, Tuple
+
 import asyncpg
-import re
+import pandas as pd
+from tabulate import tabulate
+
 from app.core.database import settings
+from app.services.dashboard_projection import rebuild_projection
 
 # --- Константы и настройки ---
 CSV_FILE_PATH = 'table_csv_1.csv'
 YEAR_COLUMNS = [str(year) for year in range(2021, 2031)] + ['2035']
 
-
-# --- Вспомогательные функции ---
-
-def clean_project_names(text: str) -> list[str]:
-    """Очищает и разделяет строку с нацпроектами на список ТОЛЬКО по переносу строки."""
-    if not isinstance(text, str) or text.strip() == '':
-        return []
-    return [name.strip() for name in text.split('\n') if name.strip()]
-
-
-def map_desired_direction(text: str) -> str | None:
-    """Преобразует тип показателя ('Прямой'/'Обратный') в флаг 'higher' или 'lower'."""
-    if not isinstance(text, str):
-        return None
-    text = text.lower().strip()
-    if text == 'прямой':
-        return 'higher'
-    if text == 'обратный':
-        return 'lower'
-    return None
+_DIRECTIONS = {'прямой': 'higher', 'обратный': 'lower'}
+_INDICATOR_PREFIX = r'^((\d+(\.\d+)*(\.?[а-я])?\.\s*)|(Дополнительный:\s*))'
+
+
+# --- Нормализация CSV ---
+
+def _optional_text(series: pd.Series) -> pd.Series:
+    """Текст без крайних пробелов; пустые значения -- None."""
+    text = series.astype('string').str.strip()
+    present = (text.notna() & (text != '')).fillna(False).astype(bool)
+    # object + None, а не pd.NA: записи уходят в asyncpg как есть
+    return text.astype(object).where(present, None)
+
+
+def normalize_catalogue(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Возвращает (индикаторы, связи индикатор -> проект, эталонные значения).
+    Строки без цели, показателя или названия индикатора пропускаются;
+    при повторе названия индикатора берутся свойства из последней строки, как при построчной загрузке.
+    """
+    df = df.dropna(how='all')
+
+    catalogue = pd.DataFrame({
+        'goal': _optional_text(df['Национальная цель'].astype('string').str.replace(r'^\d+\.\s*', '', regex=True)),
+        'metric': _optional_text(df['Показатель'].astype('string').str.replace(
+            r'^\d+(\.\d+)*(\.?[а-я])?\.\s*', '', regex=True)),
+        'indicator': _optional_text(df['Статистический индикатор'].astype('string').str.replace(
+            _INDICATOR_PREFIX, '', regex=True)),
+        'unit': _optional_text(df['Единица измерения']),
+        'desired_direction': _optional_text(df['Тип показателя'].astype('string').str.strip().str.lower()
+                                            .map(_DIRECTIONS)),
+        'source_url': _optional_text(df['Ссылка']),
+        'periodicity': _optional_text(df['Периодичность обновления']),
+        'responsible_foiv': _optional_text(df['Ответственный (ФОИВ)']),
+        'use_for_agent': df['Использовать для агента'].astype('string').str.strip().str.lower().eq('да')
+                         .fillna(False).astype(bool),
+        'indicator_type': _optional_text(df['Тип индикатора']),
+        'projects': df['Нацпроект'].astype('string'),
+    }, index=df.index)
+    catalogue = catalogue.dropna(subset=['goal', 'metric', 'indicator'])
+
+    # Нацпроекты в ячейке разделены только переносом строки
+    indicator_projects = catalogue[['indicator', 'goal', 'projects']].assign(
+        project=catalogue['projects'].str.split('\n')).explode('project')
+    indicator_projects['project'] = _optional_text(indicator_projects['project'])
+    indicator_projects = indicator_projects.dropna(subset=['project'])[['indicator', 'goal', 'project']]
+
+    year_columns = [column for column in YEAR_COLUMNS if column in df.columns]
+    reference = df.loc[catalogue.index, year_columns].assign(indicator=catalogue['indicator']).melt(
+        id_vars='indicator', var_name='year', value_name='reference_value').dropna(subset=['reference_value'])
+    reference['year'] = reference['year'].astype(int)
+    reference['reference_value'] = reference['reference_value'].astype(str)
+    # Порядок строк файла сохраняется: при повторе индикатора с годом побеждает последняя строка
+    reference = reference.drop_duplicates(subset=['indicator', 'year'], keep='last')
+
+    indicators = catalogue.drop(columns='projects').drop_duplicates(subset='indicator', keep='last')
+    return indicators, indicator_projects, reference
+
+
+# --- Загрузка ---
+
+_STAGING_TABLES = {
+    'stage_indicators': """
+        goal TEXT, metric TEXT, indicator TEXT, unit TEXT, desired_direction TEXT, source_url TEXT,
+        periodicity TEXT, responsible_foiv TEXT, use_for_agent BOOLEAN, indicator_type TEXT
+    """,
+    'stage_indicator_projects': "indicator TEXT, goal TEXT, project TEXT",
+    'stage_reference_values': "indicator TEXT, year INT, reference_value TEXT",
+}
+
+# (таблица, INSERT ... RETURNING (xmax = 0) AS inserted, запрос числа строк в файле).
+# ON CONFLICT DO UPDATE срабатывает только при отличиях, поэтому неизмененные строки не переписываются
+_MERGES = [
+    ("national_goals", """
+        INSERT INTO national_goals (name)
+        SELECT DISTINCT goal FROM stage_indicators
+        ON CONFLICT (name) DO NOTHING
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(DISTINCT goal) FROM stage_indicators"),
+    ("goal_metrics", """
+        INSERT INTO goal_metrics (goal_id, name)
+        SELECT DISTINCT g.id, s.metric
+        FROM stage_indicators s
+        JOIN national_goals g ON g.name = s.goal
+        ON CONFLICT (goal_id, name) DO NOTHING
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(*) FROM (SELECT DISTINCT goal, metric FROM stage_indicators) t"),
+    ("indicators", """
+        INSERT INTO indicators (name, metric_id, unit, desired_direction, source_url, periodicity,
+                                responsible_foiv, use_for_agent, indicator_type)
+        SELECT s.indicator, m.id, s.unit, s.desired_direction, s.source_url, s.periodicity,
+               s.responsible_foiv, s.use_for_agent,
+               CASE WHEN s.indicator_type = ANY(enum_range(NULL::indicator_type_enum)::text[])
+                    THEN s.indicator_type::indicator_type_enum END
+        FROM stage_indicators s
+        JOIN national_goals g ON g.name = s.goal
+        JOIN goal_metrics m ON m.goal_id = g.id AND m.name = s.metric
+        ON CONFLICT (name) DO UPDATE SET
+            metric_id = EXCLUDED.metric_id, unit = EXCLUDED.unit, desired_direction = EXCLUDED.desired_direction,
+            source_url = EXCLUDED.source_url, periodicity = EXCLUDED.periodicity,
+            responsible_foiv = EXCLUDED.responsible_foiv, use_for_agent = EXCLUDED.use_for_agent,
+            indicator_type = EXCLUDED.indicator_type
+        WHERE (indicators.metric_id, indicators.unit, indicators.desired_direction, indicators.source_url,
+               indicators.periodicity, indicators.responsible_foiv, indicators.use_for_agent,
+               indicators.indicator_type)
+              IS DISTINCT FROM
+              (EXCLUDED.metric_id, EXCLUDED.unit, EXCLUDED.desired_direction, EXCLUDED.source_url,
+               EXCLUDED.periodicity, EXCLUDED.responsible_foiv, EXCLUDED.use_for_agent, EXCLUDED.indicator_type)
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(*) FROM stage_indicators"),
+    ("national_projects", """
+        INSERT INTO national_projects (name)
+        SELECT DISTINCT project FROM stage_indicator_projects
+        ON CONFLICT (name) DO NOTHING
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(DISTINCT project) FROM stage_indicator_projects"),
+    ("project_to_goal_mapping", """
+        INSERT INTO project_to_goal_mapping (project_id, goal_id)
+        SELECT DISTINCT p.id, g.id
+        FROM stage_indicator_projects s
+        JOIN national_projects p ON p.name = s.project
+        JOIN national_goals g ON g.name = s.goal
+        ON CONFLICT DO NOTHING
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(*) FROM (SELECT DISTINCT project, goal FROM stage_indicator_projects) t"),
+    ("indicator_to_project_mapping", """
+        INSERT INTO indicator_to_project_mapping (indicator_id, project_id)
+        SELECT DISTINCT i.id, p.id
+        FROM stage_indicator_projects s
+        JOIN indicators i ON i.name = s.indicator
+        JOIN national_projects p ON p.name = s.project
+        ON CONFLICT DO NOTHING
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(*) FROM (SELECT DISTINCT indicator, project FROM stage_indicator_projects) t"),
+    ("indicator_reference_values", """
+        INSERT INTO indicator_reference_values (indicator_id, year, reference_value)
+        SELECT i.id, s.year, s.reference_value
+        FROM stage_reference_values s
+        JOIN indicators i ON i.name = s.indicator
+        ON CONFLICT (indicator_id, year) DO UPDATE SET reference_value = EXCLUDED.reference_value
+        WHERE indicator_reference_values.reference_value IS DISTINCT FROM EXCLUDED.reference_value
+        RETURNING (xmax = 0) AS inserted
+    """, "SELECT count(*) FROM stage_reference_values"),
+]
+
+
+def _records(df: pd.DataFrame, columns: List[str]) -> List[tuple]:
+    return list(df[columns].itertuples(index=False, name=None))
+
+
+async def load_catalogue(conn: asyncpg.Connection, indicators: pd.DataFrame, indicator_projects: pd.DataFrame,
+                         reference: pd.DataFrame) -> List[list]:
+    """Загружает нормализованный справочник одной транзакцией. Возвращает строки отчета по таблицам."""
+    report = []
+    async with conn.transaction():
+        for table, columns in _STAGING_TABLES.items():
+            await conn.execute(f"CREATE TEMP TABLE {table} ({columns}) ON COMMIT DROP")
+
+        await conn.copy_records_to_table('stage_indicators', records=_records(indicators, [
+            'goal', 'metric', 'indicator', 'unit', 'desired_direction', 'source_url', 'periodicity',
+            'responsible_foiv', 'use_for_agent', 'indicator_type']))
+        await conn.copy_records_to_table('stage_indicator_projects',
+                                         records=_records(indicator_projects, ['indicator', 'goal', 'project']))
+        await conn.copy_records_to_table('stage_reference_values',
+                                         records=_records(reference, ['indicator', 'year', 'reference_value']))
+
+        for table, merge_query, staged_query in _MERGES:
+            result = await conn.fetchrow(
+                f"""
+                WITH merged AS ({merge_query})
+                SELECT count(*) FILTER (WHERE inserted) AS inserted,
+                       count(*) FILTER (WHERE NOT inserted) AS updated
+                FROM merged
+                """
+            )
+            staged = await conn.fetchval(staged_query)
+            report.append([table, staged, result['inserted'], result['updated'],
+                           staged - result['inserted'] - result['updated']])
+
+        # Справочники и связи изменились -- проекцию дашборда нужно собрать заново
+        await rebuild_projection(conn)
+    return report
 
 
 # --- Основная логика скрипта ---
 
 async def main():
     """Главная функция для подключения, обработки и загрузки данных."""
-    conn = None
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_FILE_PATH
+    started = time.perf_counter()
+
+    df = pd.read_csv(csv_path, sep=';')
+    print(f"📖 Исходный файл содержит {len(df)} строк.")
+    indicators, indicator_projects, reference = normalize_catalogue(df)
+    print(f"🧹 Индикаторов: {len(indicators)}, связей с проектами: {len(indicator_projects)}, "
+          f"эталонных значений: {len(reference)}.")
+
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
     try:
-        conn = await asyncpg.connect(
-            user=settings.db_user, password=settings.db_password,
-            database=settings.db_name, host=settings.db_host, port=settings.db_port
-        )
-        print("✅ Соединение с базой данных установлено.")
-
-        df = pd.read_csv(CSV_FILE_PATH, engine='python', sep=';')
-        print("НАЗВАНИЯ СТОЛБЦОВ В ФАЙЛЕ:", list(df.columns))
-        print(f"📖 Исходный файл содержит {len(df)} строк.")
-
-        # Очистка данных
-        print("🧹 Очистка данных от нумерации и префиксов...")
-        df['Национальная цель'] = df['Национальная цель'].astype(str).str.replace(r'^\d+\.\s*', '',
-                                                                                  regex=True).str.strip()
-        df['Показатель'] = df['Показатель'].astype(str).str.replace(r'^\d+(\.\d+)*(\.?[а-я])?\.\s*', '',
-                                                                    regex=True).str.strip()
-        prefix_pattern = r'^((\d+(\.\d+)*(\.?[а-я])?\.\s*)|(Дополнительный:\s*))'
-        df['Статистический индикатор'] = df['Статистический индикатор'].astype(str).str.replace(prefix_pattern, '',
-                                                                                                regex=True).str.strip()
-        print("✅ Данные успешно очищены. Все строки будут загружены.")
-
-        # Итерация и загрузка данных
-        for index, row in df.iterrows():
-            if row.isnull().all():
-                continue
-
-            async with conn.transaction():
-                try:
-                    goal_name = str(row['Национальная цель']).strip()
-                    goal_id = await conn.fetchval(
-                        'INSERT INTO national_goals (name) VALUES ($1) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id',
-                        goal_name)
-
-                    metric_name = str(row['Показатель']).strip()
-                    metric_id = await conn.fetchval(
-                        'INSERT INTO goal_metrics (name, goal_id) VALUES ($1, $2) ON CONFLICT (goal_id, name) DO UPDATE SET name = EXCLUDED.name RETURNING id',
-                        metric_name, goal_id)
-
-                    indicator_name = str(row['Статистический индикатор']).strip()
-                    indicator_id = await conn.fetchval(
-                        """
-                        INSERT INTO indicators (name, metric_id, unit, desired_direction, source_url, periodicity, responsible_foiv, use_for_agent, indicator_type)
-                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                        ON CONFLICT (name) DO UPDATE SET
-                            metric_id = EXCLUDED.metric_id, unit = EXCLUDED.unit, desired_direction = EXCLUDED.desired_direction,
-                            source_url = EXCLUDED.source_url, periodicity = EXCLUDED.periodicity,
-                            responsible_foiv = EXCLUDED.responsible_foiv, use_for_agent = EXCLUDED.use_for_agent,
-                            indicator_type = EXCLUDED.indicator_type
-                        RETURNING id
-                        """,
-                        indicator_name, metric_id,
-                        str(row.get('Единица измерения')) if pd.notna(row.get('Единица измерения')) else None,
-                        map_desired_direction(row.get('Тип показателя')),
-                        str(row.get('Ссылка')) if pd.notna(row.get('Ссылка')) else None,
-                        str(row.get('Периодичность обновления')) if pd.notna(
-                            row.get('Периодичность обновления')) else None,
-                        str(row.get('Ответственный (ФОИВ)')) if pd.notna(row.get('Ответственный (ФОИВ)')) else None,
-                        str(row.get('Использовать для агента')).lower() == 'да',
-                        # --- ДОБАВЛЕНО: Чтение нового столбца ---
-                        row.get('Тип индикатора').strip() if pd.notna(row.get('Тип индикатора')) else None
-                    )
-
-                    project_names = clean_project_names(row.get('Нацпроект'))
-                    for proj_name in project_names:
-                        project_id = await conn.fetchval(
-                            'INSERT INTO national_projects (name) VALUES ($1) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id',
-                            proj_name)
-                        await conn.execute(
-                            'INSERT INTO project_to_goal_mapping (project_id, goal_id) VALUES ($1, $2) ON CONFLICT DO NOTHING',
-                            project_id, goal_id)
-                        await conn.execute(
-                            'INSERT INTO indicator_to_project_mapping (indicator_id, project_id) VALUES ($1, $2) ON CONFLICT DO NOTHING',
-                            indicator_id, project_id)
-
-                    for year_col in YEAR_COLUMNS:
-                        if year_col in df.columns and pd.notna(row[year_col]):
-                            year = int(year_col)
-                            value = str(row[year_col])
-                            await conn.execute(
-                                'INSERT INTO indicator_reference_values (indicator_id, year, reference_value) VALUES ($1, $2, $3) ON CONFLICT (indicator_id, year) DO UPDATE SET reference_value = EXCLUDED.reference_value',
-                                indicator_id, year, value)
-
-                    print(f"  -> Успешно обработан индикатор: {indicator_name[:70]}...")
-
-                except Exception as e:
-                    print(f"❌ Ошибка при обработке строки {index + 2}: {indicator_name[:70]}... | {e}")
-
-    except Exception as e:
-        print(f"🔥 Произошла критическая ошибка: {e}")
-
+        report = await load_catalogue(conn, indicators, indicator_projects, reference)
     finally:
-        if conn:
-            await conn.close()
-            print("🛑 Соединение с базой данных закрыто.")
+        await conn.close()
+
+    print(tabulate(report, headers=["Таблица", "В файле", "Добавлено", "Изменено", "Без изменений"],
+                   tablefmt="psql"))
+    print(f"✅ Справочник загружен за {time.perf_counter() - started:.1f} с.")
 
 
 if __name__ == "__main__":
     print("🚀 Запуск скрипта для наполнения справочников БД...")
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -4,6 +4,7 @@ import asyncio
 import asyncpg
 import json
 from app.core.database import settings
+from app.services.dashboard_projection import refresh_indicator_rows
 
 # JSON данные, которые вы предоставили
 json_data = """
@@ -155,9 +156,17 @@ async def main():
 
         # Сохраняем в базу данных
         async with conn.transaction():
+            new_region_ids = []
             for name in sorted_regions:
                 # ON CONFLICT DO NOTHING - если регион уже есть, ничего не делать
-                await conn.execute("INSERT INTO regions (name) VALUES ($1) ON CONFLICT (name) DO NOTHING", name)
+                region_id = await conn.fetchval(
+                    "INSERT INTO regions (name) VALUES ($1) ON CONFLICT (name) DO NOTHING RETURNING id", name)
+                if region_id is not None:
+                    new_region_ids.append(region_id)
+            # Строки новых регионов в проекции дашборда (по всем индикаторам), если миграции уже применены
+            has_projection = await conn.fetchval("SELECT to_regclass('dashboard_indicator_rows') IS NOT NULL")
+            if new_region_ids and has_projection:
+                await refresh_indicator_rows(conn, region_ids=new_region_ids)
 
         print(f"✅ Успешно добавлено/проигнорировано {len(sorted_regions)} регионов.")
 
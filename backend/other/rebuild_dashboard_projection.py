@@ -0,0 +1,27 @@
+# rebuild_dashboard_projection.py
+#
+# Полностью перестраивает проекцию дашборда (dashboard_indicator_rows, dashboard_budget_totals).
+# Нужен после ручных изменений справочников и связей в БД в обход приложения.
+# Запуск из каталога backend: python -m other.rebuild_dashboard_projection
+
+import asyncio
+
+import asyncpg
+
+from app.core.database import settings
+from app.services.dashboard_projection import rebuild_projection
+
+
+async def main():
+    conn = await asyncpg.connect(
+        user=settings.db_user, password=settings.db_password,
+        database=settings.db_name, host=settings.db_host, port=settings.db_port
+    )
+    try:
+        await rebuild_projection(conn)
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -58,7 +58,7 @@ const InformationDisplay = ({
         <div className={styles.gridBudget}><ProjectBudgetTable budget={projectDetails.budget} selectedRegion={selectedRegion} selectedProject={selectedProject} selectedYear={selectedYear}/></div>
         <div className={styles.gridPerformers}><TopPerformers metrics={projectDetails.metrics} /></div>
         <div className={styles.gridIndicators}><IndicatorDisplay metrics={projectDetails.metrics} onShowChart={handleShowChart} isExpanded={isIndicatorsExpanded} onToggleExpand={() => setIsIndicatorsExpanded(!isIndicatorsExpanded)}/></div>
-        <div className={styles.gridMeasures}><MeasuresDisplay measures={projectDetails.activities} /></div>
+        <div className={styles.gridMeasures}><MeasuresDisplay measures={projectDetails.activities} nextCursor={projectDetails.activities_next_cursor} projectId={selectedProject?.id} regionId={selectedRegion?.id} /></div>
       </div>
     );
   };
@@ -1,6 +1,9 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useEffect } from 'react';
 import styles from './MeasuresDisplay.module.css';
 
+const API_URL = '/api';
+const PAGE_SIZE = 20;
+
 // Вспомогательная функция для определения цвета значка важности
 const getImportanceColor = (level) => {
     if (level >= 8) return styles.highImportance;
@@ -8,42 +11,82 @@ const getImportanceColor = (level) => {
     return styles.lowImportance;
 };
 
-const MeasuresDisplay = ({ measures }) => {
+// Первая страница приходит вместе с /api/data; следующие страницы и полный текст новости
+// подгружаются по запросу (кнопка "Показать еще" и открытие карточки)
+const MeasuresDisplay = ({ measures, nextCursor, projectId, regionId }) => {
+    const [items, setItems] = useState(measures || []);
+    const [cursor, setCursor] = useState(nextCursor || null);
+    const [minImportance, setMinImportance] = useState('all');
+    const [isLoadingPage, setIsLoadingPage] = useState(false);
     const [selectedNews, setSelectedNews] = useState(null);
-    // --- ИЗМЕНЕНИЕ ЗДЕСЬ: Одно состояние для управления обоими фильтрами ---
-    const [sortConfig, setSortConfig] = useState('date_desc'); // e.g., 'date_desc', 'importance_asc'
 
-    const openModal = (newsItem) => {
-        setSelectedNews(newsItem);
+    // Новые данные дашборда -- сбрасываем список к первой странице
+    useEffect(() => {
+        setItems(measures || []);
+        setCursor(nextCursor || null);
+        setMinImportance('all');
+    }, [measures, nextCursor]);
+
+    const fetchPage = async (importance, pageCursor) => {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (regionId != null) params.append('region_id', regionId);
+        if (importance !== 'all') params.append('min_importance', importance);
+        if (pageCursor) params.append('cursor', pageCursor);
+        const response = await fetch(`${API_URL}/projects/${projectId}/activities?${params}`);
+        if (!response.ok) throw new Error(`Ошибка сервера: ${response.status}`);
+        return response.json();
+    };
+
+    const handleImportanceChange = async (value) => {
+        setMinImportance(value);
+        if (value === 'all') {
+            setItems(measures || []);
+            setCursor(nextCursor || null);
+            return;
+        }
+        setIsLoadingPage(true);
+        try {
+            const page = await fetchPage(value, null);
+            setItems(page.items);
+            setCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Не удалось загрузить мероприятия:", error);
+        } finally {
+            setIsLoadingPage(false);
+        }
+    };
+
+    const loadMore = async () => {
+        setIsLoadingPage(true);
+        try {
+            const page = await fetchPage(minImportance, cursor);
+            setItems(prev => [...prev, ...page.items]);
+            setCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Не удалось загрузить мероприятия:", error);
+        } finally {
+            setIsLoadingPage(false);
+        }
+    };
+
+    const openModal = async (newsItem) => {
+        setSelectedNews({ ...newsItem, text: null, isLoading: true });
+        try {
+            const response = await fetch(`${API_URL}/activities/${newsItem.id}`);
+            if (!response.ok) throw new Error(`Ошибка сервера: ${response.status}`);
+            const data = await response.json();
+            setSelectedNews(prev => (prev && prev.id === newsItem.id ? { ...data, isLoading: false } : prev));
+        } catch (error) {
+            console.error("Не удалось загрузить текст новости:", error);
+            setSelectedNews(prev => (prev && prev.id === newsItem.id ? { ...prev, isLoading: false } : prev));
+        }
     };
 
     const closeModal = () => {
         setSelectedNews(null);
     };
 
-    // Мемоизация отсортированного списка новостей
-    const sortedMeasures = useMemo(() => {
-        if (!measures) return [];
-        const sorted = [...measures];
-
-        const [sortBy, sortDirection] = sortConfig.split('_');
-
-        sorted.sort((a, b) => {
-            if (sortBy === 'importance') {
-                const valA = a.importance ?? -1;
-                const valB = b.importance ?? -1;
-                return sortDirection === 'desc' ? valB - valA : valA - valB;
-            } else { // sortBy === 'date'
-                const dateA = a.activity_date ? new Date(a.activity_date).getTime() : 0;
-                const dateB = b.activity_date ? new Date(b.activity_date).getTime() : 0;
-                return sortDirection === 'desc' ? dateB - dateA : dateA - dateB;
-            }
-        });
-        return sorted;
-    }, [measures, sortConfig]);
-
-
-    if (!measures || measures.length === 0) {
+    if (items.length === 0 && minImportance === 'all') {
         return (
             <div className={styles.measuresDisplay}>
                 <h4>Мероприятия национального проекта в регионе</h4>
@@ -54,37 +97,27 @@ const MeasuresDisplay = ({ measures }) => {
 
     return (
         <div className={styles.measuresDisplay}>
-            {/* --- ИЗМЕНЕНИЕ ЗДЕСЬ: Два независимых фильтра --- */}
             <div className={styles.header}>
                 <h4>Мероприятия национального проекта в регионе</h4>
                 <div className={styles.sortContainer}>
-                    {/* Фильтр по дате */}
+                    {/* Фильтр по важности (на сервере); порядок -- сначала новые */}
                     <select
-                        value={sortConfig.startsWith('date') ? sortConfig : 'default_date'}
-                        onChange={(e) => setSortConfig(e.target.value)}
+                        value={minImportance}
+                        onChange={(e) => handleImportanceChange(e.target.value)}
                         className={styles.sortSelect}
                     >
-                        <option value="default_date" disabled>По новизне</option>
-                        <option value="date_desc">Сначала новые</option>
-                        <option value="date_asc">Сначала старые</option>
-                    </select>
-
-                    {/* Фильтр по важности */}
-                    <select
-                        value={sortConfig.startsWith('importance') ? sortConfig : 'default_importance'}
-                        onChange={(e) => setSortConfig(e.target.value)}
-                        className={styles.sortSelect}
-                    >
-                        <option value="default_importance" disabled>По важности</option>
-                        <option value="importance_desc">Сначала важные</option>
-                        <option value="importance_asc">Сначала неважные</option>
+                        <option value="all">Любая важность</option>
+                        <option value="5">Важность от 5</option>
+                        <option value="8">Важность от 8</option>
                     </select>
                 </div>
             </div>
 
+            {items.length === 0 && !isLoadingPage && <p>Мероприятий с такой важностью не найдено.</p>}
+
             <ul>
-                {sortedMeasures.map((measure) => (
-                    <li key={measure.link || measure.title} className={styles.measureItem} onClick={() => openModal(measure)}>
+                {items.map((measure) => (
+                    <li key={measure.id} className={styles.measureItem} onClick={() => openModal(measure)}>
                         <div className={styles.dateAndImportance}>
                             <span className={styles.date}>
                                 {measure.activity_date ? new Date(measure.activity_date).toLocaleDateString('ru-RU') : ''}
@@ -102,12 +135,20 @@ const MeasuresDisplay = ({ measures }) => {
                 ))}
             </ul>
 
+            {cursor && (
+                <div className={styles.loadMoreContainer}>
+                    <button onClick={loadMore} disabled={isLoadingPage} className={styles.loadMoreButton}>
+                        {isLoadingPage ? 'Загрузка...' : 'Показать еще'}
+                    </button>
+                </div>
+            )}
+
             {selectedNews && (
                 <div className={styles.modalOverlay} onClick={closeModal}>
                     <div className={styles.modalContent} onClick={(e) => e.stopPropagation()}>
                         <button onClick={closeModal} className={styles.closeButton}>×</button>
                         <h3>{selectedNews.title}</h3>
-                        <p className={styles.modalText}>{selectedNews.text}</p>
+                        <p className={styles.modalText}>{selectedNews.isLoading ? 'Загрузка текста...' : selectedNews.text}</p>
                         <div className={styles.modalActions}>
                             {selectedNews.link && (
                                 <a href={selectedNews.link} target="_blank" rel="noopener noreferrer" className={styles.detailsLink}>